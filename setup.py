@@ -52,6 +52,7 @@ setup(
     setup_requires=["Cython"],
     install_requires=[  
             'numpy',
+            'scipy',
             'pyyaml',
             'jinja2',
             'tqdm',
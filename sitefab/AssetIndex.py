@@ -0,0 +1,198 @@
+""" Site wide index of the content, static and output files
+"""
+import os
+from pathlib import Path
+
+import diskcache
+from PIL import Image
+
+from sitefab import utils
+
+ASSETS_CACHE_KEY = 'assets'
+IMAGE_EXTENSIONS = set(['.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp',
+                        '.tif', '.tiff'])
+
+
+class AssetIndex():
+    """ Files of the site directories indexed by path and url
+
+    The directories are walked once with `os.scandir()`. For each file the
+    size, modification time and image dimensions, read from the image
+    header, are recorded. The content hash is only computed the first time
+    it is accessed. Dimensions and hashes are persisted in the cache
+    directory and reused while the file size and modification time are
+    unchanged.
+
+    Each asset is an `Asset` dict: path, size, mtime, hash, and for images
+    width and height.
+    """
+
+    def __init__(self, roots, cache_dir):
+        """ Create an empty index
+
+        Args:
+            roots (list): [directory, url prefix] of the directories to
+            index. The url prefix is None for directories that are not
+            served e.g [[content_dir, None], [output_dir, '/']].
+            cache_dir (Path): directory used to persist the assets info.
+        """
+        self.roots = [[Path(root), prefix] for root, prefix in roots]
+        self.cache_dir = cache_dir
+        self.by_path = {}  # absolute path -> asset
+        self.by_url = {}  # url -> asset
+        self.num_files_read = 0
+
+    def scan(self):
+        """ Walk the directories and update the index
+
+        Returns:
+            int: number of files indexed.
+        """
+        with diskcache.Cache(str(self.cache_dir)) as cache:
+            previous = cache.get(ASSETS_CACHE_KEY, {})
+        # hashes computed since the previous scan
+        previous.update(self.by_path)
+
+        self.by_path = {}
+        self.by_url = {}
+        self.num_files_read = 0
+        for root, prefix in self.roots:
+            for entry in walk(root):
+                stat = entry.stat()
+                asset = previous.get(entry.path)
+                if (not asset or asset['size'] != stat.st_size or
+                        asset['mtime'] != stat.st_mtime_ns):
+                    asset = self.read_asset(entry.path, stat)
+                    self.num_files_read += 1
+                self.by_path[entry.path] = asset
+                if prefix is not None:
+                    relative = os.path.relpath(entry.path, str(root))
+                    url = "%s/%s" % (prefix.rstrip('/'),
+                                     Path(relative).as_posix())
+                    self.by_url[url] = asset
+
+        with diskcache.Cache(str(self.cache_dir)) as cache:
+            cache.set(ASSETS_CACHE_KEY, self.by_path)
+        return len(self.by_path)
+
+    def read_asset(self, path, stat):
+        """ Create the asset of a file, reading the dimensions of images
+
+        Args:
+            path (str): file path.
+            stat (os.stat_result): file stat.
+
+        Returns:
+            Asset: the asset info, its hash is computed when accessed.
+        """
+        asset = Asset(path=path, size=stat.st_size, mtime=stat.st_mtime_ns)
+        if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+            try:
+                # only the image header is read
+                with Image.open(path) as img:
+                    asset['width'], asset['height'] = img.size
+            except (OSError, ValueError):
+                pass
+        return asset
+
+    def get_num_assets(self):
+        "Return the number of files indexed"
+        return len(self.by_path)
+
+    def get(self, path):
+        """ Return the asset of a file path
+
+        Args:
+            path (str): file path.
+
+        Returns:
+            dict: the asset or None if the file does not exist.
+        """
+        return self.by_path.get(os.path.abspath(str(path)))
+
+    def get_by_url(self, url):
+        """ Return the asset served at a given url
+
+        Args:
+            url (str): url relative to the site root e.g /static/a.jpg
+
+        Returns:
+            dict: the asset or None if no file is served at that url.
+        """
+        return self.by_url.get(url)
+
+    def exists(self, path):
+        "Return True if the file exists"
+        return os.path.abspath(str(path)) in self.by_path
+
+    def get_files(self, directory, extensions=None):
+        """ List the indexed files of a directory and its sub directories
+
+        Same as `files.get_files_list()` without walking the directory.
+
+        Args:
+            directory (str): directory.
+            extensions (list, optional): extensions to keep e.g ['.jpg'].
+            Defaults to all the files.
+
+        Returns:
+            list: Path of the matching files.
+        """
+        directory = os.path.join(os.path.abspath(str(directory)), '')
+        if extensions:
+            extensions = tuple(ext.lower() for ext in extensions)
+        matches = []
+        for path in self.by_path:
+            if not path.startswith(directory):
+                continue
+            if extensions and not path.lower().endswith(extensions):
+                continue
+            matches.append(Path(path))
+        return matches
+
+    def get_image_info(self):
+        """ Return the dimensions of the images indexed by url
+
+        Same structure as the `image_info` plugin data so the images linter
+        checks can run without the plugin.
+
+        Returns:
+            dict: image assets, with `width`, `height` and `hash`, indexed
+            by url.
+        """
+        return {url: asset for url, asset in self.by_url.items()
+                if 'width' in asset}
+
+
+class Asset(dict):
+    "Asset info whose `hash` is computed on first access"
+
+    def __missing__(self, key):
+        if key != 'hash':
+            raise KeyError(key)
+        self['hash'] = utils.file_hexdigest(self['path'])
+        return self['hash']
+
+
+def walk(root):
+    """ Recursively yield the files of a directory
+
+    Args:
+        root (Path): directory to walk. Missing directories yield nothing.
+
+    Yields:
+        os.DirEntry: file entries.
+    """
+    directories = [os.path.abspath(str(root))]
+    while directories:
+        directory = directories.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file():
+                    yield entry
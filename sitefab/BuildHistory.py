@@ -0,0 +1,229 @@
+""" Build performance history stored in SQLite
+"""
+import sqlite3
+import statistics
+import time
+from pathlib import Path
+
+from sitefab import utils
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time REAL NOT NULL,
+    version TEXT,
+    num_posts INTEGER
+);
+CREATE TABLE IF NOT EXISTS timings (
+    build_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timings_build ON timings (build_id, kind);
+CREATE TABLE IF NOT EXISTS counters (
+    build_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value REAL NOT NULL
+);
+"""
+
+
+class BuildHistory():
+    """ Timings and counters of the previous builds
+
+    Each build records the time of its stages, plugins and posts along with
+    counters such as the number of posts and the caches hit rates. The last
+    build can then be compared to the median of the previous ones to detect
+    performance regressions.
+    """
+
+    # timings kinds
+    STAGE = 'stage'
+    PLUGIN = 'plugin'
+    POST = 'post'
+
+    def __init__(self, db_path):
+        """ Open or create the history database
+
+        Args:
+            db_path (Path): SQLite database file.
+        """
+        db_path = Path(db_path)
+        if not db_path.parent.exists():
+            db_path.parent.mkdir(parents=True)
+        self.db = sqlite3.connect(str(db_path))
+        self.db.executescript(SCHEMA)
+
+    @staticmethod
+    def make_config(config=None):
+        """ Initialize the build history config with the default values
+
+        Args:
+            config (objdict, optional): `perf_history` section of the site
+            config.
+
+        Returns:
+            objdict: the initialized configuration.
+        """
+        config = utils.create_objdict(config)
+        defaults = {
+            'enabled': True,
+            'max_builds': 200,  # older builds are deleted
+            'baseline_builds': 5,  # previous builds used as baseline
+            'regression_threshold': 20,  # percent slower than the baseline
+            'min_seconds': 0.5,  # faster timings are too noisy to compare
+            'fail_on_regression': False,
+            'budgets': {}  # stage or plugin name -> max seconds
+        }
+        return utils.set_defaults(config, defaults)
+
+    def close(self):
+        "Close the database"
+        self.db.close()
+
+    def add_build(self, version, num_posts, timings, counters,
+                  max_builds=None):
+        """ Record a build
+
+        Args:
+            version (str): SiteFab version.
+            num_posts (int): number of posts.
+            timings (dict): seconds indexed by kind then name e.g
+            {'stage': {'Parsing': 1.2}, 'post': {'a.md': 0.01}}.
+            counters (dict): counter values indexed by name.
+            max_builds (int, optional): number of builds to keep.
+
+        Returns:
+            int: the build id.
+        """
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO builds (time, version, num_posts) "
+                "VALUES (?, ?, ?)", (time.time(), version, num_posts))
+            build_id = cursor.lastrowid
+            rows = []
+            for kind, values in timings.items():
+                for name, seconds in values.items():
+                    rows.append((build_id, kind, str(name), float(seconds)))
+            self.db.executemany("INSERT INTO timings VALUES (?, ?, ?, ?)",
+                                rows)
+            self.db.executemany("INSERT INTO counters VALUES (?, ?, ?)",
+                                [(build_id, name, float(value))
+                                 for name, value in counters.items()])
+            if max_builds:
+                self.prune(max_builds)
+        return build_id
+
+    def prune(self, max_builds):
+        "Delete the builds older than the last max_builds ones"
+        old = "SELECT id FROM builds ORDER BY id DESC LIMIT -1 OFFSET ?"
+        for table in ('timings', 'counters'):
+            self.db.execute("DELETE FROM %s WHERE build_id IN (%s)" % (
+                table, old), (max_builds,))
+        self.db.execute("DELETE FROM builds WHERE id IN (%s)" % old,
+                        (max_builds,))
+
+    def get_builds(self, limit=10):
+        """ Return the last builds, most recent first. -1 returns them all
+
+        Returns:
+            list: [id, time, version, num_posts] of each build.
+        """
+        cursor = self.db.execute(
+            "SELECT id, time, version, num_posts FROM builds "
+            "ORDER BY id DESC LIMIT ?", (limit,))
+        return [list(row) for row in cursor]
+
+    def get_timings(self, build_id, kind):
+        "Return the timings of a given kind of a build indexed by name"
+        cursor = self.db.execute(
+            "SELECT name, seconds FROM timings WHERE build_id=? AND kind=?",
+            (build_id, kind))
+        return dict(cursor.fetchall())
+
+    def get_counters(self, build_id):
+        "Return the counters of a build indexed by name"
+        cursor = self.db.execute(
+            "SELECT name, value FROM counters WHERE build_id=?", (build_id,))
+        return dict(cursor.fetchall())
+
+    def get_baseline(self, build_ids, kind):
+        """ Median timings of a set of builds
+
+        Args:
+            build_ids (list): builds used as baseline.
+            kind (str): timings kind.
+
+        Returns:
+            dict: median seconds indexed by name.
+        """
+        values = {}
+        for build_id in build_ids:
+            for name, seconds in self.get_timings(build_id, kind).items():
+                values.setdefault(name, []).append(seconds)
+        return {name: statistics.median(v) for name, v in values.items()}
+
+    def find_regressions(self, config, build_id=None, baseline_id=None,
+                         kinds=None):
+        """ Compare a build to the median of the builds before it
+
+        Args:
+            config (objdict): `perf_history` config.
+            build_id (int, optional): build to check. Defaults to the last.
+            baseline_id (int, optional): build to compare to. Defaults to
+            the median of the `baseline_builds` builds before build_id.
+            kinds (list, optional): timings kinds to compare. Defaults to
+            the stages and plugins.
+
+        Returns:
+            list: [kind, name, baseline seconds, seconds, percent slower] of
+            each timing slower than the threshold, worst first.
+        """
+        builds = [b[0] for b in self.get_builds(-1)
+                  if build_id is None or b[0] <= build_id]
+        if not builds:
+            return []
+        build_id = builds[0]
+        if baseline_id is not None:
+            baseline_ids = [baseline_id]
+        else:
+            baseline_ids = builds[1:config.baseline_builds + 1]
+        if not baseline_ids:
+            return []
+
+        regressions = []
+        for kind in kinds or [self.STAGE, self.PLUGIN]:
+            baseline = self.get_baseline(baseline_ids, kind)
+            for name, seconds in self.get_timings(build_id, kind).items():
+                previous = baseline.get(name)
+                if not previous or seconds < config.min_seconds:
+                    continue
+                percent = (seconds - previous) * 100.0 / previous
+                if percent > config.regression_threshold:
+                    regressions.append([kind, name, previous, seconds,
+                                        percent])
+        return sorted(regressions, key=lambda x: x[4], reverse=True)
+
+    def check_budgets(self, config, build_id=None):
+        """ Return the stages and plugins slower than their budget
+
+        Args:
+            config (objdict): `perf_history` config.
+            build_id (int, optional): build to check. Defaults to the last.
+
+        Returns:
+            list: [name, budget seconds, seconds] of each exceeded budget.
+        """
+        if build_id is None:
+            builds = self.get_builds(1)
+            if not builds:
+                return []
+            build_id = builds[0][0]
+        timings = self.get_timings(build_id, self.STAGE)
+        timings.update(self.get_timings(build_id, self.PLUGIN))
+        exceeded = []
+        for name, budget in sorted(config.budgets.items()):
+            if name in timings and timings[name] > budget:
+                exceeded.append([name, budget, timings[name]])
+        return exceeded
@@ -0,0 +1,113 @@
+""" Compact storage of the log events
+"""
+from array import array
+
+from . import utils
+
+# stored for the severities that are not in the store severities
+UNKNOWN_SEVERITY = 0
+
+
+class EventStore():
+    """ Column oriented store of the events of a log
+
+    Each event is stored as one entry per column instead of one object per
+    event: the time in a double array, the severity in a byte array, the
+    target as an index in a table of unique targets and the details as an
+    offset in a single utf-8 buffer. Events are materialized only when read
+    e.g page by page when the log is written.
+    """
+
+    def __init__(self, severities, ok_severity, keep_ok_events=True):
+        """ Create an empty store
+
+        Args:
+            severities (dict): severity name indexed by code e.g the SiteFab
+            OK, SKIPPED and ERROR values. Codes must fit in a byte.
+            ok_severity (int): code of the OK events.
+            keep_ok_events (bool, optional): store the OK events. When False
+            they are only counted. Defaults to True.
+        """
+        self.severities_names = severities
+        self.ok_severity = ok_severity
+        self.keep_ok_events = keep_ok_events
+        self.times = array('d')
+        self.severities = array('B')
+        self.target_ids = array('L')
+        self.details_offsets = array('Q', [0])  # start of each event details
+        self.details = bytearray()
+        self.targets = []  # unique targets
+        self.targets_index = {}  # target -> index in targets
+        self.num_dropped = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, timestamp, target, severity, details):
+        """ Add an event
+
+        Args:
+            timestamp (float): event time.
+            target (str): what the event is about e.g a post title.
+            severity (int): severity code.
+            details (str): event details.
+
+        Returns:
+            bool: True if the event was stored.
+        """
+        if severity == self.ok_severity and not self.keep_ok_events:
+            self.num_dropped += 1
+            return False
+        if severity not in self.severities_names:
+            severity = UNKNOWN_SEVERITY
+
+        target_id = self.targets_index.get(target)
+        if target_id is None:
+            target_id = len(self.targets)
+            self.targets.append(target)
+            self.targets_index[target] = target_id
+
+        self.times.append(timestamp)
+        self.severities.append(severity)
+        self.target_ids.append(target_id)
+        self.details.extend(str(details).encode('utf-8'))
+        self.details_offsets.append(len(self.details))
+        return True
+
+    def get(self, idx):
+        """ Materialize an event
+
+        Args:
+            idx (int): event index.
+
+        Returns:
+            objdict: event time, target, severity name and details.
+        """
+        event = utils.create_objdict()
+        event.time = self.times[idx]
+        event.target = self.targets[self.target_ids[idx]]
+        event.severity = self.severities_names.get(self.severities[idx])
+        start = self.details_offsets[idx]
+        end = self.details_offsets[idx + 1]
+        event.details = self.details[start:end].decode('utf-8')
+        return event
+
+    def iter_events(self, start=0, stop=None):
+        """ Yield the events of a range, one at a time
+
+        Args:
+            start (int, optional): first event index. Defaults to 0.
+            stop (int, optional): index after the last event. Defaults to
+            the end of the store.
+
+        Yields:
+            objdict: events.
+        """
+        if stop is None or stop > len(self):
+            stop = len(self)
+        for idx in range(start, stop):
+            yield self.get(idx)
+
+    def get_num_pages(self, page_size):
+        "Return the number of pages of page_size events, at least one"
+        return max(1, (len(self) + page_size - 1) // page_size)
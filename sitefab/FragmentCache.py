@@ -0,0 +1,189 @@
+""" Jinja2 extension caching the rendered fragments of the templates
+
+    {% cache "sidebar" %}...{% endcache %}
+    {% cache "category_nav", meta.category %}...{% endcache %}
+
+The first argument names the fragment, the next ones are the values the
+fragment depends on. A fragment is rendered once per distinct dependencies
+and reused by the following pages.
+"""
+import json
+from collections import Counter
+
+import diskcache
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from sitefab import utils
+
+FRAGMENTS_CACHE_KEY = 'fragments'
+
+
+class FragmentCache():
+    """ Rendered fragments indexed by name, dependencies and block source
+
+    Fragments are memoized for the duration of the build. When `persist` is
+    set they are also stored in the cache directory and reused by the next
+    build as long as the block source and the dependencies are unchanged.
+    """
+
+    def __init__(self, config=None):
+        """ Create an empty cache
+
+        Args:
+            config (objdict, optional): `fragment_cache` section of the site
+            config.
+        """
+        self.config = self.make_config(config)
+        self.fragments = {}  # key -> html rendered by this build
+        self.previous = {}  # key -> html rendered by the previous build
+        self.cache_dir = None
+        self.hits = Counter()  # fragment name -> number of hits
+        self.misses = Counter()
+        self.changes = None  # see track_changes()
+
+    @staticmethod
+    def make_config(config=None):
+        """ Initialize the fragment cache config with the default values
+
+        Args:
+            config (objdict, optional): `fragment_cache` section of the site
+            config.
+
+        Returns:
+            objdict: the initialized configuration.
+        """
+        config = utils.create_objdict(config)
+        defaults = {
+            'enabled': True,
+            'persist': False  # reuse the fragments of the previous build
+        }
+        return utils.set_defaults(config, defaults)
+
+    def open(self, cache_dir):
+        """ Load the fragments of the previous build when persisted
+
+        Args:
+            cache_dir (Path): directory where the fragments are persisted.
+        """
+        self.fragments = {}
+        self.previous = {}
+        self.cache_dir = None
+        if not self.config.persist:
+            return
+        self.cache_dir = cache_dir
+        with diskcache.Cache(str(cache_dir)) as cache:
+            self.previous = cache.get(FRAGMENTS_CACHE_KEY, {})
+
+    def close(self):
+        "Persist the fragments used by this build"
+        if self.cache_dir is None:
+            return
+        with diskcache.Cache(str(self.cache_dir)) as cache:
+            cache.set(FRAGMENTS_CACHE_KEY, self.fragments)
+        self.cache_dir = None
+
+    def fetch(self, name, key, render):
+        """ Return a fragment, rendering it on the first use
+
+        Args:
+            name (str): fragment name.
+            key (str): fragment name, dependencies and block source digest.
+            render (callable): renders the fragment.
+
+        Returns:
+            str: the fragment html.
+        """
+        html = self.fragments.get(key)
+        hit = True
+        if html is None:
+            html = self.previous.get(key)
+            if html is None:
+                hit = False
+                html = str(render())
+            self.fragments[key] = html
+            if self.changes is not None:
+                self.changes[0][key] = html
+        counter = self.hits if hit else self.misses
+        counter[name] += 1
+        if self.changes is not None:
+            self.changes[1 if hit else 2][name] += 1
+        return html
+
+    def track_changes(self, enabled=True):
+        """ Record the fragments and counters changes so a forked rendering
+        process can send them back with `pop_changes()`
+
+        Args:
+            enabled (bool, optional): start or stop tracking. Defaults to
+            True.
+        """
+        self.changes = [{}, Counter(), Counter()] if enabled else None
+
+    def pop_changes(self):
+        """ Return the changes since the previous call
+
+        Returns:
+            list: new fragments indexed by key, hits and misses counters.
+        """
+        changes = self.changes
+        self.track_changes()
+        return changes
+
+    def merge_changes(self, changes):
+        "Add the changes recorded by another process"
+        fragments, hits, misses = changes
+        self.fragments.update(fragments)
+        self.hits.update(hits)
+        self.misses.update(misses)
+
+    def get_hit_rate(self):
+        "Return the fraction of the fragments served from the cache"
+        total = sum(self.hits.values()) + sum(self.misses.values())
+        if not total:
+            return 0
+        return sum(self.hits.values()) / total
+
+    def get_stats(self):
+        """ Return the hits and misses of each fragment
+
+        Returns:
+            list: [name, hits, misses] most used first.
+        """
+        names = set(self.hits) | set(self.misses)
+        stats = [[name, self.hits[name], self.misses[name]] for name in names]
+        return sorted(stats, key=lambda x: x[1] + x[2], reverse=True)
+
+
+class FragmentCacheExtension(Extension):
+    "Adds the `{% cache name, dependencies... %}` tag"
+    tags = set(['cache'])
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+
+        # editing the block invalidates its persisted fragments
+        source = "%s:%s" % (parser.name, repr(body))
+        digest = utils.hexdigest(source.encode('utf-8'))
+        call_args = [args[0], nodes.Const(digest), nodes.List(args[1:])]
+        call = self.call_method('_render_fragment', call_args)
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, name, digest, dependencies, caller):
+        cache = self.environment.fragment_cache
+        if not cache.config.enabled:
+            return caller()
+        deps = json.dumps(dependencies, sort_keys=True, default=str)
+        key = utils.hexdigest(("%s|%s|%s" % (name, digest, deps)).encode(
+            'utf-8'))
+        # the fragment is already rendered: it must not be escaped again
+        return Markup(cache.fetch(name, key, caller))
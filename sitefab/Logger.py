@@ -7,6 +7,10 @@ from jinja2 import Environment, FileSystemLoader
 
 from . import utils
 from . import files
+from .EventStore import EventStore
+
+# number of events per log page, 0 writes each log on a single page
+PAGE_SIZE = 0
 
 
 class Logger():
@@ -17,12 +21,18 @@ class Logger():
             a completly separated on to avoid interferring with user
             configuration. Templates are located in the config directory
             under internal_template/
+
+            Events are kept in a compact `EventStore` per log and written
+            on a single page or, when set, `page_size` events per page. With
+            `keep_ok_events` set to False OK events are only counted.
     """
     def __init__(self, config, site):
 
         self.config = config
         self.site = site  # reference to the main object
         self.logs = {}
+        self.severities = {site.OK: "OK", site.SKIPPED: "SKIPPED",
+                           site.ERROR: "ERROR"}
         self.jinja2 = Environment(loader=FileSystemLoader(
             str(self.config.template_dir)))
         files.clean_dir(self.config.output_dir)
@@ -44,8 +54,10 @@ class Logger():
             tag_stats[tag] = data.meta.num_posts
 
         template = self.jinja2.get_template(self.config.stats_template)
+        filters = self.site.plugins.get_template_filters_stats()
         rv = template.render(cats=cat_stats.most_common(),
-                             tags=tag_stats.most_common())
+                             tags=tag_stats.most_common(),
+                             filters=filters)
         files.write_file(self.config.output_dir, "stats.html", rv)
 
     def create_log(self, category, name, filename):
@@ -54,7 +66,9 @@ class Logger():
         """
         log = utils.dict_to_objdict()
         log.meta = utils.dict_to_objdict()
-        log.events = []
+        keep_ok_events = self.config.keep_ok_events is not False
+        log.events = EventStore(self.severities, self.site.OK,
+                                keep_ok_events)
 
         log.meta.name = name
         log.meta.category = category
@@ -74,26 +88,17 @@ class Logger():
         if log_id not in self.logs:
             return False
 
-        # recording event
-        event = utils.dict_to_objdict()
-        event.time = time.time()
-        event.target = target
-        event.severity = severity
-        event.details = details
-
-        self.logs[log_id].meta.num_events += 1
+        log = self.logs[log_id]
+        log.meta.num_events += 1
 
         # severity
         if severity == self.site.OK:
-            self.logs[log_id].meta.ok += 1
-            event.severity = "OK"
+            log.meta.ok += 1
         elif severity == self.site.SKIPPED:
-            event.severity = "SKIPPED"
-            self.logs[log_id].meta.skipped += 1
+            log.meta.skipped += 1
         elif severity == self.site.ERROR:
-            event.severity = "ERROR"
-            self.logs[log_id].meta.errors += 1
-        self.logs[log_id].events.append(event)
+            log.meta.errors += 1
+        log.events.add(time.time(), target, severity, details)
         return True
 
     def write_log(self, log_id):
@@ -103,9 +108,35 @@ class Logger():
             return False
         lg = self.logs[log_id]
         lg.meta.exec_time = round(time.time() - lg.meta.start_time, 2)
+        lg.meta.num_stored_events = len(lg.events)
         template = self.jinja2.get_template(str(self.config.log_template))
-        rv = template.render(events=lg.events, meta=lg.meta)
-        files.write_file(self.config.output_dir, lg.meta.filename, rv)
+
+        # each page is streamed to its file, only its events are in memory
+        page_size = self.config.page_size or PAGE_SIZE
+        if not page_size:
+            page_size = max(1, len(lg.events))
+        num_pages = lg.events.get_num_pages(page_size)
+        # linked from the log index as not all log templates paginate
+        lg.meta.pages = [get_page_filename(lg.meta.filename, page)
+                         for page in range(num_pages)]
+        for page in range(num_pages):
+            pagination = utils.create_objdict()
+            pagination.page = page + 1
+            pagination.num_pages = num_pages
+            pagination.prev = None
+            pagination.next = None
+            if page:
+                pagination.prev = get_page_filename(lg.meta.filename, page - 1)
+            if page + 1 < num_pages:
+                pagination.next = get_page_filename(lg.meta.filename,
+                                                    page + 1)
+            start = page * page_size
+            events = list(lg.events.iter_events(start, start + page_size))
+            chunks = template.generate(events=events, meta=lg.meta,
+                                       pagination=pagination)
+            files.write_stream(self.config.output_dir,
+                               get_page_filename(lg.meta.filename, page),
+                               chunks)
         return True
 
     def write_log_index(self):
@@ -119,3 +150,19 @@ class Logger():
         template = self.jinja2.get_template(self.config.log_index_template)
         rv = template.render(logs=logs)
         files.write_file(self.config.output_dir, "index.html", rv)
+
+
+def get_page_filename(filename, page):
+    """ Return the filename of a log page
+
+    Args:
+        filename (str): log filename e.g plugin.x.html
+        page (int): page index, starting at 0.
+
+    Returns:
+        str: filename for the first page, then e.g plugin.x.2.html
+    """
+    if not page:
+        return filename
+    base, ext = filename.rsplit('.', 1)
+    return "%s.%s.%s" % (base, page + 1, ext)
@@ -1,14 +1,63 @@
 import os
+import multiprocessing
+import time
+from bisect import bisect_right
 from tqdm import tqdm
 
 from . import utils, files
 
+# below that number of pages starting workers cost more than it saves
+MIN_PARALLEL_PAGES = 32
+
+# collections being rendered, inherited by the forked rendering workers
+RENDER_CONTEXT = {}
+
+
+def insort(posts, keys, key, post):
+    """Insert a post in a sorted list of posts
+
+    Args:
+        posts (list): posts sorted by key.
+        keys (list): sort key of each post.
+        key (tuple): sort key of the post.
+        post (Post): post to insert.
+    """
+    idx = bisect_right(keys, key)
+    keys.insert(idx, key)
+    posts.insert(idx, post)
+
+
+def render_page_worker(task):
+    """Render a collection page in a forked worker
+
+    Args:
+        task (list): collection name and page number.
+
+    Returns:
+        list: fragment cache changes, or None, and counters of the memoized
+        filters called, to merge in the main process.
+    """
+    collections = RENDER_CONTEXT['collections']
+    filters = collections.get_memoized_filters()
+    before = {name: flt.get_counters() for name, flt in filters.items()}
+    collections.render_page(*task)
+    fragment_cache = collections.get_fragment_cache()
+    fragment_changes = None
+    if fragment_cache is not None:
+        fragment_changes = fragment_cache.pop_changes()
+    filter_counters = {}
+    for name, flt in filters.items():
+        counters = flt.get_counters(before[name])
+        if any(counters):
+            filter_counters[name] = counters
+    return fragment_changes, filter_counters
+
 
 class PostCollections():
     "Handle posts collections"
 
     def __init__(self, site, template=None, output_path=None, web_path=None,
-                 min_posts=0):
+                 min_posts=0, page_size=0, threads=1):
         """Init the collections
 
             Args:
@@ -16,6 +65,8 @@ class PostCollections():
                 template (Template): the jinja2 template used to render the collections. If none can't be rendered (optional)
                 path (str): directory where to render the collections. If none can't be rendered (optional)
                 min_posts (int): minimal number of posts to render the category (optional)
+                page_size (int): number of posts per collection page, 0 to render all the posts on a single page (optional)
+                threads (int): number of processes used to render the pages (optional)
         """
 
         self.site = site
@@ -24,6 +75,23 @@ class PostCollections():
         self.output_path = output_path
         self.web_path = web_path
         self.min_posts = min_posts
+        self.page_size = page_size or 0
+        self.threads = threads or 1
+        self.sort_keys = {}  # collection name -> keys of its sorted lists
+
+    @staticmethod
+    def get_sort_key(post, date_field='creation_date_ts'):
+        """Return the key ordering the posts by date, most recent first
+
+        Args:
+            post (Post): post to sort.
+            date_field (str): timestamp field. Posts without update date use
+            their creation date.
+        Return:
+            tuple: negated timestamp then filename to break the ties.
+        """
+        ts = post.meta.get(date_field) or post.meta.creation_date_ts or 0
+        return (-ts, str(post.filename or ''))
 
     def add(self, name, post):
         """Create a Collection
@@ -38,6 +106,9 @@ class PostCollections():
         if name not in self.collections:
             collection = utils.dict_to_objdict()
             collection.posts = []
+            collection.posts_by_update_date = []
+            collection.by_year = {}
+            collection.by_month = {}
 
             collection.meta = utils.dict_to_objdict()
             collection.meta.name = name
@@ -47,19 +118,175 @@ class PostCollections():
                 url = url.replace(" ", "-").lower()
                 collection.meta.url  = url
             self.collections[name] = collection
-        self.collections[name].meta.num_posts += 1
-        self.collections[name].posts.append(post)
+            self.sort_keys[name] = {'posts': [], 'update': [], 'year': {},
+                                    'month': {}}
+        collection = self.collections[name]
+        keys = self.sort_keys[name]
+        collection.meta.num_posts += 1
+
+        # posts are kept sorted as they are added instead of sorted afterward
+        key = self.get_sort_key(post)
+        insort(collection.posts, keys['posts'], key, post)
+        update_key = self.get_sort_key(post, 'update_date_ts')
+        insort(collection.posts_by_update_date, keys['update'], update_key,
+               post)
+
+        if not post.meta.creation_date_ts:
+            return
+        date = time.localtime(post.meta.creation_date_ts)
+        year = date.tm_year
+        month = "%04d-%02d" % (date.tm_year, date.tm_mon)
+        for bucket, bucket_name in [['year', year], ['month', month]]:
+            posts = getattr(collection, 'by_' + bucket)
+            if bucket_name not in posts:
+                posts[bucket_name] = []
+                keys[bucket][bucket_name] = []
+            insort(posts[bucket_name], keys[bucket][bucket_name], key, post)
+
+    def get_sorted(self, name, order):
+        """Return the posts of a collection in a given order
+
+        Args:
+            name (str): collection name.
+            order (int): one of the SiteFab SORT_BY_* values.
+        Return:
+            list: the posts. Most recent first orders are the maintained
+            lists themselves, not copies.
+        """
+        collection = self.collections[name]
+        if order == 1:  # SORT_BY_CREATION_DATE_DESC
+            return collection.posts
+        elif order == 2:  # SORT_BY_CREATION_DATE
+            return collection.posts[::-1]
+        elif order == 3:  # SORT_BY_UPDATE_DATE_DESC
+            return collection.posts_by_update_date
+        elif order == 4:  # SORT_BY_UPDATE_DATE
+            return collection.posts_by_update_date[::-1]
+        raise ValueError("Unknown sort order %s" % order)
 
     def render(self):
-        "Render collections pages."
-
-        for collection in tqdm(self.get_as_list(), unit=' collections', miniters=1, desc="Collections"):
-                collection.meta.slug = collection.meta.name.replace(" ", "-").lower()
-                if collection.meta.num_posts >= self.min_posts:
-                    filename = "%s.html" % (collection.meta.slug)
-                    rv = self.template.render(posts=collection.posts, meta=collection.meta, plugin_data=self.site.plugin_data, config=self.site.config)
-                    new_path = os.path.join(self.output_path, collection.meta.slug)
-                    files.write_file(new_path, "index.html", rv)
+        """Render collections pages.
+
+        Collections are split in pages of `page_size` posts. Pages are
+        rendered by forked workers when there are enough of them: workers
+        inherit the collections so only the page to render is sent to them.
+        """
+        tasks = []
+        for collection in self.get_as_list():
+            collection.meta.slug = collection.meta.name.replace(" ", "-").lower()
+            if collection.meta.num_posts >= self.min_posts:
+                for page in range(1, self.get_num_pages(collection) + 1):
+                    tasks.append([collection.meta.name, page])
+
+        progress_bar = tqdm(total=len(tasks), unit=' pages', miniters=1,
+                            desc="Collections")
+        # the profiler measures are recorded in the rendering process
+        if (self.threads < 2 or len(tasks) < MIN_PARALLEL_PAGES or
+                self.site.template_profiler or
+                'fork' not in multiprocessing.get_all_start_methods()):
+            for task in tasks:
+                self.render_page(*task)
+                progress_bar.update(1)
+        else:
+            RENDER_CONTEXT['collections'] = self
+            # fragments rendered and filters stats recorded by the workers
+            # are sent back
+            fragment_cache = self.get_fragment_cache()
+            if fragment_cache is not None:
+                fragment_cache.track_changes()
+            filters = self.get_memoized_filters()
+            chunksize = max(1, len(tasks) // (self.threads * 4))
+            context = multiprocessing.get_context('fork')
+            with context.Pool(self.threads) as pool:
+                results = pool.imap_unordered(render_page_worker, tasks,
+                                              chunksize)
+                for changes, filter_counters in results:
+                    if changes:
+                        fragment_cache.merge_changes(changes)
+                    for name, counters in filter_counters.items():
+                        filters[name].merge_counters(counters)
+                    progress_bar.update(1)
+            if fragment_cache is not None:
+                fragment_cache.track_changes(False)
+            del RENDER_CONTEXT['collections']
+        progress_bar.close()
+
+    def get_fragment_cache(self):
+        """Return the fragment cache of the template environment
+        Return:
+            FragmentCache: the cache or None if the environment has none
+        """
+        return getattr(self.template.environment, 'fragment_cache', None)
+
+    def get_memoized_filters(self):
+        """Return the memoized template filters of the site plugins
+        Return:
+            dict: filters indexed by name, empty if the site has no plugins
+        """
+        plugins = self.site.plugins
+        if plugins is None:
+            return {}
+        return plugins.memoized_filters
+
+    def get_num_pages(self, collection):
+        """Return the number of pages of a collection
+        Return:
+            int: number of pages, at least one
+        """
+        if not self.page_size:
+            return 1
+        num_posts = len(collection.posts)
+        return max(1, (num_posts + self.page_size - 1) // self.page_size)
+
+    def get_page_url(self, collection, page):
+        """Return the url of a collection page
+        Return:
+            str: the collection url for the first page then url/page/N/
+        """
+        url = collection.meta.url or "/%s" % collection.meta.slug
+        if page == 1:
+            return url
+        return "%s/page/%s/" % (url.rstrip('/'), page)
+
+    def render_page(self, name, page):
+        """Render a page of a collection
+
+        Args:
+            name (str): collection name.
+            page (int): page number, starting at 1.
+        """
+        collection = self.collections[name]
+        num_pages = self.get_num_pages(collection)
+        posts = collection.posts
+        if self.page_size:
+            start = (page - 1) * self.page_size
+            posts = posts[start:start + self.page_size]
+
+        pagination = utils.create_objdict()
+        pagination.page = page
+        pagination.num_pages = num_pages
+        pagination.page_size = self.page_size
+        pagination.url = self.get_page_url(collection, page)
+        pagination.prev_url = None
+        pagination.next_url = None
+        if page > 1:
+            pagination.prev_url = self.get_page_url(collection, page - 1)
+        if page < num_pages:
+            pagination.next_url = self.get_page_url(collection, page + 1)
+
+        context = dict(posts=posts, meta=collection.meta,
+                       pagination=pagination,
+                       collection=collection,
+                       index=self.site.index,
+                       plugin_data=self.site.plugin_data,
+                       config=self.site.config)
+        if self.site.template_profiler:
+            context = self.site.template_profiler.wrap_context(context)
+        rv = self.template.render(**context)
+        new_path = os.path.join(self.output_path, collection.meta.slug)
+        if page > 1:
+            new_path = os.path.join(new_path, 'page', str(page))
+        files.write_file(new_path, "index.html", rv)
 
     def get_as_list(self):
         """Returns the collections as lists
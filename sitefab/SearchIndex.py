@@ -0,0 +1,355 @@
+""" Prebuilt static search index
+"""
+import re
+import json
+import base64
+from collections import defaultdict
+
+import diskcache
+
+from sitefab import files
+from sitefab import utils
+
+RE_WORD = re.compile(r'\w+')
+
+FORMAT_VERSION = 1
+STATE_CACHE_KEY = 'search_index'
+MANIFEST_FILENAME = 'index.json'
+MAX_WEIGHT = 255
+
+
+def encode_postings(postings):
+    """ Encode a posting list as delta + varint bytes
+
+    Args:
+        postings (list): [doc number, weight] sorted by doc number.
+
+    Returns:
+        bytes: for each posting the varint of the gap with the previous
+        doc number followed by the varint of the weight.
+    """
+    encoded = bytearray()
+    previous = 0
+    for doc_num, weight in postings:
+        for value in (doc_num - previous, weight):
+            while value >= 0x80:
+                encoded.append((value & 0x7F) | 0x80)
+                value >>= 7
+            encoded.append(value)
+        previous = doc_num
+    return bytes(encoded)
+
+
+def decode_postings(encoded):
+    """ Decode a posting list encoded by `encode_postings()`
+
+    Args:
+        encoded (bytes): encoded posting list.
+
+    Returns:
+        list: [doc number, weight] sorted by doc number.
+    """
+    values = []
+    value = 0
+    shift = 0
+    for byte in encoded:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = 0
+            shift = 0
+    postings = []
+    doc_num = 0
+    for idx in range(0, len(values), 2):
+        doc_num += values[idx]
+        postings.append([doc_num, values[idx + 1]])
+    return postings
+
+
+class SearchIndex():
+    """ Inverted index of the posts sharded by word prefix
+
+    Words come from the post key terms, cleaned title and tags. The postings
+    of all the words starting with the same prefix are stored in a shard so
+    the browser only downloads the shards of the words typed. Shards names
+    are their content hash so they can be cached forever by the clients.
+
+    The index state is kept in the cache directory: posts that did not
+    change since the previous build keep their document number and words,
+    and only the shards containing words of changed posts are re-encoded.
+    """
+
+    def __init__(self, config, cache_dir):
+        """ Load the previous index state
+
+        Args:
+            config (objdict): `search_index` section of the site config.
+            cache_dir (Path): directory used to persist the index state.
+        """
+        self.config = SearchIndex.make_config(config)
+        self.cache_dir = cache_dir
+        self.state = self.load_state()
+
+        self.docs = []  # doc number -> [title, url] or None
+        self.num_posts_updated = 0
+        self.num_shards_updated = 0
+
+    @staticmethod
+    def make_config(config=None):
+        """ Initialize the search index config with the default values
+
+        Args:
+            config (objdict, optional): `search_index` section of the site
+            config.
+
+        Returns:
+            objdict: the initialized configuration.
+        """
+        config = utils.create_objdict(config)
+        defaults = {
+            'enabled': False,
+            'output_dir': 'search',
+            'prefix_len': 2,
+            'min_word_len': 2,
+            'title_boost': 1.0,
+            'tag_boost': 1.0
+        }
+        return utils.set_defaults(config, defaults)
+
+    def get_config_digest(self):
+        "Digest of the settings that change the index content"
+        settings = [FORMAT_VERSION, self.config.prefix_len,
+                    self.config.min_word_len, self.config.title_boost,
+                    self.config.tag_boost]
+        return utils.hexdigest(json.dumps(settings).encode('utf-8'))
+
+    def load_state(self):
+        "Return the persisted state or an empty one if the settings changed"
+        with diskcache.Cache(str(self.cache_dir)) as cache:
+            state = cache.get(STATE_CACHE_KEY)
+        if not state or state['config'] != self.get_config_digest():
+            state = {
+                'config': self.get_config_digest(),
+                'docs': {},  # filename -> [doc number, digest, words]
+                'free': [],  # doc numbers of deleted posts
+                'postings': {},  # prefix -> word -> doc number -> weight
+                'shards': {}  # prefix -> [shard digest, encoded shard]
+            }
+        return state
+
+    def save_state(self):
+        "Persist the index state for the next build"
+        with diskcache.Cache(str(self.cache_dir)) as cache:
+            cache.set(STATE_CACHE_KEY, self.state)
+
+    def get_post_words(self, post):
+        """ Compute the weight of the words of a post
+
+        Key terms weights are normalized by the post highest weight. Title
+        and tags words get an additional boost. Weights are quantized on a
+        byte to keep the postings small.
+
+        Args:
+            post (objdict): post to index.
+
+        Returns:
+            dict: weight indexed by word.
+        """
+        weights = defaultdict(float)
+        terms = self.get_post_terms(post)
+        max_weight = max([weight for _, weight in terms] or [0])
+        if max_weight > 0:
+            for term, weight in terms:
+                weight = weight / max_weight
+                for word in self.tokenize(term):
+                    if weight > weights[word]:
+                        weights[word] = weight
+
+        for word in set(self.tokenize(self.get_post_title(post))):
+            weights[word] += self.config.title_boost
+
+        for word in set(self.tokenize(" ".join(post.meta.tags or []))):
+            weights[word] += self.config.tag_boost
+
+        scale = MAX_WEIGHT / (1.0 + self.config.title_boost +
+                              self.config.tag_boost)
+        words = {}
+        for word, weight in weights.items():
+            words[word] = max(1, min(MAX_WEIGHT, int(round(weight * scale))))
+        return words
+
+    def get_post_terms(self, post):
+        "Return the post [term, weight] list"
+        if post.nlp and post.nlp.terms:
+            return post.nlp.terms
+        return []
+
+    def get_post_title(self, post):
+        "Return the cleaned title if available else the title"
+        if post.nlp and post.nlp.clean_fields and post.nlp.clean_fields.title:
+            return post.nlp.clean_fields.title
+        return post.meta.title or ''
+
+    def get_post_digest(self, post):
+        "Digest of the post fields used by the index"
+        fields = [self.get_post_terms(post), self.get_post_title(post),
+                  post.meta.tags, post.meta.title, post.meta.permanent_url]
+        return utils.hexdigest(json.dumps(fields).encode('utf-8'))
+
+    def tokenize(self, text):
+        "Split a text into lowercase words long enough to be indexed"
+        min_len = self.config.min_word_len
+        return [w for w in RE_WORD.findall(str(text).lower())
+                if len(w) >= min_len]
+
+    def build(self, posts):
+        """ Update the index with the current posts
+
+        Args:
+            posts (list): posts to index.
+        """
+        previous_docs = self.state['docs']
+        postings = self.state['postings']
+        free = sorted(self.state['free'], reverse=True)
+        reserved = [d[0] for d in previous_docs.values()] + free
+        next_num = max(reserved or [-1]) + 1
+        docs = {}
+        dirty_prefixes = set()
+        self.num_posts_updated = 0
+
+        for post in posts:
+            digest = self.get_post_digest(post)
+            previous = previous_docs.get(post.filename)
+            if previous and previous[1] == digest:
+                docs[post.filename] = previous
+                continue
+
+            self.num_posts_updated += 1
+            if previous:
+                doc_num = previous[0]
+                self.remove_postings(doc_num, previous[2], dirty_prefixes)
+            elif free:
+                doc_num = free.pop()
+            else:
+                doc_num = next_num
+                next_num += 1
+            words = self.get_post_words(post)
+            docs[post.filename] = [doc_num, digest, words]
+            self.add_postings(doc_num, words, dirty_prefixes)
+
+        # deleted posts free their doc number
+        for filename, previous in previous_docs.items():
+            if filename not in docs:
+                free.append(previous[0])
+                self.remove_postings(previous[0], previous[2],
+                                     dirty_prefixes)
+
+        self.docs = [None] * next_num
+        for post in posts:
+            doc_num = docs[post.filename][0]
+            self.docs[doc_num] = [post.meta.title, post.meta.permanent_url]
+
+        # only the shards containing a changed word are re-encoded
+        self.num_shards_updated = 0
+        for prefix in dirty_prefixes:
+            if prefix not in postings:
+                del self.state['shards'][prefix]
+                continue
+            content = {}
+            for word, word_postings in sorted(postings[prefix].items()):
+                encoded = encode_postings(sorted(word_postings.items()))
+                content[word] = base64.b64encode(encoded).decode('ascii')
+            encoded = json.dumps(content, separators=(',', ':'),
+                                 ensure_ascii=False).encode('utf-8')
+            self.state['shards'][prefix] = [utils.hexdigest(encoded)[:12],
+                                            encoded]
+            self.num_shards_updated += 1
+
+        self.state['docs'] = docs
+        self.state['free'] = sorted(free)
+        self.save_state()
+
+    def add_postings(self, doc_num, words, dirty_prefixes):
+        "Add a document words to the postings"
+        prefix_len = self.config.prefix_len
+        postings = self.state['postings']
+        for word, weight in words.items():
+            prefix = word[:prefix_len]
+            postings.setdefault(prefix, {}).setdefault(word, {})[doc_num] = \
+                weight
+            dirty_prefixes.add(prefix)
+
+    def remove_postings(self, doc_num, words, dirty_prefixes):
+        "Remove a document words from the postings"
+        prefix_len = self.config.prefix_len
+        postings = self.state['postings']
+        for word in words:
+            prefix = word[:prefix_len]
+            del postings[prefix][word][doc_num]
+            if not postings[prefix][word]:
+                del postings[prefix][word]
+                if not postings[prefix]:
+                    del postings[prefix]
+            dirty_prefixes.add(prefix)
+
+    def get_num_shards(self):
+        "Return the number of shards"
+        return len(self.state['shards'])
+
+    def get_num_words(self):
+        "Return the number of indexed words"
+        words = set()
+        for _, _, doc_words in self.state['docs'].values():
+            words.update(doc_words)
+        return len(words)
+
+    def get_shard(self, prefix):
+        """ Return the decoded postings of a shard
+
+        Args:
+            prefix (str): shard prefix.
+
+        Returns:
+            dict: [doc number, weight] list indexed by word.
+        """
+        if prefix not in self.state['shards']:
+            return {}
+        content = json.loads(self.state['shards'][prefix][1].decode('utf-8'))
+        return {word: decode_postings(base64.b64decode(postings))
+                for word, postings in content.items()}
+
+    def write(self, output_dir):
+        """ Write the manifest, documents table and shards
+
+        Args:
+            output_dir (Path): directory where to write the index.
+
+        Returns:
+            str: manifest filename.
+        """
+        docs = json.dumps(self.docs, separators=(',', ':'),
+                          ensure_ascii=False).encode('utf-8')
+        docs_fname = "docs.%s.json" % utils.hexdigest(docs)[:12]
+        files.write_file(output_dir, docs_fname, docs, binary=True)
+
+        manifest = {
+            'version': FORMAT_VERSION,
+            'prefix_len': self.config.prefix_len,
+            'min_word_len': self.config.min_word_len,
+            'max_weight': MAX_WEIGHT,
+            'docs': docs_fname,
+            'shards': {}
+        }
+        for prefix, (digest, encoded) in sorted(self.state['shards'].items()):
+            shard_fname = "%s.json" % digest
+            manifest['shards'][prefix] = shard_fname
+            files.write_file(output_dir, shard_fname, encoded,
+                             binary=True)
+
+        content = json.dumps(manifest, separators=(',', ':'),
+                             ensure_ascii=False).encode('utf-8')
+        files.write_file(output_dir, MANIFEST_FILENAME, content,
+                         binary=True)
+        return MANIFEST_FILENAME
@@ -16,16 +16,40 @@ from sitefab.parser import Parser
 from sitefab.Logger import Logger
 from sitefab.plugins import Plugins
 from sitefab.PostCollections import PostCollections
+from sitefab.TermMatrix import TermMatrix
+from sitefab.SearchIndex import SearchIndex
+from sitefab.SiteIndex import SiteIndex
+from sitefab.AssetIndex import AssetIndex
+from sitefab.BuildHistory import BuildHistory
+from sitefab.FragmentCache import FragmentCache, FragmentCacheExtension
+from sitefab.TemplateProfiler import TemplateProfiler, enable_profiling
 from sitefab.linter.linter import Linter
 from sitefab import utils
 from sitefab import nlp
 
 
+def init_parse_worker(nlp_config, word_stats_dir):
+    """Initialize the NLP state of a parsing worker
+
+    Args:
+        nlp_config (dict): nlp config.
+        word_stats_dir (str): directory of the word statistics cache.
+    """
+    nlp.configure(utils.dict_to_objdict(nlp_config))
+    nlp.init_word_stats(word_stats_dir)
+
+
 def parse_post(json_post):
+    """Perform the NLP analysis of a post
+
+    Returns:
+        list: the json serialized post and the new word statistics computed
+        by the worker so they can be persisted by the main process.
+    """
     post_dict = json.loads(json_post)
     post = utils.dict_to_objdict(post_dict)
     post.nlp = nlp.analyze_post(post)
-    return json.dumps(post)
+    return [json.dumps(post), nlp.WORD_STATS.pop_new_words()]
 
 
 class SiteFab(object):
@@ -43,7 +67,16 @@ class SiteFab(object):
     SKIPPED = 2
     ERROR = 3
 
-    def __init__(self, config_filename, version='1.0'):
+    def __init__(self, config_filename, version='1.0', lint_only=False):
+        """ Load the site configuration and initialize the build
+
+        Args:
+            config_filename (str): path of the site config file.
+            version (str, optional): sitefab version. Defaults to '1.0'.
+            lint_only (bool, optional): only initialize what the linter
+            and the parser need: no plugins, templates, logger and the output
+            and logs directories are not cleaned. Defaults to False.
+        """
 
         # Timers
         self.cnts = PerfCounters()
@@ -80,6 +113,47 @@ class SiteFab(object):
 
         self.config.parser = Parser.make_config(self.config.parser)
 
+        # [nlp] #
+        self.config.nlp = nlp.make_config(self.config.nlp)
+
+        # [search index] #
+        self.config.search_index = SearchIndex.make_config(
+            self.config.search_index)
+
+        # [site index] #
+        self.config.site_index = SiteIndex.make_config(self.config.site_index)
+        self.index = SiteIndex(self.config.site_index)
+
+        # [fragment cache] #
+        self.config.fragment_cache = FragmentCache.make_config(
+            self.config.fragment_cache)
+
+        # [template profiler] #
+        self.config.template_profiler = TemplateProfiler.make_config(
+            self.config.template_profiler)
+        self.template_profiler = None  # see init of the rendering engine
+
+        # [perf history] #
+        self.config.perf_history = BuildHistory.make_config(
+            self.config.perf_history)
+
+        # Store data generated by plugins that can be used later.
+        self.plugin_data = {}
+        self.plugin_results = defaultdict(int)
+
+        # files of the site, indexed on first use
+        self.assets = None
+
+        # recorded in the build history by finale()
+        self.post_timings = {}  # post filename -> rendering seconds
+        self.build_counters = {}  # e.g caches hit rates
+
+        if lint_only:
+            self.init_linter()
+            self.find_content()
+            self.cnts.stop('Init')
+            return
+
         # [plugins]
 
         # loading configuration
@@ -100,17 +174,23 @@ class SiteFab(object):
         self.plugins = Plugins(self.get_plugins_dirs(),
                                debug_log_fname, plugins_config)
 
-        # Store data generated by plugins that can be used later.
-        self.plugin_data = {}
-        self.plugin_results = defaultdict(int)
-
         # [template rendering engine] #
         self.jinja2 = Environment(loader=FileSystemLoader(
                                   str(self.get_template_dir())),
-                                  extensions=['jinja2.ext.do'])
+                                  extensions=['jinja2.ext.do',
+                                              FragmentCacheExtension])
+        self.jinja2.fragment_cache.config = self.config.fragment_cache
+        if self.config.template_profiler.enabled:
+            self.template_profiler = TemplateProfiler(
+                self.config.template_profiler)
+            enable_profiling(self.jinja2, self.template_profiler)
 
         # loading templates custom functions
-        custom_filters = self.plugins.get_template_filters()
+        # outputs cached per pure filter
+        cache_size = self.config.plugins.filter_cache_size
+        if cache_size is None:
+            cache_size = 1024
+        custom_filters = self.plugins.get_template_filters(cache_size)
         for flt_name, flt_fct in custom_filters.items():
             self.jinja2.filters[flt_name] = flt_fct
 
@@ -126,9 +206,21 @@ class SiteFab(object):
         cfg.log_template = "log.html"
         cfg.log_index_template = "log_index.html"  # noqa
         cfg.stats_template = "stats.html"
+        cfg.keep_ok_events = self.config.logger.keep_ok_events
+        cfg.page_size = self.config.logger.page_size
         self.logger = Logger(cfg, self)
 
         # [linter] #
+        self.init_linter()
+
+        self.find_content()
+
+        # Cleanup the output directories.
+        files.clean_dir(self.get_output_dir())
+        self.cnts.stop('Init')
+
+    def init_linter(self):
+        "Load the linter configuration and create the linter"
         linter_config_filename = (self.config.root_dir /
                                   self.config.linter.configuration_file)
         linter_config = files.load_config(linter_config_filename)
@@ -140,15 +232,12 @@ class SiteFab(object):
         linter_config.site_output_dir = self.get_output_dir()
         self.linter = Linter(linter_config)
 
-        # Finding content and assets.
+    def find_content(self):
+        "Find the posts files"
         self.filenames = utils.create_objdict()
         self.filenames.posts = files.get_files_list(self.get_content_dir(),
                                                     "*.md")
 
-        # Cleanup the output directories.
-        files.clean_dir(self.get_output_dir())
-        self.cnts.stop('Init')
-
     def preprocessing(self):
         "Perform pre-processing tasks"
         self.cnts.start('Preprocessing')
@@ -171,7 +260,9 @@ class SiteFab(object):
 
         self.posts_by_tag = PostCollections(
             site=self, template=tlp, output_path=path,
-            web_path=self.config.collections.output_dir, min_posts=min_posts)
+            web_path=self.config.collections.output_dir, min_posts=min_posts,
+            page_size=self.config.collections.page_size,
+            threads=self.config.threads)
 
         self.posts_by_category = PostCollections(
             site=self, web_path=self.config.collections.output_dir)
@@ -191,7 +282,34 @@ class SiteFab(object):
         # but it is required to get the pluging workings
         parser = Parser(self.config.parser, self)
 
-        if threads > 1:
+        # only the parts of the NLP analysis that are consumed are computed
+        nlp_parts = self.get_nlp_parts()
+        nlp_config = utils.objdict_to_dict(self.config.nlp)
+        nlp_config['parts'] = sorted(nlp_parts)
+
+        # syllables counts are shared across posts and builds
+        word_stats_dir = str(self.get_cache_dir() / 'word_stats')
+        if nlp_parts:
+            init_parse_worker(nlp_config, word_stats_dir)
+
+        # record which key terms extractor ran for each post
+        nlp_log_id = None
+        if 'terms' in nlp_parts:
+            nlp_log_id = self.logger.create_log("parsing", "NLP",
+                                                "parsing.nlp.html")
+
+        if not nlp_parts:
+            # nothing consumes the NLP analysis: spacy is not used at all.
+            for filename in filenames:
+                file_content = files.read_file(filename)
+                post = parser.parse(file_content)
+                post.filename = str(filename)
+                post.id = post_idx
+                post.nlp = utils.create_objdict()
+                self.process_post(post)
+                progress_bar.update(1)
+                post_idx += 1
+        elif threads > 1:
             todo_nlp_posts = []
             for filename in filenames:
                 file_content = files.read_file(filename)
@@ -200,10 +318,14 @@ class SiteFab(object):
                 post.id = post_idx
                 post_idx += 1
                 todo_nlp_posts.append(json.dumps(post))
-            pool = Pool(threads)
-            for parsed_post_json in pool.imap_unordered(parse_post, todo_nlp_posts):
+            pool = Pool(threads, initializer=init_parse_worker,
+                        initargs=(nlp_config, word_stats_dir))
+            for parsed_post_json, new_words in pool.imap_unordered(
+                    parse_post, todo_nlp_posts):
+                nlp.WORD_STATS.update(new_words)
                 parsed_post = json.loads(parsed_post_json)
                 post = utils.dict_to_objdict(parsed_post)
+                self.record_nlp_event(nlp_log_id, post)
                 self.process_post(post)
                 progress_bar.update(1)
             pool.close()
@@ -214,12 +336,23 @@ class SiteFab(object):
                 post = parser.parse(file_content)
                 post.filename = str(filename)
                 post.id = post_idx
-                parsed_post_json = parse_post(json.dumps(post))
-                parsed_post = json.loads(parsed_post_json)
-                self.process_post(utils.dict_to_objdict(parsed_post))
+                parsed_post_json, new_words = parse_post(json.dumps(post))
+                nlp.WORD_STATS.update(new_words)
+                parsed_post = utils.dict_to_objdict(json.loads(
+                    parsed_post_json))
+                self.record_nlp_event(nlp_log_id, parsed_post)
+                self.process_post(parsed_post)
                 progress_bar.update(1)
                 post_idx += 1
-    
+        if nlp_parts:
+            nlp.WORD_STATS.save(word_stats_dir)
+        if nlp_log_id:
+            self.logger.write_log(nlp_log_id)
+
+        # site wide post x term matrix shared by the plugins
+        if 'terms' in nlp_parts:
+            self.plugin_data['term_matrix'] = TermMatrix(self.posts)
+
         progress_bar.close()
         if len(errors):
             utils.error("\n".join(errors))
@@ -227,6 +360,43 @@ class SiteFab(object):
         self.cnts.stop('Parsing')
 
 
+    def get_nlp_parts(self):
+        """Return which parts of the NLP analysis the site uses
+
+        The parts listed in the nlp config `parts` setting if any, otherwise
+        the ones needed by the fields consumed by the enabled plugins and the
+        templates.
+
+        Returns:
+            set: analysis parts e.g terms, stats. Empty if NLP is not used.
+        """
+        if self.config.nlp.parts is not None:
+            return set(self.config.nlp.parts)
+
+        fields = self.plugins.get_consumed_fields()
+        if self.config.search_index.enabled:
+            fields.update(['nlp.terms', 'nlp.clean_fields'])
+        for fname in files.get_files_list(self.get_template_dir(), "*.html"):
+            fields.update(nlp.get_template_fields(files.read_file(fname)))
+        return nlp.fields_to_parts(fields)
+
+    def record_nlp_event(self, log_id, post):
+        """Log which key terms extractor was used for a post
+
+        Args:
+            log_id (str): NLP log id.
+            post (objdict): analyzed post.
+        """
+        if not log_id:
+            return
+        algo = post.nlp.term_extractor
+        details = "key terms extracted with %s" % algo
+        if algo != self.config.nlp.term_extractor:
+            details += " (%s exceeded the %ss time budget)" % (
+                self.config.nlp.term_extractor, self.config.nlp.time_budget)
+        target = post.meta.title or post.filename
+        self.logger.record_event(log_id, target, self.OK, details)
+
     def process_post(self, post):
          # do not process hidden post
         if post.meta.hidden:
@@ -284,20 +454,54 @@ class SiteFab(object):
         self.execute_plugins(self.posts_by_microdata.get_as_list(),
                              "CollectionProcessor", " microdata")
 
+        # posts lookups for the site plugins and the templates
+        self.index.build(self.posts)
+
         # site wide processing
         print("\nSite wide plugins")
         self.execute_plugins([1], "SiteProcessor", " site")
         self.cnts.stop('Processing')
 
+    def lint(self):
+        "Linting stage: stop before rendering when errors are fatal"
+        self.cnts.start('Linting')
+        # plugins wrote files in the output dir since the previous scan
+        self.get_asset_index(refresh=True)
+        results = self.linter.lint_posts(self.posts, self,
+                                         self.config.threads)
+        self.cnts.stop('Linting')
+
+        # Are we stopping on linting errors?
+        if self.config.linter.stop_on_error:
+            has_errors = False
+            for filename, post_results in results.items():
+                if post_results.has_errors:
+                    has_errors = True
+                    print(filename)
+                    for err in post_results.info:
+                        print("\t-%s:%s" % (err[0], err[1]))
+            if has_errors:
+                sys.exit(-1)
+
     def render(self):
         "Rendering stage"
 
         self.cnts.start('Rendering')
+        if self.config.search_index.enabled:
+            print("\nRendering search index")
+            self.render_search_index()
+
+        fragment_cache = self.jinja2.fragment_cache
+        fragment_cache.open(self.get_cache_dir() / 'fragments')
         print("\nRendering posts")
         self.render_posts()
 
         print("\nRendering collections")
         self.posts_by_tag.render()
+        fragment_cache.close()
+        if fragment_cache.get_stats():
+            self.build_counters['cache.fragments'] = (
+                fragment_cache.get_hit_rate())
 
         print("\nAdditional Rendering")
         self.execute_plugins([1], "SiteRendering", " pages")
@@ -316,6 +520,8 @@ class SiteFab(object):
         cprint("\nPerformance", 'magenta')
         self.cnts.stop_all()
         self.cnts.report()
+        if self.config.perf_history.enabled:
+            self.record_build()
 
         cprint("Content", 'magenta')
         cprint("|-Num posts: %s" % len(self.posts), "cyan")
@@ -342,6 +548,35 @@ class SiteFab(object):
             cprint("|-Num Errors:%s" %
                    self.plugin_results[self.ERROR], 'red')
 
+        for stats in self.plugins.get_template_filters_stats():
+            cprint("|-Filter %s: %s hits, %s misses, %.3fs" % (
+                   stats['name'], stats['hits'], stats['misses'],
+                   stats['time']), 'blue')
+
+        # TEMPLATES
+        fragments_stats = self.jinja2.fragment_cache.get_stats()
+        if fragments_stats:
+            cprint("\nFragment cache", 'magenta')
+            cprint("|-Hit rate: %d%%" % (
+                   self.jinja2.fragment_cache.get_hit_rate() * 100), 'cyan')
+            for name, hits, misses in fragments_stats:
+                cprint("|-%s: %s hits, %s misses" % (name, hits, misses),
+                       'blue')
+
+        if self.template_profiler:
+            cprint("\nTemplates profile", 'magenta')
+            profiler = self.template_profiler
+            num_printed = self.config.template_profiler.num_printed
+            for name, calls, seconds in profiler.get_timings()[:num_printed]:
+                cprint("|-%s: %.3fs (%s calls)" % (name, seconds, calls),
+                       'blue')
+            for name, key, iterations, items in (
+                    profiler.get_iterations()[:num_printed]):
+                cprint("|-%s iterated %s %s times (%s items)" % (
+                       name, key, iterations, items), 'yellow')
+            path = profiler.write_report(self.get_logs_dir())
+            cprint('|-Report: %s' % path, 'cyan')
+
         # LINTER
         cprint("\nLinter", 'magenta')
         self.linter.render_report()  # write the logs
@@ -352,6 +587,10 @@ class SiteFab(object):
                self.linter.num_post_with_warnings(), 'yellow')
         cprint("|-Posts with errors:%s" % self.linter.num_post_with_errors(),
                'red')
+        for rule_stats in self.linter.get_slowest_rules():
+            cprint("|-Rule %s: %.3fs (%s calls)" % (
+                   rule_stats['name'], rule_stats['time'],
+                   rule_stats['calls']), 'blue')
 
         # Output
         cprint("\nOutput", 'magenta')
@@ -359,6 +598,8 @@ class SiteFab(object):
                'blue')
         cprint('|-Linter log: %s' % (self.get_logs_dir() / 'linter.html'),
                'cyan')
+        cprint('|-Linter rules summary: %s' % (
+               self.get_logs_dir() / 'linter_rules.html'), 'cyan')
         cprint('|-Generated site: %s' % (self.get_output_dir()), 'yellow')
 
         cprint('Generation complete - site is ready :)', 'green')
@@ -366,34 +607,125 @@ class SiteFab(object):
     # Post functions #
     def render_posts(self):
         """Render posts using jinja2 templates."""
+        self.linter.open_html_cache(self.get_cache_dir() / 'linter')
         for post in tqdm(self.posts, unit=' pages', miniters=1, desc="Posts"):
+            start = time.perf_counter()
             template_name = "%s.html" % post.meta.template
             template = self.jinja2.get_template(template_name)
-            rv = template.render(content=post.html, meta=post.meta,
-                                 year=datetime.today().year,
-                                 posts=self.posts,
-                                 plugin_data=self.plugin_data,
-                                 config=self.config,
-                                 categories=self.posts_by_category.get_as_dict(),  # noqa: E501
-                                 tags=self.posts_by_tag.get_as_dict(),
-                                 templates=self.posts_by_template.get_as_dict(),  # noqa: E501
-                                 microdata=self.posts_by_microdata.get_as_dict()  # noqa: E501
-                                )
-
-            # Linting
-            linter_results = self.linter.lint(post, rv, self)
-            # Are we stopping on linting errors?
-            if linter_results.has_errors and self.config.linter.stop_on_error:
-                print(post.filename)
-                for err in linter_results.info:
-                    print("\t-%s:%s" % (err[0], err[1]))
-                sys.exit(-1)
+            context = dict(content=post.html, meta=post.meta,
+                           year=datetime.today().year,
+                           posts=self.posts,
+                           index=self.index,
+                           plugin_data=self.plugin_data,
+                           config=self.config,
+                           categories=self.posts_by_category.get_as_dict(),
+                           tags=self.posts_by_tag.get_as_dict(),
+                           templates=self.posts_by_template.get_as_dict(),
+                           microdata=self.posts_by_microdata.get_as_dict())
+            if self.template_profiler:
+                context = self.template_profiler.wrap_context(context)
+            rv = template.render(**context)
 
             perm_url = post.meta.permanent_url
             if len(perm_url) and perm_url[0] == '/':
                 perm_url = perm_url[1:]
             path = self.get_output_dir() / perm_url
             files.write_file(path, 'index.html', rv)
+            self.linter.lint_html(post, rv)
+            self.post_timings[post.filename] = time.perf_counter() - start
+        self.linter.close_html_cache()
+        if self.posts:
+            self.build_counters['cache.linter_html'] = (
+                self.linter.html_cache_hits / len(self.posts))
+
+    def render_search_index(self):
+        """Build the static search index and write it in the output dir.
+
+        The index manifest url is available to the templates and plugins
+        as `plugin_data['search_index']`.
+        """
+        config = self.config.search_index
+        index = SearchIndex(config, self.get_cache_dir() / 'search_index')
+        index.build(self.posts)
+        path = self.get_output_dir() / config.output_dir
+        manifest = index.write(path)
+        self.plugin_data['search_index'] = "/%s/%s" % (
+            config.output_dir.strip('/'), manifest)
+        if self.posts:
+            self.build_counters['cache.search_index'] = 1 - (
+                index.num_posts_updated / len(self.posts))
+        cprint("|-Posts updated: %s/%s" % (
+            index.num_posts_updated, len(self.posts)), 'cyan')
+        cprint("|-Shards updated: %s/%s" % (
+            index.num_shards_updated, index.get_num_shards()), 'yellow')
+
+    # Build history functions #
+    def get_build_history(self):
+        "Return the build history database stored in the cache dir"
+        return BuildHistory(self.get_cache_dir() / 'history.sqlite')
+
+    def record_build(self):
+        """Record the build timings and counters in the build history and
+        report the regressions compared to the previous builds.
+        """
+        stages = self.cnts.get_all()['Timing counters']
+        timings = {
+            BuildHistory.STAGE: dict(stages),
+            BuildHistory.PLUGIN: {},
+            BuildHistory.POST: self.post_timings
+        }
+        for log in self.logger.logs.values():
+            if log.meta.exec_time is not None:
+                name = "%s:%s" % (log.meta.category, log.meta.name)
+                timings[BuildHistory.PLUGIN][name] = log.meta.exec_time
+        for stats in self.plugins.get_template_filters_stats():
+            name = "TemplateFilter:%s" % stats['name']
+            timings[BuildHistory.PLUGIN][name] = stats['time']
+
+        counters = dict(self.build_counters)
+        counters['num_posts'] = len(self.posts)
+        if self.assets and self.assets.get_num_assets():
+            counters['cache.assets'] = 1 - (self.assets.num_files_read /
+                                            self.assets.get_num_assets())
+
+        config = self.config.perf_history
+        build_history = self.get_build_history()
+        build_id = build_history.add_build(
+            self.config.build.sitefab_version, len(self.posts), timings,
+            counters, config.max_builds)
+        regressions = build_history.find_regressions(config)
+        build_history.close()
+
+        cprint("|-Build history: build #%s" % build_id, 'cyan')
+        for kind, name, previous, seconds, percent in regressions:
+            cprint("|-Regression %s %s: %.2fs vs %.2fs (+%d%%)" % (
+                   kind, name, seconds, previous, percent), 'red')
+
+    # Assets functions #
+    def get_asset_index(self, refresh=False):
+        """Return the index of the content, static and output files.
+
+        The directories are walked the first time the index is requested,
+        plugins should use it instead of listing directories themselves.
+
+        Args:
+            refresh (bool, optional): walk the directories again to see the
+            files created since the index was built. Defaults to False.
+
+        Returns:
+            AssetIndex: the asset index.
+        """
+        if self.assets is None:
+            roots = [[self.get_content_dir(), None],
+                     [self.get_output_dir(), '/']]
+            if self.config.dir.static:
+                roots.append([self.config.root_dir / self.config.dir.static,
+                              None])
+            self.assets = AssetIndex(roots, self.get_cache_dir() / 'assets')
+            refresh = True
+        if refresh:
+            self.assets.scan()
+        return self.assets
 
     # Templates functions #
     def get_num_templates(self):
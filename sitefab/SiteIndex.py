@@ -0,0 +1,201 @@
+""" Site wide index of the posts for the templates and plugins
+"""
+import time
+from pathlib import Path
+
+from sitefab import utils
+
+
+class SiteIndex():
+    """ Posts indexed by id, filename, url, author and year
+
+    The index is built once after the posts are processed so templates and
+    plugins can look posts up, or list the recent posts of an author, without
+    iterating over all the posts on every page. Posts lists are sorted by
+    creation date, most recent first.
+
+    Post ids are the `post.id` numbers assigned while parsing, as returned
+    by the term matrix.
+    """
+
+    def __init__(self, config=None):
+        """ Create an empty index
+
+        Args:
+            config (objdict, optional): `site_index` section of the site
+            config.
+        """
+        self.config = self.make_config(config)
+        self.posts = []  # most recent first
+        self.recent_posts = []
+        self.by_id = {}
+        self.by_filename = {}
+        self.by_stem = {}  # filename without extension -> posts
+        self.by_url = {}
+        self.posts_by_author = {}
+        self.posts_by_year = {}
+
+    @staticmethod
+    def make_config(config=None):
+        """ Initialize the site index config with the default values
+
+        Args:
+            config (objdict, optional): `site_index` section of the site
+            config.
+
+        Returns:
+            objdict: the initialized configuration.
+        """
+        config = utils.create_objdict(config)
+        if config.get('num_recent') is None:
+            config.num_recent = 10  # size of the precomputed recent list
+        return config
+
+    def build(self, posts):
+        """ Index the posts, replacing the previous index
+
+        Args:
+            posts (list): site posts.
+        """
+        self.posts = sorted(posts, key=get_sort_key)
+        self.recent_posts = self.posts[:self.config.num_recent]
+        self.by_id = {}
+        self.by_filename = {}
+        self.by_stem = {}
+        self.by_url = {}
+        self.posts_by_author = {}
+        self.posts_by_year = {}
+        for post in self.posts:
+            if post.id is not None:
+                self.by_id[post.id] = post
+            if post.filename:
+                self.by_filename[str(post.filename)] = post
+                stem = Path(post.filename).stem
+                self.by_stem.setdefault(stem, []).append(post)
+            if post.meta.permanent_url:
+                self.by_url[normalize_url(post.meta.permanent_url)] = post
+            authors = post.meta.authors or []
+            if isinstance(authors, str):
+                authors = [authors]
+            for author in authors:
+                self.posts_by_author.setdefault(author, []).append(post)
+            year = get_year(post)
+            if year:
+                self.posts_by_year.setdefault(year, []).append(post)
+
+    def get(self, post_id):
+        "Return the post with a given id or None"
+        return self.by_id.get(post_id)
+
+    def get_by_filename(self, filename):
+        "Return the post parsed from a given file or None"
+        return self.by_filename.get(str(filename))
+
+    def get_by_stem(self, stem):
+        """ Return the posts whose filename without extension is stem
+
+        Args:
+            stem (str): e.g `my-post` for `content/posts/my-post.md`.
+
+        Returns:
+            list: posts, most recent first. Files in different directories
+            can share the same name.
+        """
+        return list(self.by_stem.get(stem, []))
+
+    def get_by_url(self, url):
+        "Return the post with a given permanent url or None"
+        return self.by_url.get(normalize_url(url))
+
+    def recent(self, num=None, exclude=None):
+        """ Return the most recent posts
+
+        Args:
+            num (int, optional): number of posts. Defaults to `num_recent`.
+            exclude (Post or objdict, optional): post, or post meta, to
+            leave out e.g the page being rendered.
+
+        Returns:
+            list: posts, most recent first.
+        """
+        num = num or self.config.num_recent
+        if not exclude and num <= len(self.recent_posts):
+            return self.recent_posts[:num]
+        return take(self.posts, num, exclude)
+
+    def by_author(self, author, num=None, exclude=None):
+        "Return the posts of an author, most recent first. See `recent()`"
+        return take(self.posts_by_author.get(author, []), num, exclude)
+
+    def by_year(self, year, num=None, exclude=None):
+        "Return the posts created a given year, most recent first"
+        return take(self.posts_by_year.get(int(year), []), num, exclude)
+
+    def same_year(self, post, num=None):
+        """ Return the other posts created the same year as a post
+
+        Args:
+            post (Post or objdict): post or post meta.
+            num (int, optional): maximum number of posts. Defaults to all.
+
+        Returns:
+            list: posts, most recent first.
+        """
+        meta = post.meta if post.meta is not None else post
+        year = get_year_from_ts(meta.creation_date_ts)
+        if not year:
+            return []
+        return self.by_year(year, num, post)
+
+    def get_authors(self):
+        "Return the sorted list of authors"
+        return sorted(self.posts_by_author)
+
+    def get_years(self):
+        "Return the list of years with posts, most recent first"
+        return sorted(self.posts_by_year, reverse=True)
+
+
+def take(posts, num=None, exclude=None):
+    """ Return up to num posts of a list, skipping a given post
+
+    Args:
+        posts (list): posts.
+        num (int, optional): maximum number of posts. Defaults to all.
+        exclude (Post or objdict, optional): post, or post meta, to skip.
+
+    Returns:
+        list: the posts.
+    """
+    if not exclude:
+        return posts[:num] if num else list(posts)
+    selected = []
+    for post in posts:
+        if post is exclude or post.meta is exclude:
+            continue
+        selected.append(post)
+        if num and len(selected) == num:
+            break
+    return selected
+
+
+def get_sort_key(post):
+    "Most recent first, filename to break the ties"
+    return (-(post.meta.creation_date_ts or 0), str(post.filename or ''))
+
+
+def get_year(post):
+    "Return the creation year of a post or None"
+    return get_year_from_ts(post.meta.creation_date_ts)
+
+
+def get_year_from_ts(ts):
+    "Return the year of a timestamp or None"
+    if not ts:
+        return None
+    return time.localtime(ts).tm_year
+
+
+def normalize_url(url):
+    "Make /a/b/, a/b and /a/b the same url"
+    return "/%s" % str(url).strip('/')
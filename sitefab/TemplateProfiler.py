@@ -0,0 +1,272 @@
+""" Opt-in profiler of the site templates rendering
+
+When enabled, the time spent rendering each template, block, include and
+macro is aggregated across all the pages, and the iterations over the large
+context values such as `posts` or `tags` are counted per template. Iterating
+over all the posts on every page makes the rendering quadratic in the number
+of posts: the report ranks the templates so these loops can be found.
+"""
+import time
+from collections import defaultdict
+
+from jinja2 import Template
+from jinja2.runtime import Macro
+
+from sitefab import files, utils
+
+REPORT_FILENAME = "templates_profile.html"
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Templates profile</title>
+<style>
+body{font-family:sans-serif}table{border-collapse:collapse}
+td,th{border:1px solid #ccc;padding:4px 8px;text-align:left}
+</style></head><body>
+<h1>Templates profile</h1>
+<p>Times include the nested includes, blocks and macros.</p>
+<h2>Rendering time</h2>
+<table><tr><th>Template</th><th>Calls</th><th>Time (s)</th>
+<th>Time per call (ms)</th></tr>
+{% for name, calls, seconds in timings %}
+<tr><td>{{ name }}</td><td>{{ calls }}</td>
+<td>{{ '%.4f'|format(seconds) }}</td>
+<td>{{ '%.3f'|format(seconds * 1000 / calls) }}</td></tr>
+{% endfor %}
+</table>
+<h2>Iterations over the context values</h2>
+<table><tr><th>Template</th><th>Value</th><th>Iterations</th>
+<th>Items</th></tr>
+{% for name, key, iterations, items in iterations %}
+<tr><td>{{ name }}</td><td>{{ key }}</td><td>{{ iterations }}</td>
+<td>{{ items }}</td></tr>
+{% endfor %}
+</table>
+</body></html>
+"""
+
+
+class TemplateProfiler():
+    "Rendering time and context values iterations of the templates"
+
+    def __init__(self, config=None):
+        """ Create an empty profile
+
+        Args:
+            config (objdict, optional): `template_profiler` section of the
+            site config.
+        """
+        self.config = self.make_config(config)
+        # template name -> calls, seconds
+        self.timings = defaultdict(lambda: [0, 0.0])
+        # template name, context key -> iterations, items iterated
+        self.iterations = defaultdict(lambda: [0, 0])
+        self.stack = []  # templates, blocks and macros being rendered
+
+    @staticmethod
+    def make_config(config=None):
+        """ Initialize the template profiler config with the default values
+
+        Args:
+            config (objdict, optional): `template_profiler` section of the
+            site config.
+
+        Returns:
+            objdict: the initialized configuration.
+        """
+        config = utils.create_objdict(config)
+        defaults = {
+            'enabled': False,
+            # context values whose iterations are counted
+            'watch': ['posts', 'tags', 'categories', 'templates',
+                      'microdata'],
+            'num_printed': 5  # slowest templates printed at the end
+        }
+        return utils.set_defaults(config, defaults)
+
+    def wrap_render(self, name, render_func):
+        """ Time a jinja2 render function
+
+        Render functions are generators: only the time spent producing the
+        output is counted, not the time the caller spends consuming it.
+
+        Args:
+            name (str): template, block or include name.
+            render_func (callable): generator function taking the context.
+
+        Returns:
+            callable: the profiled render function.
+        """
+        def profiled(context):
+            gen = render_func(context)
+            calls_and_time = self.timings[name]
+            calls_and_time[0] += 1
+            while True:
+                self.stack.append(name)
+                start = time.perf_counter()
+                try:
+                    event = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    calls_and_time[1] += time.perf_counter() - start
+                    self.stack.pop()
+                yield event
+        return profiled
+
+    def call(self, name, func, *args):
+        "Call a function, e.g a macro, and record its time under name"
+        calls_and_time = self.timings[name]
+        calls_and_time[0] += 1
+        self.stack.append(name)
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            calls_and_time[1] += time.perf_counter() - start
+            self.stack.pop()
+
+    def count_iteration(self, key, num_items):
+        "Record an iteration over a context value by the current template"
+        name = self.stack[-1] if self.stack else '?'
+        counts = self.iterations[(name, key)]
+        counts[0] += 1
+        counts[1] += num_items
+
+    def wrap_context(self, context):
+        """ Replace the watched context values by proxies counting the
+        iterations over them
+
+        Args:
+            context (dict): template render arguments.
+
+        Returns:
+            dict: the arguments to render the template with.
+        """
+        context = dict(context)
+        for key in self.config.watch:
+            if context.get(key) is not None:
+                context[key] = CountedValue(self, key, context[key])
+        return context
+
+    def get_timings(self):
+        """ Return the templates rendering time
+
+        Returns:
+            list: [name, calls, seconds] slowest first.
+        """
+        timings = [[name, v[0], v[1]] for name, v in self.timings.items()]
+        return sorted(timings, key=lambda x: x[2], reverse=True)
+
+    def get_iterations(self):
+        """ Return the iterations over the watched context values
+
+        Returns:
+            list: [template, value name, iterations, items iterated] most
+            items first.
+        """
+        iterations = [[name, key, v[0], v[1]]
+                      for (name, key), v in self.iterations.items()]
+        return sorted(iterations, key=lambda x: x[3], reverse=True)
+
+    def write_report(self, output_dir):
+        """ Write the ranked report
+
+        Args:
+            output_dir (Path): logs directory.
+
+        Returns:
+            Path: the report path.
+        """
+        template = Template(REPORT_TEMPLATE, autoescape=True)
+        chunks = template.generate(timings=self.get_timings(),
+                                   iterations=self.get_iterations())
+        files.write_stream(output_dir, REPORT_FILENAME, chunks)
+        return output_dir / REPORT_FILENAME
+
+
+class CountedValue():
+    "Proxy of a list or dict context value counting the iterations over it"
+
+    def __init__(self, profiler, key, value):
+        self.profiler = profiler
+        self.key = key
+        self.value = value
+
+    def __iter__(self):
+        self.profiler.count_iteration(self.key, len(self.value))
+        return iter(self.value)
+
+    def items(self):
+        self.profiler.count_iteration(self.key, len(self.value))
+        return self.value.items()
+
+    def values(self):
+        self.profiler.count_iteration(self.key, len(self.value))
+        return self.value.values()
+
+    def keys(self):
+        self.profiler.count_iteration(self.key, len(self.value))
+        return self.value.keys()
+
+    def __len__(self):
+        return len(self.value)
+
+    def __bool__(self):
+        return bool(self.value)
+
+    def __contains__(self, item):
+        return item in self.value
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __getattr__(self, name):
+        return getattr(self.value, name)
+
+
+class ProfiledTemplate(Template):
+    """ Template whose render functions are timed by the environment
+    `template_profiler`, if any
+
+    Set as the environment `template_class`. Includes and blocks are timed
+    as well since they are rendered through the same functions. Macros
+    created by the template code are `ProfiledMacro`.
+    """
+
+    @classmethod
+    def _from_namespace(cls, environment, namespace, globals):
+        template = super()._from_namespace(environment, namespace, globals)
+        profiler = getattr(environment, 'template_profiler', None)
+        if profiler is not None:
+            # the template code looks Macro up in its namespace when called
+            namespace['Macro'] = ProfiledMacro
+            name = template.name or '<string>'
+            template.root_render_func = profiler.wrap_render(
+                name, template.root_render_func)
+            template.blocks = {
+                block: profiler.wrap_render("%s:block %s" % (name, block),
+                                            func)
+                for block, func in template.blocks.items()}
+        return template
+
+
+class ProfiledMacro(Macro):
+    "Macro timed by the environment `template_profiler`"
+
+    def _invoke(self, arguments, autoescape):
+        profiler = self._environment.template_profiler
+        return profiler.call("macro %s" % self.name, super()._invoke,
+                             arguments, autoescape)
+
+
+def enable_profiling(environment, profiler):
+    """ Profile the templates of a jinja2 environment
+
+    Must be called before the templates are loaded.
+
+    Args:
+        environment (Environment): jinja2 environment.
+        profiler (TemplateProfiler): where the measures are recorded.
+    """
+    environment.template_class = ProfiledTemplate
+    environment.template_profiler = profiler
@@ -0,0 +1,137 @@
+""" Site wide post x term weight matrix
+"""
+import numpy as np
+from scipy import sparse
+
+
+class TermMatrix():
+    """ Sparse matrix of the posts key terms weights
+
+    Built once after parsing from each post `nlp.terms` so the plugins that
+    need post vectors (related posts, search) share the same vocabulary and
+    vectors instead of rebuilding them. Rows are posts, columns are terms.
+    """
+
+    def __init__(self, posts, field='terms'):
+        """ Build the term matrix
+
+        Args:
+            posts (list): posts to include. Posts without terms get an
+            empty row.
+            field (str, optional): nlp field to use. Defaults to 'terms'.
+        """
+        self.vocabulary = {}  # term -> column
+        self.terms = []  # column -> term
+        self.post_ids = []  # row -> post id
+        self.rows = {}  # post id -> row
+
+        indptr = [0]
+        indices = []
+        data = []
+        for post in posts:
+            self.rows[post.id] = len(self.post_ids)
+            self.post_ids.append(post.id)
+            post_terms = []
+            if post.nlp and post.nlp[field]:
+                post_terms = post.nlp[field]
+            for term, weight in post_terms:
+                column = self.vocabulary.get(term)
+                if column is None:
+                    column = len(self.terms)
+                    self.vocabulary[term] = column
+                    self.terms.append(term)
+                indices.append(column)
+                data.append(weight)
+            indptr.append(len(indices))
+
+        shape = (len(self.post_ids), len(self.terms))
+        self.matrix = sparse.csr_matrix((np.array(data, dtype=np.float32),
+                                         np.array(indices, dtype=np.int32),
+                                         np.array(indptr, dtype=np.int64)),
+                                        shape=shape)
+        # duplicated terms within a post are summed
+        self.matrix.sum_duplicates()
+
+        # rows normalized so dot products are cosine similarities
+        norms = np.sqrt(np.asarray(
+            self.matrix.multiply(self.matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        self.normalized = sparse.diags(1 / norms).dot(self.matrix).tocsr()
+
+    def get_num_posts(self):
+        "Return the number of posts (rows)"
+        return len(self.post_ids)
+
+    def get_num_terms(self):
+        "Return the vocabulary size (columns)"
+        return len(self.terms)
+
+    def get_post_vector(self, post_id):
+        """ Return the terms weights of a post
+
+        Args:
+            post_id (int): post id.
+
+        Returns:
+            dict: weight indexed by term.
+        """
+        row = self.matrix.getrow(self.rows[post_id])
+        return {self.terms[col]: float(weight)
+                for col, weight in zip(row.indices, row.data)}
+
+    def get_similar_posts(self, post_id, k=10):
+        """ Return the k posts the most similar to a given post
+
+        Args:
+            post_id (int): post id.
+            k (int, optional): number of posts to return. Defaults to 10.
+
+        Returns:
+            list: [post id, cosine similarity] sorted by decreasing
+            similarity. Posts with a null similarity are not returned.
+        """
+        row = self.rows[post_id]
+        scores = self.normalized[row].dot(self.normalized.T).toarray()
+        return self._top_k(scores, [row], k)[0]
+
+    def get_all_similar_posts(self, k=10, batch_size=1000):
+        """ Return the k most similar posts of every post
+
+        Similarities are computed by batch of rows so memory stays bounded
+        at batch_size x number of posts.
+
+        Args:
+            k (int, optional): number of posts per post. Defaults to 10.
+            batch_size (int, optional): rows per batch. Defaults to 1000.
+
+        Returns:
+            dict: `get_similar_posts()` output indexed by post id.
+        """
+        similar = {}
+        transposed = self.normalized.T.tocsc()
+        for start in range(0, self.get_num_posts(), batch_size):
+            rows = list(range(start, min(start + batch_size,
+                                         self.get_num_posts())))
+            scores = self.normalized[rows].dot(transposed).toarray()
+            for row, top in zip(rows, self._top_k(scores, rows, k)):
+                similar[self.post_ids[row]] = top
+        return similar
+
+    def _top_k(self, scores, rows, k):
+        "Select the top k columns of each row of a dense score matrix"
+        # a post is not similar to itself
+        scores[np.arange(len(rows)), rows] = 0
+        num_cols = scores.shape[1]
+        k = min(k, num_cols - 1) if num_cols > 1 else 0
+        results = []
+        if not k:
+            return [[] for _ in rows]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for idx in range(len(rows)):
+            row_top = top[idx]
+            row_scores = scores[idx, row_top]
+            order = np.argsort(-row_scores, kind='stable')
+            results.append([[self.post_ids[row_top[i]],
+                             float(row_scores[i])]
+                            for i in order if row_scores[i] > 0])
+        return results
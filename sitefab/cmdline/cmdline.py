@@ -3,11 +3,17 @@
 SiteFab: content > sitefab > static site
 """
 import sys
+import json
+import random
 import getopt
 from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
 
 from sitefab import __version__ as version
+from sitefab import files, nlp, utils
 from sitefab.SiteFab import SiteFab
+from sitefab.parser import Parser, frontmatter
 from termcolor import colored, cprint
 from sitefab.utils import print_color_list, section, print_header
 from sitefab.docs.plugins import generate_plugins_readme
@@ -87,6 +93,9 @@ def generate(config, version):
     section("Processing")
     site.process()
 
+    section("Linting")
+    site.lint()
+
     section("Rendering")
     site.render()
     # Generate auxiliary files (sitemap, facebook_instant etc)
@@ -95,6 +104,147 @@ def generate(config, version):
     site.finale()
 
 
+def bench_nlp(config, sample_size=50, models=None, algos=None):
+    "bench-nlp command main function"
+    section("Init")
+    # light init: the generated site and the build logs are left untouched
+    site = SiteFab(config, version, lint_only=True)
+
+    # deterministic sample so runs can be compared
+    filenames = sorted(site.filenames.posts)
+    sample_size = min(sample_size, len(filenames))
+    filenames = random.Random(42).sample(filenames, sample_size)
+
+    section("Parsing")
+    parser = Parser(site.config.parser, site)
+    posts = []
+    for filename in filenames:
+        posts.append(parser.parse(files.read_file(filename)))
+
+    section("Benchmark")
+    results = nlp.benchmark_corpus(posts, models=models, algos=algos,
+                                   config=site.config.nlp)
+    nlp.print_benchmark(results)
+
+    path = site.get_logs_dir() / "bench_nlp.json"
+    files.write_file(path.parent, path.name, json.dumps(results, indent=2))
+    cprint("\nResults written to %s" % path, 'green')
+
+
+def lint(config, filenames=None, frontmatter_only=False):
+    """lint command main function
+
+    Args:
+        config (str): site config filename.
+        filenames (list, optional): posts to lint. Defaults to all the posts.
+        frontmatter_only (bool, optional): only parse and check the
+        frontmatter. Defaults to False.
+
+    Returns:
+        int: exit code, 1 if any post has errors.
+    """
+    site = SiteFab(config, version, lint_only=True)
+    if filenames:
+        filenames = [Path(f).resolve() for f in filenames]
+    else:
+        filenames = site.filenames.posts
+
+    parser = None
+    posts = []
+    for filename in filenames:
+        content = files.read_file(filename)
+        meta, _ = frontmatter.parse(content)
+        if frontmatter_only or not meta:
+            post = utils.create_objdict()
+            post.meta = meta
+            post.elements = utils.create_objdict()
+        else:
+            if not parser:
+                parser = Parser(site.config.parser, site)
+            post = parser.parse(content)
+        post.filename = str(filename)
+        posts.append(post)
+
+    # site level checks are only meaningful on all the posts
+    site_checks = len(posts) == len(site.filenames.posts)
+    results = site.linter.lint_posts(posts, site, site.config.threads,
+                                     frontmatter_only, site_checks)
+    site.linter.render_report()
+
+    num_errors = 0
+    for filename, post_results in sorted(results.items()):
+        if not post_results.info:
+            continue
+        num_errors += post_results.has_errors
+        cprint(filename, 'yellow')
+        for err in post_results.info:
+            color = 'red' if err[0][0] == 'E' else 'yellow'
+            cprint("\t-%s:%s" % (err[0], err[1]), color)
+
+    cprint("Reports written to %s" % site.get_logs_dir(), 'blue')
+    if num_errors:
+        cprint("%s error(s) in %s post(s)" % (num_errors, len(posts)), 'red')
+        return 1
+    cprint("%s post(s) OK" % len(posts), 'green')
+    return 0
+
+
+def perf_history(config, num_builds=10, baseline_id=None):
+    """perf-history command main function
+
+    Args:
+        config (str): site config filename.
+        num_builds (int, optional): number of builds listed. Defaults to 10.
+        baseline_id (int, optional): build to compare the last build to.
+        Defaults to the median of the previous builds.
+
+    Returns:
+        int: exit code, 1 if a budget is exceeded or, with
+        fail_on_regression, if a stage or plugin regressed.
+    """
+    site = SiteFab(config, version, lint_only=True)
+    history_config = site.config.perf_history
+    build_history = site.get_build_history()
+    builds = build_history.get_builds(num_builds)
+    if not builds:
+        cprint("No build recorded yet", 'yellow')
+        build_history.close()
+        return 0
+
+    cprint("Builds", 'magenta')
+    for build_id, build_time, build_version, num_posts in builds:
+        stages = build_history.get_timings(build_id, build_history.STAGE)
+        date = datetime.fromtimestamp(build_time).strftime('%Y-%m-%d %H:%M')
+        cprint("|-#%s %s v%s %s posts %.2fs" % (
+               build_id, date, build_version, num_posts,
+               stages.get('Overall', 0)), 'cyan')
+
+    regressions = build_history.find_regressions(history_config,
+                                                 baseline_id=baseline_id)
+    exceeded = build_history.check_budgets(history_config)
+    build_history.close()
+
+    cprint("\nRegressions (>%s%%)" % history_config.regression_threshold,
+           'magenta')
+    if not regressions:
+        cprint("|-None", 'green')
+    for kind, name, previous, seconds, percent in regressions:
+        cprint("|-%s %s: %.2fs vs %.2fs (+%d%%)" % (kind, name, seconds,
+                                                    previous, percent), 'red')
+
+    if history_config.budgets:
+        cprint("\nBudgets", 'magenta')
+        if not exceeded:
+            cprint("|-All within budget", 'green')
+        for name, budget, seconds in exceeded:
+            cprint("|-%s: %.2fs, budget %.2fs" % (name, seconds, budget),
+                   'red')
+
+    if exceeded or (regressions and history_config.fail_on_regression):
+        return 1
+    return 0
+
+
 def print_help():
     "Display help and exist"
 
@@ -104,6 +254,12 @@ def print_help():
     cmds = [
         "generate: generate the site",
         "plugins: list available plugins",
+        "lint: lint the given posts or all of them, exit code 1 on errors"
+        "\n\t  [--frontmatter-only] [file1.md file2.md]",
+        "perf-history: compare the last build timings to the previous"
+        " builds\n\t  [--baseline build_id] [--builds 10]",
+        "bench-nlp: benchmark NLP models and extractors on the site posts\n"
+        "\t  [--sample N] [--models m1,m2] [--algos yake,sgrank]",
         ]
 
     cprint("Available Commands", 'magenta')
@@ -122,15 +278,22 @@ def print_help():
 def main():
     config = None
     short_options = "c:h:o:"
-    long_options = ["config=", "help", "output_file="]
+    long_options = ["config=", "help", "output_file=", "sample=", "models=",
+                    "algos=", "frontmatter-only", "baseline=", "builds="]
+    sample_size = 50
+    models = None
+    algos = None
+    frontmatter_only = False
+    baseline_id = None
+    num_builds = 10
 
     # pretty banner
     print_header(version)
 
     # parsing
     try:
-        options, args = getopt.getopt(sys.argv[1:], short_options,
-                                      long_options)
+        options, args = getopt.gnu_getopt(sys.argv[1:], short_options,
+                                          long_options)
     except getopt.GetoptError:
         print_help()
 
@@ -143,6 +306,18 @@ def main():
         elif opt in ('-o', '--output_file'):
             # used for documentation generation
             output_fname = arg
+        elif opt == '--sample':
+            sample_size = int(arg)
+        elif opt == '--models':
+            models = [m.strip() for m in arg.split(',')]
+        elif opt == '--algos':
+            algos = [a.strip() for a in arg.split(',')]
+        elif opt == '--frontmatter-only':
+            frontmatter_only = True
+        elif opt == '--baseline':
+            baseline_id = int(arg)
+        elif opt == '--builds':
+            num_builds = int(arg)
     # arguments
     if len(args):
         cmd = args[0]
@@ -160,6 +335,15 @@ def main():
             cprint("Plugins status", 'magenta')
             print_plugins_list(site, only_enable=False)
 
+        elif cmd == "lint":
+            sys.exit(lint(config, args[1:], frontmatter_only))
+
+        elif cmd == "perf-history":
+            sys.exit(perf_history(config, num_builds, baseline_id))
+
+        elif cmd == "bench-nlp":
+            bench_nlp(config, sample_size, models, algos)
+
         # doc command
         elif cmd == "gen_plugins_readme":
             # this function rebuild the plugin readme
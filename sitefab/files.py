@@ -84,8 +84,8 @@ def write_file(target_path, filename, content, binary=False):
     """
     target_path = Path(target_path)
 
-    if not target_path.exists():
-        target_path.mkdir(parents=True)
+    # exist_ok: parallel workers may create the same directory
+    target_path.mkdir(parents=True, exist_ok=True)
 
     file_path = target_path / filename
     if not binary:
@@ -98,6 +98,34 @@ def write_file(target_path, filename, content, binary=False):
         f.close()
 
 
+def write_stream(target_path, filename, chunks, encoding="utf-8-sig"):
+    """ Write a file chunk by chunk. Create directory if necessary
+
+    Unlike `write_file()` the content is never held in memory at once, e.g
+    for a jinja2 `Template.generate()` output.
+
+    Args:
+        target_path (str): path where to write.
+        filename (str): filename to write to.
+        chunks (iterable): str chunks to write.
+        encoding (str, optional): file encoding. Defaults to utf-8-sig.
+
+    Returns:
+        int: number of characters written.
+    """
+    target_path = Path(target_path)
+
+    if not target_path.exists():
+        target_path.mkdir(parents=True)
+
+    size = 0
+    with codecs.open(target_path / filename, "w", encoding) as f:
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+    return size
+
+
 def get_files_list(content_dir, extensions="*.md", recursive=True):
     """ Return the list of files in a directory and its sub directories that
     match a set of extensions.
@@ -0,0 +1,203 @@
+""" Site level near-duplicate content detection
+
+Each post text is turned into a set of word shingles summarized by a MinHash
+signature. Signatures are split into bands that are hashed into buckets
+(locality-sensitive hashing) so only posts sharing at least one band are
+compared. The cost is linear in the number of posts instead of comparing
+every pair.
+"""
+import re
+from collections import defaultdict
+
+import numpy as np
+import xxhash
+
+from .rules import rule, SITE
+
+RE_WORD = re.compile(r'\w+')
+
+# defaults, overridable from the linter configuration
+THRESHOLD = 0.8  # estimated jaccard similarity above which posts are reported
+SHINGLE_SIZE = 5  # number of words per shingle
+MIN_WORDS = 50  # posts shorter than that are ignored
+NUM_PERM = 128  # minhash signature length
+
+PRIME = np.uint64(4294967291)  # largest prime below 2^32
+MAX_HASH = np.uint64((1 << 32) - 1)
+SHINGLE_BASE = np.uint64(1000003)
+BATCH_SIZE = 2048  # shingles hashed at once to bound memory usage
+SEED = 42
+
+
+@rule(['E400'], SITE)
+def lint_site(posts, test_info, config):
+    """ Report posts whose content is a near-duplicate of another post
+
+    Args:
+        posts (list): all the site posts.
+        test_info (dict): linter tests messages.
+        config (dict): linter configuration.
+
+    Returns:
+        dict: list of [code, info] indexed by post filename.
+    """
+    threshold = config.duplicate_threshold or THRESHOLD
+    shingle_size = config.duplicate_shingle_size or SHINGLE_SIZE
+    min_words = config.duplicate_min_words or MIN_WORDS
+
+    results = defaultdict(list)
+    for post_a, post_b, similarity in find_duplicates(posts, threshold,
+                                                      shingle_size,
+                                                      min_words):
+        percent = int(round(similarity * 100))
+        for post, other in [[post_a, post_b], [post_b, post_a]]:
+            info = test_info['E400'] % (percent, other.filename)
+            results[post.filename].append(['E400', info])
+    return dict(results)
+
+
+def find_duplicates(posts, threshold=THRESHOLD, shingle_size=SHINGLE_SIZE,
+                    min_words=MIN_WORDS, num_perm=NUM_PERM):
+    """ Find the pairs of posts with a similar content
+
+    Args:
+        posts (list): posts to compare.
+        threshold (float, optional): minimal estimated jaccard similarity.
+        shingle_size (int, optional): number of words per shingle.
+        min_words (int, optional): posts with less words are skipped.
+        num_perm (int, optional): signature length.
+
+    Returns:
+        list: [post, other post, estimated similarity] sorted by decreasing
+        similarity.
+    """
+    hasher = MinHasher(num_perm)
+    candidates = []
+    signatures = []
+    for post in posts:
+        shingles = get_shingles(post.text, shingle_size, min_words)
+        if shingles is None:
+            continue
+        candidates.append(post)
+        signatures.append(hasher.signature(shingles))
+
+    if len(candidates) < 2:
+        return []
+    signatures = np.vstack(signatures)
+
+    bands, rows = get_lsh_params(num_perm, threshold)
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        for idx, values in enumerate(band_values):
+            buckets[values.tobytes()].append(idx)
+        for bucket in buckets.values():
+            for i, idx_a in enumerate(bucket):
+                for idx_b in bucket[i + 1:]:
+                    pairs.add((idx_a, idx_b))
+
+    # candidates are verified on the full signatures to remove the LSH false
+    # positives.
+    duplicates = []
+    for idx_a, idx_b in pairs:
+        similarity = float(np.mean(signatures[idx_a] == signatures[idx_b]))
+        if similarity >= threshold:
+            duplicates.append([candidates[idx_a], candidates[idx_b],
+                               similarity])
+    duplicates.sort(key=lambda x: (-x[2], x[0].filename, x[1].filename))
+    return duplicates
+
+
+def get_shingles(text, shingle_size=SHINGLE_SIZE, min_words=MIN_WORDS):
+    """ Hash the word shingles of a text
+
+    Args:
+        text (str): text to shingle.
+        shingle_size (int, optional): number of words per shingle.
+        min_words (int, optional): minimal number of words.
+
+    Returns:
+        np.array: unique 32 bits shingle hashes or None if the text is
+        too short.
+    """
+    words = RE_WORD.findall((text or '').lower())
+    if len(words) < max(min_words, shingle_size):
+        return None
+
+    hashes = np.fromiter((xxhash.xxh32_intdigest(w.encode()) for w in words),
+                         dtype=np.uint64, count=len(words))
+    # polynomial rolling hash of the consecutive words, wrapping on 64 bits
+    num_shingles = len(words) - shingle_size + 1
+    shingles = np.zeros(num_shingles, dtype=np.uint64)
+    for offset in range(shingle_size):
+        shingles = shingles * SHINGLE_BASE + hashes[offset:offset +
+                                                    num_shingles]
+    return np.unique(shingles & MAX_HASH)
+
+
+class MinHasher():
+    "Compute MinHash signatures with a fixed set of random permutations"
+
+    def __init__(self, num_perm=NUM_PERM, seed=SEED):
+        """ Draw the permutations
+
+        Args:
+            num_perm (int, optional): signature length.
+            seed (int, optional): random seed. Signatures are only comparable
+            when they are computed with the same seed.
+        """
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        # (a * x + b) mod p with a, b and x < p stays below 2^64
+        self.a = generator.randint(1, int(PRIME), size=(num_perm, 1),
+                                   dtype=np.uint64)
+        self.b = generator.randint(0, int(PRIME), size=(num_perm, 1),
+                                   dtype=np.uint64)
+
+    def signature(self, shingles):
+        """ Compute the signature of a set of shingles
+
+        Args:
+            shingles (np.array): 32 bits shingle hashes.
+
+        Returns:
+            np.array: num_perm minimal hashes.
+        """
+        signature = np.full(self.num_perm, PRIME, dtype=np.uint64)
+        for start in range(0, len(shingles), BATCH_SIZE):
+            batch = shingles[start:start + BATCH_SIZE] % PRIME
+            permuted = (self.a * batch + self.b) % PRIME
+            np.minimum(signature, permuted.min(axis=1), out=signature)
+        return signature
+
+
+def get_lsh_params(num_perm, threshold):
+    """ Choose the number of bands and rows per band
+
+    Posts sharing a band are compared. The probability for a pair with a
+    jaccard similarity s to share a band is 1 - (1 - s^rows)^bands, its
+    steepest point is around (1 / bands)^(1 / rows). The split chosen puts
+    that point just below the threshold to favor recall.
+
+    Args:
+        num_perm (int): signature length.
+        threshold (float): similarity threshold.
+
+    Returns:
+        list: [bands, rows]
+    """
+    best = [num_perm, 1]
+    best_distance = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        inflection = (1.0 / bands) ** (1.0 / rows)
+        if inflection > threshold:
+            continue
+        distance = threshold - inflection
+        if best_distance is None or distance < best_distance:
+            best = [bands, rows]
+            best_distance = distance
+    return best
@@ -1,8 +1,11 @@
 # encoding: utf-8
 from collections import Counter
+from functools import lru_cache
 import re
 import os
 
+from .rules import rule, FRONTMATTER
+
 # from https://mathiasbynens.be/demo/url-regex diego's one
 VALID_URL = re.compile(r"^(?:(?:https?|ftp):\/\/)(?:\S+(?::\S*)?@)?(?:(?!10(?:\.\d{1,3}){3})(?!127(?:\.\d{1,3}){3})(?!169\.254(?:\.\d{1,3}){2})(?!192\.168(?:\.\d{1,3}){2})(?!172\.(?:1[6-9]|2\d|3[0-1])(?:\.\d{1,3}){2})(?:[1-9]\d?|1\d\d|2[01]\d|22[0-3])(?:\.(?:1?\d{1,2}|2[0-4]\d|25[0-5])){2}(?:\.(?:[1-9]\d?|1\d\d|2[0-4]\d|25[0-4]))|(?:(?:[a-z\\x{00a1}\-\\x{ffff}0-9]+-?)*[a-z\\x{00a1}\-\\x{ffff}0-9]+)(?:\.(?:[a-z\\x{00a1}\-\\x{ffff}0-9]+-?)*[a-z\\x{00a1}\-\\x{ffff}0-9]+)*(?:\.(?:[a-z\\x{00a1}\-\\x{ffff}]{2,})))(?::\d{2,5})?(?:\/[^\s]*)?$")  # noqa
 
@@ -10,41 +13,33 @@ VALID_LOCAL_URL = re.compile(r"^/?[a-z0-9\/_\.\-=\?]+$")
 
 VALID_FILENAME = re.compile(r'^[a-z\/][a-z0-9_\-/\.]+\.[a-z]{1,5}$')
 
+URL_SCHEMES = ('http://', 'https://', 'ftp://')
 
-def lint(post, test_info, config):
-    "Check the frontmatter of a given post for potential errors"
+# generated fields are allowed to be empty
+NULLABLE_FIELDS = set(['toc', 'statistics', 'elements'])
 
-    results = []
 
-    # Testing is meta exists otherwise bailout
-    if not post.meta:
-        results.append(['E100', test_info['E100']])
-        return results
-    # Run metas tests
-    tests = [
-        e101_mandatory_fields,
-        e102_mandatory_fields_for_specific_templates,
-        e103_field_value,
-        e104_duplicate_value,
-        e105_category_in_tags,
-        e106_duplicate_spaces,
-        e107_e108_e109_authors_formating,
-        e110_lowercase_fields,
-        e111_e112_local_files_exists,
-        e113_e114_e115_banner_properly_formated,
-        e116_value_not_null,
-        e117_e118_e119_permanent_url_is_properly_formated,
-        e120_valid_permanent_url_prefix,
-        e121_file_properly_named,
-    ]
-
-    for test in tests:
-        results += test(post, test_info, config)
+@lru_cache(maxsize=4096)
+def is_valid_url(url):
+    "Check an absolute url, the scheme test avoids most VALID_URL matches"
+    return url.startswith(URL_SCHEMES) and VALID_URL.match(url) is not None
+
+
+def is_valid_local_or_url(url):
+    "Check if a string is a valid local or absolute url"
+    return VALID_LOCAL_URL.match(url) is not None or is_valid_url(url)
 
-    return results
 
+@rule(['E100'], FRONTMATTER, needs_meta=False)
+def e100_meta_exists(post, test_info, config, context):
+    "Check that the post has a frontmatter, the other checks need it"
+    if post.meta:
+        return []
+    return [['E100', test_info['E100']]]
 
-def e101_mandatory_fields(post, test_info, config):
+
+@rule(['E101'], FRONTMATTER)
+def e101_mandatory_fields(post, test_info, config, context):
     "Check for the presence of mandatory fields in the meta"
     results = []
     for field in config.frontmatter_mandatory_fields:
@@ -53,12 +48,11 @@ def e101_mandatory_fields(post, test_info, config):
     return results
 
 
-def e102_mandatory_fields_for_specific_templates(post, test_info, config):
+@rule(['E102'], FRONTMATTER, fields=['template'])
+def e102_mandatory_fields_for_specific_templates(post, test_info, config,
+                                                 context):
     "Check for the presense of mandatory field for specific template"
     results = []
-    if "template" not in post.meta:
-        return results
-
     if post.meta.template in config.frontmatter_mandatory_fields_by_templates:
         for field in config.frontmatter_mandatory_fields_by_templates[post.meta.template]:  # noqa
             if field not in post.meta:
@@ -67,44 +61,43 @@ def e102_mandatory_fields_for_specific_templates(post, test_info, config):
     return results
 
 
-def e103_field_value(post, test_info, config):
+@rule(['E103'], FRONTMATTER, per_field=True,
+      fields=lambda config: config.frontmatter_fields_value)
+def e103_field_value(field, value, test_info, config):
     "Check if the value for specific fields match the list"
     results = []
-    for field in config.frontmatter_fields_value:
-        if field in post.meta:
-            if post.meta[field] not in config.frontmatter_fields_value[field]:
-                info = test_info['E103'] % (
-                    field, post.meta[field],
-                    config.frontmatter_fields_value[field])
-                results.append(['E103', info])
+    if value not in config.frontmatter_fields_value[field]:
+        info = test_info['E103'] % (field, value,
+                                    config.frontmatter_fields_value[field])
+        results.append(['E103', info])
     return results
 
 
-def e104_duplicate_value(post, test_info, config):
+@rule(['E104'], FRONTMATTER, per_field=True)
+def e104_duplicate_value(field, value, test_info, config):
     "Check if a value appears twice in a field list"
     results = []
-    for field in post.meta:
-        value_field = post.meta[field]
-        if isinstance(value_field, list):
-            count = Counter()
-            for elt in value_field:
-                try:
-                    count[elt] += 1
-                except:  # noqa
-                    continue
-
-            duplicates = []
-            for elt in count.most_common():
-                if elt[1] > 1:
-                    duplicates.append(elt[0])
-
-            if len(duplicates):
-                info = test_info['E104'] % (field, " ,".join(duplicates))
-                results.append(['E104', info])
+    if isinstance(value, list):
+        count = Counter()
+        for elt in value:
+            try:
+                count[elt] += 1
+            except:  # noqa
+                continue
+
+        duplicates = []
+        for elt in count.most_common():
+            if elt[1] > 1:
+                duplicates.append(elt[0])
+
+        if len(duplicates):
+            info = test_info['E104'] % (field, " ,".join(duplicates))
+            results.append(['E104', info])
     return results
 
 
-def e105_category_in_tags(post, test_info, config):
+@rule(['E105'], FRONTMATTER, fields=['category'])
+def e105_category_in_tags(post, test_info, config, context):
     "Check if the category appears in the tag list"
     results = []
     if "category" in post.meta and "tags" in post.meta:
@@ -116,29 +109,23 @@ def e105_category_in_tags(post, test_info, config):
     return results
 
 
-def e106_duplicate_spaces(post, test_info, config):
+@rule(['E106'], FRONTMATTER, per_field=True)
+def e106_duplicate_spaces(field, value, test_info, config):
     "Check if there are extra spaces"
     results = []
-    for field in post.meta:
-        value = post.meta[field]
-        if not isinstance(value, list):
-            value = [value]
-        for elt in value:
-            if isinstance(elt, str):
-                extra_space = re.search(" {2,}", elt)
-                if extra_space:
-                    info = test_info['E106'] % (field, elt)
-                    results.append(['E106', info])
+    if not isinstance(value, list):
+        value = [value]
+    for elt in value:
+        if isinstance(elt, str) and "  " in elt:
+            info = test_info['E106'] % (field, elt)
+            results.append(['E106', info])
     return results
 
 
-def e107_e108_e109_authors_formating(post, test_info, config):
+@rule(['E107', 'E108', 'E109'], FRONTMATTER, fields=['authors'])
+def e107_e108_e109_authors_formating(post, test_info, config, context):
     "Check if the authors list is properly formatted"
     results = []
-
-    if "authors" not in post.meta:
-        return results
-
     authors = post.meta.authors
     if not isinstance(authors, list):
         info = test_info['E107'] % authors
@@ -157,48 +144,48 @@ def e107_e108_e109_authors_formating(post, test_info, config):
     return results
 
 
-def e110_lowercase_fields(post, test_info, config):
+@rule(['E110'], FRONTMATTER, per_field=True,
+      fields=lambda config: config.frontmatter_field_values_must_be_lowercase)
+def e110_lowercase_fields(field, value, test_info, config):
     "Check that field values are indeed lowercase"
     results = []
-    for field in config.frontmatter_field_values_must_be_lowercase:
-        if field in post.meta:
-            value = post.meta[field]
-            if not isinstance(value, list):
-                value = [value]
-            for elt in value:
-                if isinstance(elt, str):
-                    if not elt.islower():
-                        info = test_info['E110'] % (field, elt)
-                        results.append(['E110', info])
+    if not isinstance(value, list):
+        value = [value]
+    for elt in value:
+        if isinstance(elt, str) and not elt.islower():
+            info = test_info['E110'] % (field, elt)
+            results.append(['E110', info])
     return results
 
 
-def e111_e112_local_files_exists(post, test_info, config):
-    "check if local files exists"
+@rule(['E111', 'E112'], FRONTMATTER, fields=['files'])
+def e111_e112_local_files_exists(post, test_info, config, context):
+    "check if local files exists, using the site asset index if available"
     results = []
     site_dir = config.site_output_dir
-    if "files" in post.meta:
-        if not isinstance(post.meta.files, dict):
-            info = test_info['E112'] % (type(post.meta.files))
-            results.append(['E112', info])
-            return results
-
-        for fname, fpath in post.meta.files.items():
-            if fpath[0] == '/':
-                full_path = os.path.join(site_dir, fpath[1:])
-                if not os.path.isfile(full_path):
-                    info = test_info['E111'] % (fname, full_path)
-                    results.append(['E111', info])
+    assets = context.get('assets')
+    if not isinstance(post.meta.files, dict):
+        info = test_info['E112'] % (type(post.meta.files))
+        results.append(['E112', info])
+        return results
+
+    for fname, fpath in post.meta.files.items():
+        if fpath[0] == '/':
+            full_path = os.path.join(site_dir, fpath[1:])
+            if assets is not None:
+                exists = assets.exists(full_path)
+            else:
+                exists = os.path.isfile(full_path)
+            if not exists:
+                info = test_info['E111'] % (fname, full_path)
+                results.append(['E111', info])
     return results
 
 
-def e113_e114_e115_banner_properly_formated(post, test_info, config):
+@rule(['E113', 'E114', 'E115'], FRONTMATTER, fields=['banner'])
+def e113_e114_e115_banner_properly_formated(post, test_info, config, context):
     "Ensure the banner is properly formated"
     results = []
-
-    if "banner" not in post.meta:
-        return results
-
     banner = post.meta.banner
     if not isinstance(banner, str):
         info = test_info['E113'] % (type(banner))
@@ -206,7 +193,7 @@ def e113_e114_e115_banner_properly_formated(post, test_info, config):
         return results
 
     if "http" in banner[:6]:
-        if not VALID_URL.match(banner):
+        if not is_valid_url(banner):
             info = test_info['E114'] % (banner)
             results.append(['E114', info])
     else:
@@ -217,33 +204,28 @@ def e113_e114_e115_banner_properly_formated(post, test_info, config):
     return results
 
 
-def e116_value_not_null(post, test_info, config):
+@rule(['E116'], FRONTMATTER, per_field=True)
+def e116_value_not_null(field, value, test_info, config):
     "Ensure the field value are not null"
-    WHITELIST = ['toc', 'statistics', 'elements']  # those are generated
     results = []
-    for field in post.meta:
-        if field in WHITELIST:
-            continue
-        if not post.meta[field]:
-            info = test_info['E116'] % (field)
-            results.append(['E116', info])
+    if not value and field not in NULLABLE_FIELDS:
+        info = test_info['E116'] % (field)
+        results.append(['E116', info])
     return results
 
 
-def e117_e118_e119_permanent_url_is_properly_formated(post, test_info, config):
+@rule(['E117', 'E118', 'E119'], FRONTMATTER, fields=['permanent_url'])
+def e117_e118_e119_permanent_url_is_properly_formated(post, test_info, config,
+                                                      context):
+    "Check the permanent url type and format"
     results = []
-
-    if "permanent_url" not in post.meta:
-        return results
-
     url = post.meta.permanent_url
     if not isinstance(url, str):
         info = test_info['E117'] % (type(url))
         results.append(['E117', info])
         return results
 
-    if ((url != "" and not VALID_URL.match(url)) and
-            (not VALID_LOCAL_URL.match(url))):
+    if url != "" and not is_valid_local_or_url(url):
         info = test_info['E118'] % (url)
         results.append(['E118', info])
 
@@ -254,7 +236,8 @@ def e117_e118_e119_permanent_url_is_properly_formated(post, test_info, config):
     return results
 
 
-def e120_valid_permanent_url_prefix(post, test_info, config):
+@rule(['E120'], FRONTMATTER, fields=['template'])
+def e120_valid_permanent_url_prefix(post, test_info, config, context):
     "Check if the permanent url has a valid template based of its prefix"
     results = []
 
@@ -274,12 +257,13 @@ def e120_valid_permanent_url_prefix(post, test_info, config):
     return results
 
 
-def e121_file_properly_named(post, test_info, config):
+@rule(['E121', 'E122', 'E123', 'E124'], FRONTMATTER, fields=['files'])
+def e121_file_properly_named(post, test_info, config, context):
     "Check if the files are properly named"
     results = []
     # test if it contains -slides.pdf or -paper.pdf
     # test it contains the name of the short url (see rename tools)
-    if "files" not in post.meta or not isinstance(post.meta.files, dict):
+    if not isinstance(post.meta.files, dict):
         return results
 
     for t, f in post.meta.files.items():
@@ -289,7 +273,7 @@ def e121_file_properly_named(post, test_info, config):
             results.append(['E121', info])
 
         # valid characters
-        if not VALID_URL.match(f) and not VALID_LOCAL_URL.match(f):
+        if not is_valid_local_or_url(f):
             info = test_info['E122'] % (f)
             results.append(['E122', info])
 
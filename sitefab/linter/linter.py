@@ -1,9 +1,91 @@
+import json
+from multiprocessing import Pool
 from pathlib import Path
+
+import diskcache
 from jinja2 import Template
 
 from sitefab import utils
 from sitefab import files
-from . import frontmatter, images, structure
+# importing the rules modules registers their rules
+from . import frontmatter, images, structure, duplicates  # noqa: F401
+from . import rendered
+from .report import LinterReport
+from .rules import RuleSet, FRONTMATTER, validate_rules
+
+# below that number of posts starting workers cost more than it saves
+MIN_PARALLEL_POSTS = 32
+
+# results of the html rules for the pages rendered by the previous build
+HTML_CACHE_KEY = 'linter_html'
+
+# number of rules listed in the terminal recap
+NUM_SLOWEST_RULES = 3
+
+# state of the linting workers, set by init_lint_worker()
+WORKER_CONTEXT = {}
+
+
+def lint_post(post, test_info, rules, image_info=None,
+              frontmatter_only=False, assets=None):
+    """ Run the post level checks on a post
+
+    Args:
+        post (objdict): the post to check.
+        test_info (dict): linter tests messages.
+        rules (RuleSet): rules enabled by the linter configuration.
+        image_info (dict, optional): `image_info` plugin data. Images checks
+        that need it are skipped when it is not available.
+        frontmatter_only (bool, optional): only run the frontmatter checks.
+        Defaults to False.
+        assets (AssetIndex, optional): site files index used instead of
+        checking the files on disk.
+
+    Returns:
+        list: [code, info] of each error or warning found.
+    """
+    post_images = post.elements.images if post.elements else None
+    context = {
+        'image_info': image_info,
+        'assets': assets,
+        'images': post_images or []
+    }
+    groups = set([FRONTMATTER]) if frontmatter_only else None
+    return rules.run(post, test_info, context, groups)
+
+
+def init_lint_worker(test_info, config, image_info, frontmatter_only,
+                     assets):
+    """Initialize the state of a linting worker
+
+    Args:
+        test_info (dict): linter tests messages.
+        config (dict): linter configuration.
+        image_info (dict): `image_info` plugin data or None.
+        frontmatter_only (bool): only run the frontmatter checks.
+        assets (AssetIndex): site files index or None.
+    """
+    WORKER_CONTEXT['test_info'] = test_info
+    WORKER_CONTEXT['rules'] = RuleSet(utils.dict_to_objdict(config))
+    WORKER_CONTEXT['image_info'] = image_info
+    WORKER_CONTEXT['frontmatter_only'] = frontmatter_only
+    WORKER_CONTEXT['assets'] = assets
+
+
+def lint_post_worker(json_post):
+    """Lint a json serialized post in a worker
+
+    Returns:
+        list: the post filename, its `lint_post()` results and the rules
+        statistics.
+    """
+    post = utils.dict_to_objdict(json.loads(json_post))
+    rules = WORKER_CONTEXT['rules']
+    info = lint_post(post, WORKER_CONTEXT['test_info'], rules,
+                     WORKER_CONTEXT['image_info'],
+                     WORKER_CONTEXT['frontmatter_only'],
+                     WORKER_CONTEXT['assets'])
+    return [post.filename, info, rules.reset_stats()]
 
 
 class Linter:
@@ -14,16 +96,56 @@ class Linter:
         self.test_info = files.load_config(test_file)
         if not self.test_info:
             utils.error("Can't load linter tests")
+        validate_rules(self.test_info)
 
         self.config = config
+        self.rules = RuleSet(config)
         self.results = {}
+        self.site_results = {}  # site level results indexed by filename
+        self.html_cache = None  # see open_html_cache()
+        self.html_cache_hits = 0
+        self.num_posts_linted = 0
+        self.report = LinterReport(config.output_dir, self.test_info)
         template_content = files.read_file(self.config.report_template_file)
         self.jinja2_template = Template(str(template_content))
 
     def render_report(self):
-        "Create a linting report for all posts"
-        report = self.jinja2_template.render(results=self.results)
-        files.write_file(self.config.output_dir, "linter.html", report)
+        """ Create the linting reports for all posts
+
+        The html report is streamed from the template. The JSON Lines report
+        written while linting is closed and the JUnit XML report and rules
+        summary page are written next to it.
+        """
+        rules_stats = self.get_rules_stats()
+        self.report.close()
+        chunks = self.jinja2_template.generate(results=self.results,
+                                               rules_stats=rules_stats)
+        files.write_stream(self.config.output_dir, "linter.html", chunks)
+        self.report.write_junit(self.results, self.num_posts_linted)
+        self.report.write_summary(rules_stats, self.num_posts_linted)
+
+    def get_rules_stats(self):
+        """ Return the cost of each enabled rule, most expensive first
+
+        Returns:
+            list: dict with the rule name, codes, number of calls, time spent
+            in seconds and number of errors or warnings reported.
+        """
+        stats = []
+        for rl in self.rules.enabled:
+            calls, seconds, num_results = self.rules.stats[rl.name]
+            stats.append({
+                'name': rl.name,
+                'codes': rl.codes,
+                'calls': calls,
+                'time': seconds,
+                'results': num_results
+            })
+        return sorted(stats, key=lambda x: x['time'], reverse=True)
+
+    def get_slowest_rules(self, num_rules=NUM_SLOWEST_RULES):
+        "Return the stats of the rules that took the most time"
+        return [s for s in self.get_rules_stats() if s['calls']][:num_rules]
 
     def num_post_with_errors(self):
         "Return number of posts that have errors"
@@ -49,43 +171,232 @@ class Linter:
                 cnt += 1
         return cnt
 
-    def lint(self, post, rendered_post, site):
-        """ Load yaml configuration
+    def lint_site(self, posts):
+        """ Run the checks that need all the posts at once
+
+        Must be called before linting the posts individually. Results are
+        added to the ones of each post by `lint()`.
 
         Args:
-            post (Post): the post to analyze
-            rendered_post (str): the html version of the post
-            site (Sitefab): the site object mainly used to get access
-            to plugin data
-        Return:
-            dict: linting results
+            posts (list): all the site posts.
         """
+        self.site_results = self.rules.run_site(posts, self.test_info)
+
+    def lint_posts(self, posts, site, threads=1, frontmatter_only=False,
+                   site_checks=True):
+        """ Lint all the posts: site level checks then post level ones
+
+        Post level checks are independent so they run in parallel when
+        there are enough posts to make it worth it.
+
+        Args:
+            posts (list): posts to analyze.
+            site (SiteFab): the site object used to get the plugin data.
+            threads (int, optional): number of workers. Defaults to 1.
+            frontmatter_only (bool, optional): only run the frontmatter
+            checks. Site level checks are skipped. Defaults to False.
+            site_checks (bool, optional): run the site level checks. They
+            need all the posts. Defaults to True.
+
+        Returns:
+            dict: linting results indexed by post filename.
+        """
+        if site_checks and not frontmatter_only:
+            self.lint_site(posts)
+        else:
+            self.site_results = {}
+        assets, image_info = self.get_assets(site)
+
+        if threads < 2 or len(posts) < MIN_PARALLEL_POSTS:
+            lints = []
+            for post in posts:
+                info = lint_post(post, self.test_info, self.rules,
+                                 image_info, frontmatter_only, assets)
+                lints.append([post.filename, info])
+        else:
+            # only the fields used by the checks are sent to the workers
+            json_posts = []
+            for post in posts:
+                json_posts.append(json.dumps({
+                    'filename': post.filename,
+                    'meta': post.meta,
+                    'elements': post.elements
+                }, default=str))
+            config = utils.objdict_to_dict(self.config)
+            chunksize = max(1, len(json_posts) // (threads * 4))
+            with Pool(threads, initializer=init_lint_worker,
+                      initargs=(self.test_info, config, image_info,
+                                frontmatter_only, assets)) as pool:
+                lints = pool.map(lint_post_worker, json_posts, chunksize)
+            for post_lint in lints:
+                self.rules.merge_stats(post_lint.pop())
+
+        all_results = {}
+        for filename, info in lints:
+            all_results[filename] = self.record_results(filename, info)
+        return all_results
+
+    def get_assets(self, site):
+        """ Return the site files index and the images info
+
+        The `image_info` plugin data is used when available, otherwise the
+        images dimensions come from the site asset index.
+
+        Returns:
+            list: [AssetIndex or None, image info dict or None]
+        """
+        assets = None
+        if hasattr(site, 'get_asset_index'):
+            assets = site.get_asset_index()
+        image_info = site.plugin_data.get('image_info')
+        if image_info is None and assets is not None:
+            image_info = assets.get_image_info()
+        return [assets, image_info]
+
+    def record_results(self, filename, info):
+        """ Add the site level results and store the results of a post
+
+        Args:
+            filename (str): post filename.
+            info (list): post level [code, info] list.
+
+        Returns:
+            dict: linting results.
+        """
+        results = self.new_results()
+        self.add_results(filename, results, info)
+        self.add_results(filename, results,
+                         self.site_results.get(filename, []))
+        self.num_posts_linted += 1
+
+        if results.has_errors or results.has_warnings:
+            self.results[filename] = results
+
+        return results
+
+    def new_results(self):
+        "Return empty linting results"
         results = utils.create_objdict()
         results.has_errors = 0
         results.has_warnings = 0
+        results.info = []
+        return results
 
-        # frontmatter
-        results.info = frontmatter.lint(post, self.test_info, self.config)
+    def add_results(self, filename, results, info):
+        """ Add [code, info] entries to the linting results of a post
 
-        # images
-        if 'image_info' in site.plugin_data:
-            image_info = site.plugin_data['image_info']
-        else:
-            image_info = None
+        Entries are appended to the JSON Lines report as they are added.
 
-        img_results = images.lint(post, self.test_info, self.config,
-                                  image_info)
-        results.info.extend(img_results)
-        stucture_results = structure.lint(post, self.test_info, self.config)
-        results.info.extend(stucture_results)
-
-        for d in results.info:
+        Args:
+            filename (str): post filename.
+            results (dict): linting results.
+            info (list): [code, info] list.
+        """
+        self.report.add(filename, info)
+        results.info.extend(info)
+        for d in info:
             if d[0][0] == "E":
                 results.has_errors += 1
             if d[0][1] == "W":
                 results.has_warnings += 1
 
-        if results.has_errors or results.has_warnings:
-            self.results[post.filename] = results
+    def check_html(self, html):
+        """ Run the html rules on a rendered page
 
-        return results
+        The page is parsed once and all the enabled html rules share the
+        result.
+
+        Args:
+            html (str): the rendered page.
+
+        Returns:
+            list: [code, info] of each error or warning found.
+        """
+        if not self.rules.html_rules or not html:
+            return []
+        if self.html_cache is not None:
+            key = utils.hexdigest(html.encode('utf-8'))
+            info = self.html_cache['previous'].get(key)
+            if info is not None:
+                self.html_cache_hits += 1
+            else:
+                info = self.rules.run_html(rendered.parse_page(html),
+                                           self.test_info)
+            self.html_cache['current'][key] = info
+            return list(info)
+        page = rendered.parse_page(html)
+        return self.rules.run_html(page, self.test_info)
+
+    def open_html_cache(self, cache_dir):
+        """ Reuse the html rules results of the pages that did not change
+
+        Args:
+            cache_dir (Path): directory where the results are persisted.
+        """
+        with diskcache.Cache(str(cache_dir)) as cache:
+            cached = cache.get(HTML_CACHE_KEY)
+        digest = self.get_html_rules_digest()
+        previous = {}
+        if cached and cached['digest'] == digest:
+            previous = cached['pages']
+        self.html_cache = {
+            'dir': cache_dir,
+            'digest': digest,
+            'previous': previous,  # page hash -> results
+            'current': {}
+        }
+        self.html_cache_hits = 0
+
+    def close_html_cache(self):
+        "Persist the html rules results of the pages rendered by this build"
+        if self.html_cache is None:
+            return
+        with diskcache.Cache(str(self.html_cache['dir'])) as cache:
+            cache.set(HTML_CACHE_KEY, {'digest': self.html_cache['digest'],
+                                       'pages': self.html_cache['current']})
+        self.html_cache = None
+
+    def get_html_rules_digest(self):
+        "Digest of the enabled html rules and of the linter configuration"
+        settings = [[rl.name for rl in self.rules.html_rules],
+                    utils.objdict_to_dict(self.config), self.test_info]
+        settings = json.dumps(settings, sort_keys=True, default=str)
+        return utils.hexdigest(settings.encode('utf-8'))
+
+    def lint_html(self, post, html):
+        """ Check the rendered page of a post during the rendering stage
+
+        Errors are added to the ones found by the linting stage.
+
+        Args:
+            post (Post): the post rendered.
+            html (str): the rendered page.
+
+        Returns:
+            list: [code, info] of each error or warning found.
+        """
+        info = self.check_html(html)
+        if info:
+            if post.filename not in self.results:
+                self.results[post.filename] = self.new_results()
+            self.add_results(post.filename, self.results[post.filename],
+                             info)
+        return info
+
+    def lint(self, post, rendered_post, site):
+        """ Lint a single post
+
+        Args:
+            post (Post): the post to analyze
+            rendered_post (str): the html version of the post, checked by
+            the html rules when not empty
+            site (Sitefab): the site object mainly used to get access
+            to plugin data
+        Return:
+            dict: linting results
+        """
+        assets, image_info = self.get_assets(site)
+        info = lint_post(post, self.test_info, self.rules, image_info,
+                         assets=assets)
+        info.extend(self.check_html(rendered_post))
+        return self.record_results(post.filename, info)
@@ -0,0 +1,139 @@
+""" Checks of the rendered html pages - Error E5xx
+
+A page is parsed once by `PageParser` which only records what the rules
+need: images attributes, ids, in-page links and inline blocks sizes. The
+rules then work on that summary instead of parsing the html again.
+"""
+from collections import Counter
+from html.parser import HTMLParser
+
+from .rules import rule, HTML
+
+# defaults, overridable from the linter configuration
+MAX_INLINE_SIZE = 32768  # bytes of inline script, style or data uri
+
+# tags whose content is inlined code
+INLINE_TAGS = set(['script', 'style'])
+
+
+class PageParser(HTMLParser):
+    "Collect the page elements checked by the rendered html rules"
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.images = []  # attributes dict of each img
+        self.ids = Counter()
+        self.names = set()  # legacy <a name=""> anchors
+        self.fragments = []  # in-page links targets, in order
+        self.inline_blocks = []  # [description, size]
+        self.inline_tag = None
+        self.inline_size = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if 'id' in attrs:
+            self.ids[attrs['id']] += 1
+        if tag == 'img':
+            self.images.append(attrs)
+        elif tag == 'a':
+            href = attrs.get('href')
+            if href and href[0] == '#' and len(href) > 1:
+                self.fragments.append(href[1:])
+            if 'name' in attrs:
+                self.names.add(attrs['name'])
+        elif tag in INLINE_TAGS and 'src' not in attrs:
+            self.inline_tag = tag
+            self.inline_size = 0
+
+        for name in ('src', 'href'):
+            value = attrs.get(name)
+            if value and value[:5] == 'data:':
+                self.inline_blocks.append(['%s data uri' % tag, len(value)])
+
+    def handle_endtag(self, tag):
+        if tag == self.inline_tag:
+            self.inline_blocks.append([tag, self.inline_size])
+            self.inline_tag = None
+
+    def handle_data(self, data):
+        if self.inline_tag:
+            self.inline_size += len(data)
+
+
+def parse_page(html):
+    """ Parse a rendered page in a single pass
+
+    Args:
+        html (str): page html.
+
+    Returns:
+        PageParser: the page summary.
+    """
+    page = PageParser()
+    page.feed(html)
+    page.close()
+    return page
+
+
+def get_image_name(attrs):
+    "Return a short description of an img element for the messages"
+    return attrs.get('src') or '<img>'
+
+
+@rule(['E500'], HTML)
+def e500_image_alt(page, test_info, config):
+    "Check that images have an alt text, which can be empty"
+    results = []
+    for attrs in page.images:
+        if 'alt' not in attrs:
+            info = test_info['E500'] % get_image_name(attrs)
+            results.append(['E500', info])
+    return results
+
+
+@rule(['E501'], HTML)
+def e501_image_dimensions(page, test_info, config):
+    "Check that images declare their dimensions to avoid layout shifts"
+    results = []
+    for attrs in page.images:
+        if 'width' not in attrs or 'height' not in attrs:
+            info = test_info['E501'] % get_image_name(attrs)
+            results.append(['E501', info])
+    return results
+
+
+@rule(['E502'], HTML)
+def e502_broken_anchor(page, test_info, config):
+    "Check that in-page links e.g #toc-2 point to an existing id"
+    results = []
+    reported = set()
+    for fragment in page.fragments:
+        if fragment in page.ids or fragment in page.names:
+            continue
+        if fragment not in reported:
+            reported.add(fragment)
+            results.append(['E502', test_info['E502'] % fragment])
+    return results
+
+
+@rule(['E503'], HTML)
+def e503_oversized_inline_block(page, test_info, config):
+    "Check that inline scripts, styles and data uris are not too large"
+    results = []
+    max_size = config.max_inline_size or MAX_INLINE_SIZE
+    for description, size in page.inline_blocks:
+        if size > max_size:
+            info = test_info['E503'] % (description, size)
+            results.append(['E503', info])
+    return results
+
+
+@rule(['E504'], HTML)
+def e504_duplicate_id(page, test_info, config):
+    "Check that ids are unique in the page"
+    results = []
+    for element_id, count in page.ids.items():
+        if count > 1:
+            info = test_info['E504'] % (element_id, count)
+            results.append(['E504', info])
+    return results
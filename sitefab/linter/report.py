@@ -0,0 +1,160 @@
+""" Linter report writers
+
+Results are appended to a JSON Lines file as soon as they are produced. At
+the end of the build the html report, a JUnit XML file for the CI and a per
+rule summary page are streamed to disk: no report is built in memory.
+"""
+import codecs
+import json
+import re
+from collections import Counter
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+from jinja2 import Template
+
+from sitefab import files
+
+JSONL_FILENAME = "linter.jsonl"
+JUNIT_FILENAME = "linter.xml"
+SUMMARY_FILENAME = "linter_rules.html"
+
+RE_TAG = re.compile(r'<[^>]+>')
+
+SUMMARY_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Linter rules summary</title>
+<style>
+body{font-family:sans-serif}table{border-collapse:collapse}
+td,th{border:1px solid #ccc;padding:4px 8px;text-align:left}
+</style></head><body>
+<h1>Linter rules summary</h1>
+<p>{{ num_posts }} posts checked, {{ num_findings }} findings.
+<a href="linter.html">Full report</a> -
+<a href="{{ jsonl }}">JSON Lines</a> -
+<a href="{{ junit }}">JUnit XML</a></p>
+<h2>Findings by code</h2>
+<table><tr><th>Code</th><th>Findings</th><th>Posts</th><th>Message</th></tr>
+{% for code, findings, posts, message in codes %}
+<tr><td>{{ code }}</td><td>{{ findings }}</td><td>{{ posts }}</td>
+<td>{{ message }}</td></tr>
+{% endfor %}
+</table>
+<h2>Rules cost</h2>
+<table><tr><th>Rule</th><th>Codes</th><th>Calls</th><th>Time (s)</th>
+<th>Findings</th></tr>
+{% for rule in rules_stats %}
+<tr><td>{{ rule.name }}</td><td>{{ rule.codes|join(', ') }}</td>
+<td>{{ rule.calls }}</td><td>{{ '%.4f'|format(rule.time) }}</td>
+<td>{{ rule.results }}</td></tr>
+{% endfor %}
+</table>
+</body></html>
+"""
+
+
+def strip_tags(info):
+    "Remove the html formatting of a linter message"
+    return RE_TAG.sub('', info)
+
+
+class LinterReport():
+    "Incremental writer of the linter machine readable reports"
+
+    def __init__(self, output_dir, test_info):
+        """ Prepare the report, files are only created when written
+
+        Args:
+            output_dir (Path): directory where the reports are written.
+            test_info (dict): linter tests messages.
+        """
+        self.output_dir = Path(output_dir)
+        self.test_info = test_info
+        self.stream = None
+        self.num_findings = Counter()  # code -> findings
+        self.num_posts = Counter()  # code -> posts
+
+    def add(self, filename, info):
+        """ Append the findings of a post to the JSON Lines report
+
+        Args:
+            filename (str): post filename.
+            info (list): [code, info] list.
+        """
+        if not info:
+            return
+        if self.stream is None:
+            if not self.output_dir.exists():
+                self.output_dir.mkdir(parents=True)
+            self.stream = codecs.open(self.output_dir / JSONL_FILENAME, "w",
+                                      "utf-8")
+        for code, message in info:
+            self.num_findings[code] += 1
+            line = {'post': str(filename), 'code': code,
+                    'message': strip_tags(str(message))}
+            self.stream.write(json.dumps(line, ensure_ascii=False) + "\n")
+        # a post findings of a given code are always added at once
+        for code in set(d[0] for d in info):
+            self.num_posts[code] += 1
+
+    def close(self):
+        "Close the JSON Lines report, creating it empty if nothing was found"
+        if self.stream is None:
+            files.write_file(self.output_dir, JSONL_FILENAME, b"",
+                             binary=True)
+        else:
+            self.stream.close()
+            self.stream = None
+
+    def write_junit(self, results, num_posts):
+        """ Stream the JUnit XML report: one test case per failing post
+
+        Args:
+            results (dict): linting results indexed by post filename.
+            num_posts (int): number of posts checked.
+        """
+        num_failures = sum(1 for r in results.values() if r.has_errors)
+        files.write_stream(self.output_dir, JUNIT_FILENAME,
+                           self.generate_junit(results, num_posts,
+                                               num_failures), "utf-8")
+
+    def generate_junit(self, results, num_posts, num_failures):
+        "Yield the JUnit XML report chunks"
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        counts = 'tests="%d" failures="%d"' % (num_posts, num_failures)
+        yield '<testsuites name="sitefab linter" %s>\n' % counts
+        yield '<testsuite name="linter" %s>\n' % counts
+        for filename, post_results in results.items():
+            yield '<testcase classname="linter" name=%s>\n' % (
+                quoteattr(str(filename)))
+            lines = ["%s: %s" % (code, strip_tags(str(message)))
+                     for code, message in post_results.info]
+            if post_results.has_errors:
+                message = "%s error(s)" % post_results.has_errors
+                yield '<failure type="lint" message=%s>' % quoteattr(message)
+                tag = 'failure'
+            else:
+                # warnings only
+                yield '<system-out>'
+                tag = 'system-out'
+            yield escape("\n".join(lines))
+            yield '</%s>\n</testcase>\n' % tag
+        yield '</testsuite>\n</testsuites>\n'
+
+    def write_summary(self, rules_stats, num_posts):
+        """ Stream the per rule summary page
+
+        Args:
+            rules_stats (list): `Linter.get_rules_stats()` output.
+            num_posts (int): number of posts checked.
+        """
+        codes = []
+        for code in sorted(self.num_findings):
+            codes.append([code, self.num_findings[code], self.num_posts[code],
+                          strip_tags(str(self.test_info.get(code, '')))])
+        template = Template(SUMMARY_TEMPLATE, autoescape=True)
+        num_findings = sum(self.num_findings.values())
+        chunks = template.generate(codes=codes, rules_stats=rules_stats,
+                                   num_posts=num_posts,
+                                   num_findings=num_findings,
+                                   jsonl=JSONL_FILENAME, junit=JUNIT_FILENAME)
+        files.write_stream(self.output_dir, SUMMARY_FILENAME, chunks)
@@ -0,0 +1,255 @@
+""" Linter rules registry and engine
+
+Rules are registered with the `rule` decorator by the frontmatter, images,
+structure and duplicates modules. A rule declares the codes it reports, which
+must exist in tests.yaml, and the meta fields it reads:
+
+- site rules `fn(posts, test_info, config)` need all the posts at once and
+  return their results indexed by post filename.
+- html rules `fn(page, test_info, config)` check a rendered page. The page
+  is parsed once and every rule receives the same `PageParser` summary.
+- post rules `fn(post, test_info, config, context)` only run when one of
+  their fields is in the post meta (or always when they have no fields).
+- field rules `fn(field, value, test_info, config)` are called for each of
+  their fields present in the meta (every field when they have no fields).
+  The meta is walked once for all the field rules.
+
+`RuleSet` selects the rules enabled by the linter configuration, dispatches
+them and records how much time each rule takes.
+"""
+import time
+
+from sitefab import utils
+
+RULES = []  # registration order is the execution order
+
+# rules groups
+FRONTMATTER = 'frontmatter'
+IMAGES = 'images'
+STRUCTURE = 'structure'
+SITE = 'site'
+HTML = 'html'
+
+
+class Rule():
+    "A registered linter rule"
+
+    def __init__(self, function, codes, group, fields=None, per_field=False,
+                 requires=None, needs_meta=True):
+        """ Describe a rule
+
+        Args:
+            function (function): the rule function.
+            codes (list): codes reported by the rule e.g ['E113', 'E114'].
+            group (str): rule group: frontmatter, images, structure, site or
+            html.
+            fields (list or function, optional): meta fields read by the
+            rule, or a function returning them from the linter config.
+            Defaults to None: the rule always runs / visits every field.
+            per_field (bool, optional): the rule is called once per field
+            value. Defaults to False.
+            requires (str, optional): context entry the rule needs e.g
+            image_info. The rule is skipped when it is missing.
+            needs_meta (bool, optional): skip the rule when the post has no
+            meta. Defaults to True.
+        """
+        self.function = function
+        self.name = function.__name__
+        self.codes = codes
+        self.group = group
+        self.fields = fields
+        self.per_field = per_field
+        self.requires = requires
+        self.needs_meta = needs_meta
+
+    def get_fields(self, config):
+        "Return the fields of the rule for a given config or None"
+        if callable(self.fields):
+            return list(self.fields(config) or [])
+        return self.fields
+
+
+def rule(codes, group, fields=None, per_field=False, requires=None,
+         needs_meta=True):
+    "Decorator registering a linter rule, see `Rule` for the arguments"
+    def register(function):
+        RULES.append(Rule(function, codes, group, fields, per_field,
+                          requires, needs_meta))
+        return function
+    return register
+
+
+def validate_rules(test_info):
+    """ Check that every code reported by a rule is defined in tests.yaml
+
+    Args:
+        test_info (dict): linter tests messages.
+    """
+    for rl in RULES:
+        for code in rl.codes:
+            if code not in test_info:
+                utils.error("Linter rule %s code %s not in tests.yaml" % (
+                            rl.name, code))
+
+
+def get_rules(group=None):
+    "Return the registered rules, optionally only the ones of a group"
+    return [rl for rl in RULES if group is None or rl.group == group]
+
+
+class RuleSet():
+    """ Rules enabled by a linter configuration, indexed for dispatch
+
+    Rules are disabled with the linter config `disabled_rules` list, which
+    accepts rule codes (e.g E106) and rule function names. Results of
+    disabled codes are dropped when a rule reports several codes.
+    """
+
+    def __init__(self, config):
+        """ Select and index the rules
+
+        Args:
+            config (dict): linter configuration.
+        """
+        self.config = config
+        disabled = set(config.disabled_rules or [])
+        self.disabled_codes = set(c for c in disabled if c[:1] in 'EW')
+        self.site_rules = []  # rules that need all the posts at once
+        self.html_rules = []  # rules checking the rendered pages
+        self.post_rules = []  # [rule, fields or None]
+        self.field_rules = {}  # field -> rules
+        self.all_fields_rules = []  # rules run on every field
+        self.enabled = []
+
+        for rl in RULES:
+            if rl.name in disabled or not set(rl.codes) - self.disabled_codes:
+                continue
+            self.enabled.append(rl)
+            fields = rl.get_fields(config)
+            if rl.group == SITE:
+                self.site_rules.append(rl)
+            elif rl.group == HTML:
+                self.html_rules.append(rl)
+            elif not rl.per_field:
+                self.post_rules.append([rl, fields])
+            elif fields is None:
+                self.all_fields_rules.append(rl)
+            else:
+                for field in fields:
+                    self.field_rules.setdefault(field, []).append(rl)
+
+        # name -> [calls, seconds, results]
+        self.stats = {rl.name: [0, 0.0, 0] for rl in self.enabled}
+
+    def is_enabled(self, code):
+        "Return True if a code is not disabled"
+        return code not in self.disabled_codes
+
+    def run(self, post, test_info, context, groups=None):
+        """ Run the enabled rules on a post
+
+        Args:
+            post (objdict): post to check.
+            test_info (dict): linter tests messages.
+            context (dict): data shared by the rules e.g image_info, assets.
+            groups (set, optional): only run the rules of these groups.
+            Defaults to all.
+
+        Returns:
+            list: [code, info] of each error or warning found.
+        """
+        config = self.config
+        meta = post.meta
+        results = []
+
+        for rl, fields in self.post_rules:
+            if groups is not None and rl.group not in groups:
+                continue
+            if not meta:
+                if rl.needs_meta:
+                    continue
+            elif fields is not None:
+                for field in fields:
+                    if field in meta:
+                        break
+                else:
+                    continue
+            if rl.requires and context.get(rl.requires) is None:
+                continue
+            self._call(rl, results, post, test_info, config, context)
+
+        if not meta or (groups is not None and FRONTMATTER not in groups):
+            return results
+
+        # every field is visited once for all the field rules
+        for field, value in meta.items():
+            for rl in self.all_fields_rules:
+                self._call(rl, results, field, value, test_info, config)
+            for rl in self.field_rules.get(field, []):
+                self._call(rl, results, field, value, test_info, config)
+        return results
+
+    def run_site(self, posts, test_info):
+        """ Run the enabled site level rules
+
+        Args:
+            posts (list): all the site posts.
+            test_info (dict): linter tests messages.
+
+        Returns:
+            dict: list of [code, info] indexed by post filename.
+        """
+        site_results = {}
+        for rl in self.site_rules:
+            start = time.perf_counter()
+            rule_results = rl.function(posts, test_info, self.config)
+            stats = self.stats[rl.name]
+            stats[0] += 1
+            stats[1] += time.perf_counter() - start
+            for filename, info in rule_results.items():
+                for res in info:
+                    if res[0] not in self.disabled_codes:
+                        site_results.setdefault(filename, []).append(res)
+                        stats[2] += 1
+        return site_results
+
+    def run_html(self, page, test_info):
+        """ Run the enabled html rules on a rendered page
+
+        Args:
+            page (PageParser): the parsed page.
+            test_info (dict): linter tests messages.
+
+        Returns:
+            list: [code, info] of each error or warning found.
+        """
+        results = []
+        for rl in self.html_rules:
+            self._call(rl, results, page, test_info, self.config)
+        return results
+
+    def _call(self, rl, results, *args):
+        "Call a rule, record its cost and keep the enabled codes results"
+        start = time.perf_counter()
+        rule_results = rl.function(*args)
+        stats = self.stats[rl.name]
+        stats[0] += 1
+        stats[1] += time.perf_counter() - start
+        if rule_results:
+            for res in rule_results:
+                if res[0] not in self.disabled_codes:
+                    results.append(res)
+                    stats[2] += 1
+
+    def merge_stats(self, stats):
+        "Add the statistics recorded by another process"
+        for name, values in stats.items():
+            current = self.stats.setdefault(name, [0, 0.0, 0])
+            for idx, value in enumerate(values):
+                current[idx] += value
+
+    def reset_stats(self):
+        "Return and reset the statistics recorded since the last reset"
+        stats = self.stats
+        self.stats = {rl.name: [0, 0.0, 0] for rl in self.enabled}
+        return stats
@@ -1,24 +1,11 @@
 from collections import Counter, defaultdict
 
-def lint(post, test_info, config):
-    "Check the structure of given post for potential errors"
-    
-    results = []
-
-    if  post.meta == None or "toc" not in post.meta:
-        return results
-    
-    tests = [
-        e300_no_h1,
-        e301_no_single_headline
-    ]
-
-    for test in tests:
-        results += test(post, test_info, config)
+from .rules import rule, STRUCTURE
 
-    return results
+# Structure checks of the post table of content - Error E3xx
 
-def e300_no_h1(post, test_info, config):
+@rule(['E300'], STRUCTURE, fields=['toc'])
+def e300_no_h1(post, test_info, config, context):
     "Check for the absence of H1 in the content of the post"
     results = []
     for item in post.meta.toc:
@@ -27,7 +14,8 @@ def e300_no_h1(post, test_info, config):
            results.append(['E300', info])
     return results
 
-def e301_no_single_headline(post, test_info, config):
+@rule(['E301'], STRUCTURE, fields=['toc'])
+def e301_no_single_headline(post, test_info, config, context):
     "Check that there not only one h2, h3, h4"
     results = []
     counter = Counter()
@@ -1,21 +1,164 @@
+import re
+import signal
+import threading
+import time
+import tracemalloc
+import unicodedata
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from itertools import combinations
+
+import diskcache
 import numpy as np
 from perfcounters import PerfCounters
 from tabulate import tabulate
-from textacy import TextStats, make_spacy_doc, preprocessing
+from textacy import extract, make_spacy_doc, preprocessing
+from textacy.preprocessing.resources import (RE_EMAIL, RE_HASHTAG,
+                                             RE_LINEBREAK,
+                                             RE_NONBREAKING_SPACE, RE_NUMBER,
+                                             RE_PHONE_NUMBER, RE_SHORT_URL,
+                                             RE_URL, RE_ZWSP,
+                                             QUOTE_TRANSLATION_TABLE)
 from textacy.text_stats import readability
+from textacy.text_stats.api import load_hyphenator
 from textacy.ke.yake import yake
 from textacy.ke.textrank import textrank
 from textacy.ke.sgrank import sgrank
 from textacy.ke.scake import scake
 
-from sitefab.utils import create_objdict, dict_to_objdict
+from sitefab.utils import create_objdict, dict_to_objdict, set_defaults
 
-# FIXME: use the config
+# Defaults used when the `nlp` section of the site config don't set them.
 NUM_TERMS = 50
 SPACY_MODEL = 'en_core_web_sm'  # 'en_core_web_lg'
 # python -m spacy download en_core_web_sm
-TERM_EXTRACTOR_ALGO = 'yake'  # yake, sgrank, textrank
+TERM_EXTRACTOR_ALGO = 'yake'  # yake, sgrank, textrank, scake, frequency
 NGRAMS = (1, 2, 3)  # default
+# posts with a text longer than that are analyzed in sentence aligned chunks
+# to keep memory bounded and stay under spacy max_length.
+CHUNK_SIZE = 100000  # chars
+# maximum time spent extracting a post key terms before falling back to the
+# next algorithm. 0 disables the budget.
+TIME_BUDGET = 10  # seconds
+FALLBACK_ALGOS = ['yake', 'frequency']
+
+WORD_STATS_CACHE_KEY = 'syllables'
+
+# Parts of the analysis that can be requested. The key terms extraction needs
+# the cleaned up fields so they are computed as well.
+NLP_PARTS = ['clean_fields', 'terms', 'title_terms', 'stats']
+RE_TEMPLATE_NLP_FIELD = re.compile(
+    r'\bnlp\b(?:\.(\w+)|\[\s*[\'"](\w+)[\'"]\s*\])?')
+
+# Rough cost model of the term extractors used to predict if they fit in the
+# time budget: seconds = coefficient * num_tokens ** exponent. Coefficients
+# are refined with the durations observed during the build.
+ALGO_COSTS = {
+    'frequency': [0.000001, 1.0],
+    'yake': [0.0001, 1.0],
+    'scake': [0.0001, 1.2],
+    'textrank': [0.0001, 1.2],
+    'sgrank': [0.00001, 1.6]
+}
+
+
+class TermExtractionTimeout(Exception):
+    "Raised when a key terms extraction exceeds its time budget"
+
+
+def make_config(config=None):
+    """Initialize the nlp config with the default of the missing settings.
+
+    Args:
+        config (objdict, optional): `nlp` section of the site config.
+
+    Returns:
+        objdict: the initialized configuration.
+    """
+    config = create_objdict(config)
+    defaults = {
+        'spacy_model': SPACY_MODEL,
+        'num_terms': NUM_TERMS,
+        'term_extractor': TERM_EXTRACTOR_ALGO,
+        'ngrams': list(NGRAMS),
+        'chunk_size': CHUNK_SIZE,
+        'time_budget': TIME_BUDGET,
+        'fallback': FALLBACK_ALGOS
+    }
+    set_defaults(config, defaults)
+
+    for algo in [config.term_extractor] + config.fallback:
+        if algo not in ALGO_COSTS:
+            raise Exception('Unknown key term extraction method:%s' % algo)
+
+    # !parts is None when they are inferred from the consumers.
+    if config.parts is not None:
+        for part in config.parts:
+            if part not in NLP_PARTS:
+                raise Exception('Unknown nlp part:%s' % part)
+    return config
+
+
+CONFIG = make_config()
+
+
+def get_template_fields(source):
+    """Find the nlp fields used by a template.
+
+    Args:
+        source (str): template source code.
+
+    Returns:
+        set: fields used e.g nlp.terms or nlp when the whole analysis is
+        used.
+    """
+    fields = set()
+    for match in RE_TEMPLATE_NLP_FIELD.finditer(source):
+        attr = match.group(1) or match.group(2)
+        if attr:
+            fields.add('nlp.%s' % attr)
+        else:
+            fields.add('nlp')
+    return fields
+
+
+def fields_to_parts(fields):
+    """Return the analysis parts needed to provide a set of post fields.
+
+    Args:
+        fields (iterable): consumed fields e.g post.nlp.terms. Non nlp fields
+        are ignored.
+
+    Returns:
+        set: analysis parts needed.
+    """
+    parts = set()
+    for field in fields:
+        elements = field.strip().split('.')
+        if elements[0] == 'post':
+            elements = elements[1:]
+        if not elements or elements[0] != 'nlp':
+            continue
+        if len(elements) == 1:
+            return set(NLP_PARTS)
+        if elements[1] in NLP_PARTS:
+            parts.add(elements[1])
+        elif elements[1] == 'term_extractor':
+            parts.add('terms')
+        else:
+            # !unknown field: safer to compute everything.
+            return set(NLP_PARTS)
+    return parts
+
+
+def configure(config):
+    """Set the nlp config used by the current process.
+
+    Args:
+        config (objdict): `nlp` section of the site config.
+    """
+    global CONFIG
+    CONFIG = make_config(config)
 
 
 def softmax(results, reverse=False):
@@ -68,22 +211,298 @@ def extract_key_terms(doc, num_terms=50, ngrams=(1, 2, 3), algo='yake'):
         return softmax(str(doc).split(' '))
 
     if algo == 'textrank':
-        return softmax(textrank(doc, n_keyterms=NUM_TERMS))
+        return softmax(textrank(doc, n_keyterms=num_terms))
     elif algo == 'yake':
-        return softmax(yake(doc, ngrams=ngrams, topn=NUM_TERMS),
+        return softmax(yake(doc, ngrams=ngrams, topn=num_terms),
                        reverse=True)
     elif algo == 'scake':
-        return softmax(scake(doc, topn=NUM_TERMS))
+        return softmax(scake(doc, topn=num_terms))
     elif algo == 'sgrank':
         return softmax(sgrank(doc, ngrams=ngrams,
-                              n_keyterms=NUM_TERMS))
+                              n_keyterms=num_terms))
+    elif algo == 'frequency':
+        return softmax(frequency_terms(doc, ngrams=ngrams,
+                                       num_terms=num_terms))
     else:
         err = 'Unknown key term extraction method:%s' % algo
         raise Exception(err)
 
 
+def frequency_terms(doc, num_terms=50, ngrams=(1, 2, 3)):
+    """Cheap key terms extraction based on ngrams frequencies.
+
+    Used as the last resort when the other algorithms don't fit in the time
+    budget as it runs in linear time.
+
+    Args:
+        doc (Spacy.doc): Doc to extract terms from.
+        num_terms (int, optional): How many terms to return. Defaults to 50.
+        ngrams (int, optional): which size of ngrams to consider.
+
+    Returns:
+        list: [term, relative frequency] sorted by decreasing frequency.
+    """
+    if isinstance(ngrams, int):
+        ngrams = [ngrams]
+    counts = Counter()
+    for n in ngrams:
+        for ngram in extract.ngrams(doc, n, filter_stops=True,
+                                    filter_punct=True, filter_nums=True):
+            counts[ngram.lemma_.lower()] += 1
+    if not counts:
+        return []
+    max_count = counts.most_common(1)[0][1]
+    return [[term, count / max_count]
+            for term, count in counts.most_common(num_terms)]
+
+
+class KeyTermsExtractor():
+    """Extract key terms within a per post time budget.
+
+    The configured algorithm is used unless it is predicted to exceed the
+    remaining budget or actually exceed it, in which case the fallback
+    algorithms are tried in order. The cheap frequency extractor is always
+    the last resort so the extraction can't stall the build.
+    """
+
+    def __init__(self, config):
+        """
+        Args:
+            config (objdict): nlp config.
+        """
+        self.config = config
+        self.algos = []
+        if config.term_extractor != 'frequency':
+            for algo in [config.term_extractor] + config.fallback:
+                if algo != 'frequency' and algo not in self.algos:
+                    self.algos.append(algo)
+        self.algos.append('frequency')
+        self.deadline = None
+        if config.time_budget:
+            self.deadline = time.time() + config.time_budget
+        self.used = []  # algorithms used in order
+
+    def extract(self, doc, ngrams):
+        """Extract key terms from a doc.
+
+        Args:
+            doc (Spacy.doc): Doc to extract terms from.
+            ngrams (int): which size of ngrams to consider.
+
+        Returns:
+            list: `extract_key_terms()` output.
+        """
+        num_tokens = max(len(doc), 1)
+        for algo in list(self.algos):
+            remaining = 0
+            if self.deadline and algo != 'frequency':
+                remaining = self.deadline - time.time()
+                if predict_cost(algo, num_tokens) > remaining:
+                    # !fallback is sticky for the rest of the post
+                    self.algos.remove(algo)
+                    continue
+            start = time.time()
+            try:
+                with time_limit(remaining):
+                    terms = extract_key_terms(doc,
+                                              num_terms=self.config.num_terms,
+                                              algo=algo, ngrams=ngrams)
+            except TermExtractionTimeout:
+                self.algos.remove(algo)
+                continue
+            record_cost(algo, num_tokens, time.time() - start)
+            if algo not in self.used:
+                self.used.append(algo)
+            return terms
+
+    def get_algorithm(self):
+        "Return the algorithm(s) actually used as a string"
+        return ','.join(self.used)
+
+
+def predict_cost(algo, num_tokens):
+    "Predict how many seconds algo will take to process num_tokens tokens"
+    coefficient, exponent = ALGO_COSTS[algo]
+    return coefficient * num_tokens ** exponent
+
+
+def record_cost(algo, num_tokens, duration):
+    "Refine algo cost model with an observed duration"
+    coefficient, exponent = ALGO_COSTS[algo]
+    observed = duration / num_tokens ** exponent
+    ALGO_COSTS[algo][0] = (coefficient + observed) / 2
+
+
+@contextmanager
+def time_limit(seconds):
+    """Raise TermExtractionTimeout if the block runs longer than seconds.
+
+    The limit relies on SIGALRM so it is only enforced on platforms that
+    support it and in the process main thread, which is where the parsing
+    workers run. Elsewhere only the cost prediction applies.
+
+    Args:
+        seconds (float): time limit. 0 disables the limit.
+    """
+    if (seconds <= 0 or not hasattr(signal, 'setitimer') or
+            threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def handler(signum, frame):
+        raise TermExtractionTimeout()
+
+    previous_handler = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def merge_key_terms(chunks_terms, weights, num_terms=50):
+    """Merge the key terms extracted from multiple chunks of a text.
+
+    Terms scores are averaged weighted by the chunks weights, the top terms
+    are kept and their scores normalized so they sum to 1 as the output of
+    `extract_key_terms()`.
+
+    Args:
+        chunks_terms (list): `extract_key_terms()` output for each chunk.
+        weights (list): weight of each chunk, typically its length.
+        num_terms (int, optional): How many terms to return. Defaults to 50.
+
+    Returns:
+        list: [term, score] sorted by decreasing score.
+    """
+    scores = defaultdict(float)
+    for terms, weight in zip(chunks_terms, weights):
+        for term, score in terms:
+            scores[term] += score * weight
+
+    if not scores:
+        return []
+    terms = list(scores.keys())
+    values = np.array([scores[term] for term in terms])
+    if len(terms) > num_terms:
+        top = np.argpartition(-values, num_terms - 1)[:num_terms]
+    else:
+        top = np.arange(len(terms))
+    top = top[np.argsort(-values[top], kind='stable')]
+    total = values[top].sum()
+    if not total:
+        total = 1
+    return [[terms[idx], float(values[idx] / total)] for idx in top]
+
+
+RE_DIGIT = re.compile(r'\d')
+RE_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+class CleanupTable(dict):
+    """str.translate() table that fuse the character level cleanup steps.
+
+    Combining marks left by the NFKD decomposition are removed, punctuation
+    is replaced by a space, the remaining quotation marks are normalized,
+    newlines and tabs become spaces and zero-width spaces are removed. The
+    table is filled lazily as characters are seen so building it is free.
+    """
+
+    def __missing__(self, code):
+        char = chr(code)
+        if unicodedata.combining(char):
+            value = None
+        elif unicodedata.category(char).startswith('P'):
+            value = ' '
+        elif code in QUOTE_TRANSLATION_TABLE:
+            value = chr(QUOTE_TRANSLATION_TABLE[code])
+        elif char in '\n\t':
+            value = ' '
+        elif RE_ZWSP.match(char):
+            value = None
+        else:
+            value = char
+        self[code] = value
+        return value
+
+
+CLEANUP_TABLE = CleanupTable()
+
+
 def text_cleanup(text):
-    "cleanup our text"
+    """Cleanup text before NLP analysis.
+
+    Produce exactly the same output as `text_cleanup_reference()` with fewer
+    passes over the text: entity removal is skipped when the text doesn't
+    contain the characters the entity requires and the accents, punctuation,
+    quotes and newlines normalizations are done in a single translate call.
+
+    Args:
+        text (str): text to cleanup.
+
+    Returns:
+        str: cleaned up text.
+    """
+
+    # entities are removed in the same order as the reference as removing
+    # one can change what the next one match.
+    if '@' in text:
+        text = RE_EMAIL.sub('', text)
+    if '/' in text or '.' in text:
+        text = RE_URL.sub('', text)
+        if '/' in text:
+            text = RE_SHORT_URL.sub('', text)
+    if '#' in text or '\uff03' in text:  # fullwidth hash
+        text = RE_HASHTAG.sub('', text)
+    if RE_DIGIT.search(text):
+        text = RE_PHONE_NUMBER.sub('', text)
+        text = RE_NUMBER.sub('', text)
+
+    # !hyphenated words normalization is not needed: hyphens are
+    # punctuation and are already removed.
+    text = unicodedata.normalize('NFKD', text)
+    text = text.translate(CLEANUP_TABLE).lower()
+
+    # newlines are gone, only vertical tabs can be left as line breaks.
+    if '\v' in text:
+        text = RE_LINEBREAK.sub('\n', text)
+    return RE_NONBREAKING_SPACE.sub(' ', text).strip()
+
+
+def split_text(text, max_chars=CHUNK_SIZE):
+    """Split a text in sentence aligned chunks.
+
+    Sentences longer than max_chars are split on the last space before the
+    limit, or at the limit if there is none.
+
+    Args:
+        text (str): text to split.
+        max_chars (int, optional): maximum chunk size. Defaults to CHUNK_SIZE.
+
+    Yields:
+        str: text chunks.
+    """
+    start = 0  # start of the current chunk
+    cut = 0  # end of the last sentence that fits in the current chunk
+    ends = [m.end() for m in RE_SENTENCE_BOUNDARY.finditer(text)]
+    ends.append(len(text))
+    for end in ends:
+        while end - start > max_chars:
+            if cut <= start:
+                # sentence longer than a chunk
+                cut = text.rfind(' ', start + 1, start + max_chars)
+                if cut == -1:
+                    cut = start + max_chars
+            yield text[start:cut]
+            start = cut
+        cut = end
+    if start < len(text):
+        yield text[start:]
+
+
+def text_cleanup_reference(text):
+    "cleanup our text one textacy preprocessing step at the time"
 
     text = preprocessing.replace_emails(text, replace_with='')
     text = preprocessing.replace_urls(text, replace_with='')
@@ -103,8 +522,18 @@ def text_cleanup(text):
     return text
 
 
-def generate_clean_fields(post):
-    "Generate a cleaned up version of the post and its metadata"
+def generate_clean_fields(post, clean_text=True):
+    """Generate a cleaned up version of the post and its metadata
+
+    Args:
+        post (objdict): post to clean up.
+        clean_text (bool, optional): clean up the post text. Long posts text
+        is cleaned up chunk by chunk by `analyze_chunks()` instead. Defaults
+        to True.
+
+    Returns:
+        objdict: the cleaned up fields.
+    """
     clean_fields = create_objdict()
 
     # cleaned up fields
@@ -144,7 +573,7 @@ def generate_clean_fields(post):
 
     # text
     clean_fields.text = ''
-    if post.text:
+    if post.text and clean_text:
         # !make sure to use post html and clean it to avoid markup keywords.
         clean_fields.text = text_cleanup(post.text)
 
@@ -155,7 +584,7 @@ def benchmark_term_extractor(doc, counters):
     "benchmark various term extractor algorithms"
     # TL;DR: yake is probably the best. Feel free to experiment
     # see https://github.com/LIAAD/yake
-    # sgrank is really really slow
+    # use `sitefab bench-nlp` to compare them on a real corpus.
     results = []
     methods = ['textrank', 'yake', 'sgrank']  # 'cake',     results = []
     for method in methods:
@@ -175,81 +604,490 @@ def benchmark_term_extractor(doc, counters):
     return counters
 
 
-def compute_stats(doc):
-    ts = TextStats(doc)
+def benchmark_corpus(posts, models=None, algos=None, config=None, top_k=10):
+    """Benchmark spacy models and key terms extractors on a set of posts.
+
+    For each model, the spacy docs creation is measured then each extractor
+    is run on the docs. Posts longer than the chunk size are truncated to
+    their first chunk.
+
+    Args:
+        posts (list): parsed posts.
+        models (list, optional): spacy models to use. Defaults to the
+        configured one.
+        algos (list, optional): extractors to use. Defaults to the configured
+        one and its fallbacks.
+        config (objdict, optional): nlp config. Defaults to the one set via
+        `configure()`.
+        top_k (int, optional): number of top terms used to compute the
+        overlap between extractors. Defaults to 10.
+
+    Returns:
+        dict: runs results and overlap between the extractors.
+    """
+    if config is None:
+        config = CONFIG
+    if not models:
+        models = [config.spacy_model]
+    if not algos:
+        algos = []
+        for algo in [config.term_extractor] + config.fallback:
+            if algo not in algos:
+                algos.append(algo)
+
+    contents = []
+    for post in posts:
+        clean_fields = generate_clean_fields(post)
+        content = ' '.join([clean_fields.title, clean_fields.category,
+                            " ".join(clean_fields.tags),
+                            clean_fields.abstract, clean_fields.text])
+        contents.append(next(split_text(content, config.chunk_size), ''))
+
+    results = {
+        'num_posts': len(posts),
+        'num_chars': sum([len(content) for content in contents]),
+        'top_k': top_k,
+        'runs': [],
+        'overlap': []
+    }
+    for model in models:
+        docs, run = _benchmark_run(
+            lambda content: make_spacy_doc(content, lang=model), contents)
+        run.update({'model': model, 'algo': 'spacy'})
+        results['runs'].append(run)
+
+        top_terms = {}
+        for algo in algos:
+            terms, run = _benchmark_run(
+                lambda doc: extract_key_terms(doc, algo=algo,
+                                              num_terms=config.num_terms,
+                                              ngrams=config.ngrams), docs)
+            run.update({'model': model, 'algo': algo})
+            results['runs'].append(run)
+            top_terms[algo] = [set([t[0] for t in post_terms[:top_k]])
+                               for post_terms in terms]
+
+        for algo_a, algo_b in combinations(algos, 2):
+            scores = []
+            for a, b in zip(top_terms[algo_a], top_terms[algo_b]):
+                if a or b:
+                    scores.append(len(a & b) / len(a | b))
+            overlap = float(np.mean(scores)) if scores else 0.0
+            results['overlap'].append({'model': model,
+                                       'algos': [algo_a, algo_b],
+                                       'overlap': round(overlap, 3)})
+    return results
+
+
+def _benchmark_run(fn, items):
+    """Apply fn to each item while measuring latency and memory usage.
+
+    Returns:
+        list: [outputs, run stats]
+    """
+    outputs = []
+    latencies = []
+    peak_memory = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    for item in items:
+        # !per item peak so the docs kept in outputs are not accounted.
+        current = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        item_start = time.perf_counter()
+        outputs.append(fn(item))
+        latencies.append(time.perf_counter() - item_start)
+        peak = tracemalloc.get_traced_memory()[1]
+        peak_memory = max(peak_memory, peak - current)
+    duration = time.perf_counter() - start
+    tracemalloc.stop()
+
+    latencies = np.array(latencies) * 1000
+    stats = {'posts_per_sec': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0,
+             'peak_memory_mb': round(peak_memory / 2 ** 20, 2)}
+    if len(items) and duration:
+        stats['posts_per_sec'] = round(len(items) / duration, 2)
+        stats['p50_ms'] = round(float(np.percentile(latencies, 50)), 2)
+        stats['p95_ms'] = round(float(np.percentile(latencies, 95)), 2)
+    return outputs, stats
+
+
+def print_benchmark(results):
+    "Display `benchmark_corpus()` results"
+    headers = ['model', 'algo', 'posts/s', 'p50 (ms)', 'p95 (ms)',
+               'peak memory (MB)']
+    table = []
+    for run in results['runs']:
+        table.append([run['model'], run['algo'], run['posts_per_sec'],
+                      run['p50_ms'], run['p95_ms'], run['peak_memory_mb']])
+    print(tabulate(table, headers=headers))
+    print('')
+
+    headers = ['model', 'algos', 'top-%s overlap' % results['top_k']]
+    table = []
+    for overlap in results['overlap']:
+        table.append([overlap['model'], ' / '.join(overlap['algos']),
+                      overlap['overlap']])
+    print(tabulate(table, headers=headers))
+
+
+def benchmark_text_cleanup(texts, counters, rounds=10):
+    "benchmark the fused text cleanup against the reference implementation"
+    methods = [['reference', text_cleanup_reference],
+               ['fused', text_cleanup]]
+    num_chars = sum([len(text) for text in texts]) * rounds
+    table = []
+    for name, fn in methods:
+        counters.start(name)
+        for _ in range(rounds):
+            for text in texts:
+                fn(text)
+        counters.stop(name)
+        duration = counters.get(name)
+        table.append([name, round(duration, 3),
+                      round(num_chars / duration / 1000000, 2)])
+
+    print(tabulate(table, headers=['method', 'time (s)', 'MB/s']))
+    return counters
+
+
+class WordStatsCache():
+    """Number of syllables per lowercase word shared by all the posts.
+
+    Counting syllables runs the hyphenation dictionary on every word while
+    most of the vocabulary is the same from one post to the other. Counts
+    are memoized per language and persisted in the site cache directory so
+    following builds don't have to recompute them.
+    """
+
+    def __init__(self):
+        self.syllables = {}  # lang -> {word: num syllables}
+        self.new_words = {}  # same but only words not persisted yet
+
+    def load(self, cache_dir):
+        """Load persisted word statistics.
+
+        Args:
+            cache_dir (Path): directory of the word statistics cache.
+        """
+        with diskcache.Cache(str(cache_dir)) as cache:
+            stored = cache.get(WORD_STATS_CACHE_KEY, {})
+        for lang, words in stored.items():
+            self.syllables.setdefault(lang, {}).update(words)
+
+    def save(self, cache_dir):
+        """Persist the word statistics computed since the last save.
+
+        Args:
+            cache_dir (Path): directory of the word statistics cache.
+        """
+        if not self.new_words:
+            return
+        with diskcache.Cache(str(cache_dir)) as cache:
+            with cache.transact():
+                stored = cache.get(WORD_STATS_CACHE_KEY, {})
+                for lang, words in self.new_words.items():
+                    stored.setdefault(lang, {}).update(words)
+                cache.set(WORD_STATS_CACHE_KEY, stored)
+        self.new_words = {}
+
+    def update(self, new_words):
+        """Merge words statistics computed by another process.
+
+        Args:
+            new_words (dict): output of `pop_new_words()`.
+        """
+        for lang, words in new_words.items():
+            self.syllables.setdefault(lang, {}).update(words)
+            self.new_words.setdefault(lang, {}).update(words)
+
+    def pop_new_words(self):
+        "Return and reset the words computed since the last call"
+        new_words = self.new_words
+        self.new_words = {}
+        return new_words
+
+    def get_syllables(self, words, lang):
+        """Return the number of syllables of each word.
+
+        Args:
+            words (list): lowercase words.
+            lang (str): language of the words.
+
+        Returns:
+            list: number of syllables per word.
+        """
+        known = self.syllables.setdefault(lang, {})
+        counts = []
+        hyphenator = None
+        for word in words:
+            count = known.get(word)
+            if count is None:
+                if not hyphenator:
+                    hyphenator = load_hyphenator(lang=lang)
+                count = len(hyphenator.positions(word)) + 1
+                known[word] = count
+                self.new_words.setdefault(lang, {})[word] = count
+            counts.append(count)
+        return counts
+
+
+WORD_STATS = WordStatsCache()
+
+
+def init_word_stats(cache_dir):
+    """Load the persisted word statistics in the current process.
+
+    Used as the parsing pool initializer so each worker starts with the
+    statistics of the previous builds.
+
+    Args:
+        cache_dir (str): directory of the word statistics cache.
+    """
+    WORD_STATS.load(cache_dir)
+
+
+def compute_stats(doc, word_stats=None):
+    """Compute text statistics and readability scores.
+
+    Return the same values as textacy `TextStats` but syllables are counted
+    once per distinct word via the word statistics cache and the counts are
+    aggregated with numpy.
+
+    Args:
+        doc (Spacy.doc): doc to analyze.
+        word_stats (WordStatsCache, optional): word statistics cache to use.
+        Defaults to the process one.
+
+    Returns:
+        objdict: stats with counts and readability scores.
+    """
+    return compute_chunked_stats([doc], word_stats=word_stats)
+
+
+def compute_chunked_stats(docs, word_stats=None):
+    """Compute text statistics of a text split in multiple docs.
+
+    Counts are merged as if the docs were a single one so the result is the
+    same as `compute_stats()` on the full text as long as the docs are
+    sentence aligned.
+
+    Args:
+        docs (iterable): docs to analyze. Can be a generator so only one doc
+        is in memory at the time.
+        word_stats (WordStatsCache, optional): word statistics cache to use.
+        Defaults to the process one.
+
+    Returns:
+        objdict: stats with counts and readability scores.
+    """
+    if word_stats is None:
+        word_stats = WORD_STATS
+    lang = None
+    num_sents = 0
+    unique_words = set()
+    chars_chunks = []
+    syllables_chunks = []
+    for doc in docs:
+        lang = doc.vocab.lang
+
+        # !same definition of words as textacy: everything but spaces and
+        # punct.
+        lowers = []
+        lengths = []
+        for token in doc:
+            if not token.is_space and not token.is_punct:
+                lowers.append(token.lower_)
+                lengths.append(len(token))
+        unique_words.update(lowers)
+        chars_chunks.append(np.array(lengths, dtype=np.int64))
+        syllables_chunks.append(np.array(
+            word_stats.get_syllables(lowers, lang), dtype=np.int64))
+        num_sents += sum(1 for _ in doc.sents)
+
+    chars = np.concatenate(chars_chunks or [np.zeros(0, dtype=np.int64)])
+    syllables = np.concatenate(syllables_chunks or
+                               [np.zeros(0, dtype=np.int64)])
+    num_words = len(chars)
+    num_chars = int(chars.sum())
+    num_syllables = int(syllables.sum())
+    num_long_words = int(np.count_nonzero(chars >= 7))
+    num_polysyllable_words = int(np.count_nonzero(syllables >= 3))
+
     stats = create_objdict()
-    counts = {'sentences': ts.n_sents,
-              'words': ts.n_words,
-              'unique_words': ts.n_unique_words,
-              'chars': ts.n_chars,
-              'chars_per_word': ts.n_chars_per_word,
-              'long_words': ts.n_long_words,
-              'syllables': ts.n_syllables,
-              'syllables_per_word': ts.n_syllables_per_word,
-              'monosyllable_words': ts.n_monosyllable_words,
-              'polysyllable_words': ts.n_polysyllable_words
+    counts = {'sentences': num_sents,
+              'words': num_words,
+              'unique_words': len(unique_words),
+              'chars': num_chars,
+              'chars_per_word': tuple(chars.tolist()),
+              'long_words': num_long_words,
+              'syllables': num_syllables,
+              'syllables_per_word': tuple(syllables.tolist()),
+              'monosyllable_words': int(np.count_nonzero(syllables == 1)),
+              'polysyllable_words': num_polysyllable_words
               }
     stats.counts = dict_to_objdict(counts)
-    readability = {}
-    if stats.counts.words > 0:
-        readability = {'flesch_kincaid_grade_level': ts.flesch_kincaid_grade_level,
-                       'flesch_reading_ease': ts.flesch_reading_ease,
-                       'smog_index': 0,
-                       'gunning_fog_index': ts.gunning_fog_index,
-                       'coleman_liau_index': ts.coleman_liau_index,
-                       'automated_readability_index': ts.automated_readability_index,
-                       'lix': ts.lix,
-                       }
-    if stats.counts.sentences >= 30:
-        readability['smog_index'] = ts.smog_index
-    stats.readability = dict_to_objdict(readability)
+    scores = {}
+    if num_words > 0:
+        scores = {
+            'flesch_kincaid_grade_level': readability.flesch_kincaid_grade_level(num_syllables, num_words, num_sents),  # noqa
+            'flesch_reading_ease': readability.flesch_reading_ease(num_syllables, num_words, num_sents, lang=lang),  # noqa
+            'smog_index': 0,
+            'gunning_fog_index': readability.gunning_fog_index(num_words, num_polysyllable_words, num_sents),  # noqa
+            'coleman_liau_index': readability.coleman_liau_index(num_chars, num_words, num_sents),  # noqa
+            'automated_readability_index': readability.automated_readability_index(num_chars, num_words, num_sents),  # noqa
+            'lix': readability.lix(num_words, num_long_words, num_sents),
+        }
+    if num_sents >= 30:
+        scores['smog_index'] = readability.smog_index(num_polysyllable_words,
+                                                      num_sents)
+    stats.readability = dict_to_objdict(scores)
     return stats
 
 
-def analyze_post(post, debug=False):
-    "Perform NLP analysis"
+def analyze_chunks(nlp, text, header_content, config, extractor, parts,
+                   clean_fields=None):
+    """Analyze a very long text one sentence aligned chunk at the time.
 
-    counters = PerfCounters()
-    nlp = create_objdict()
+    Only the docs of the chunk being analyzed are kept in memory. Key terms
+    are merged via `merge_key_terms()` and statistics via
+    `compute_chunked_stats()`.
 
-    # clean fields
-    counters.start('cleanup')
-    clean_fields = generate_clean_fields(post)
-    nlp.clean_fields = clean_fields
-    counters.stop('cleanup')
+    Args:
+        nlp (objdict): analysis results where terms and stats are stored.
+        text (str): post text.
+        header_content (str): cleaned up title, category, tags and abstract
+        which are analyzed with the first chunk.
+        config (objdict): nlp config.
+        extractor (KeyTermsExtractor): post key terms extractor.
+        parts (set): analysis parts to compute.
+        clean_fields (objdict, optional): when given, its text is built from
+        the cleaned up chunks so the whole text is never cleaned up at once.
+    """
+    chunks_terms = []
+    weights = []
+    cleaned_chunks = []
+
+    def text_docs():
+        for idx, chunk in enumerate(split_text(text, config.chunk_size)):
+            if 'terms' in parts or clean_fields is not None:
+                cleaned = text_cleanup(chunk)
+            if clean_fields is not None and cleaned:
+                cleaned_chunks.append(cleaned)
+            if 'terms' in parts:
+                if not idx:
+                    cleaned = ' '.join([header_content, cleaned])
+                cleaned_doc = make_spacy_doc(cleaned, lang=config.spacy_model)
+                chunks_terms.append(extractor.extract(cleaned_doc,
+                                                      ngrams=config.ngrams))
+                weights.append(len(cleaned))
+            if 'stats' in parts:
+                yield make_spacy_doc(chunk, lang=config.spacy_model)
 
-    # creating spacy docs
-    counters.start('make_spacy_docs')
-    all_cleaned_content = ' '.join([clean_fields.title, clean_fields.category,
-                                    " ".join(clean_fields.tags),
-                                    clean_fields.abstract, clean_fields.text])
+    if 'stats' in parts:
+        nlp.stats = compute_chunked_stats(text_docs())
+    else:
+        for _ in text_docs():  # only extract terms
+            pass
+    if 'terms' in parts:
+        nlp.terms = merge_key_terms(chunks_terms, weights,
+                                    num_terms=config.num_terms)
+    if clean_fields is not None:
+        clean_fields.text = ' '.join(cleaned_chunks)
 
-    # overall terms
-    cleaned_doc = make_spacy_doc(all_cleaned_content, lang=SPACY_MODEL)
 
-    # title terms
-    title_doc = make_spacy_doc(clean_fields.title, lang=SPACY_MODEL)
+def analyze_post(post, debug=False, config=None, parts=None):
+    """Perform NLP analysis
+
+    Args:
+        post (objdict): post to analyze.
+        debug (bool, optional): report timings. Defaults to False.
+        config (objdict, optional): nlp config. Defaults to the one set via
+        `configure()`.
+        parts (iterable, optional): analysis parts to compute. Defaults to
+        the config ones or all of them.
+
+    Returns:
+        objdict: analysis results. Parts not computed are missing.
+    """
+    if config is None:
+        config = CONFIG
+    if parts is None:
+        parts = config.parts
+    if parts is None:
+        parts = NLP_PARTS
+    parts = set(parts)
+    if 'terms' in parts or 'title_terms' in parts:
+        parts.add('clean_fields')
 
-    # for statistics
-    text_doc = make_spacy_doc(post.text, lang=SPACY_MODEL)
+    counters = PerfCounters()
+    nlp = create_objdict()
+    if not parts:
+        return nlp
 
-    counters.stop('make_spacy_docs')
+    # long texts are analyzed and cleaned up chunk by chunk
+    chunked = len(post.text or '') > config.chunk_size
 
-    # terms extraction
-    counters.start('extract_key_terms')
-    nlp.terms = extract_key_terms(cleaned_doc, num_terms=NUM_TERMS,
-                                  algo=TERM_EXTRACTOR_ALGO, ngrams=NGRAMS)
+    # clean fields
+    clean_fields = None
+    if 'clean_fields' in parts:
+        counters.start('cleanup')
+        clean_fields = generate_clean_fields(post, clean_text=not chunked)
+        nlp.clean_fields = clean_fields
+        counters.stop('cleanup')
 
+    # title terms
     # !note we restrict ngram to one as we only want the lemmized top terms.
-    nlp.title_terms = extract_key_terms(title_doc, num_terms=NUM_TERMS,
-                                        algo=TERM_EXTRACTOR_ALGO, ngrams=1)
+    if 'title_terms' in parts:
+        counters.start('title_terms')
+        title_doc = make_spacy_doc(clean_fields.title,
+                                   lang=config.spacy_model)
+        nlp.title_terms = extract_key_terms(title_doc,
+                                            num_terms=config.num_terms,
+                                            algo=config.term_extractor,
+                                            ngrams=1)
+        counters.stop('title_terms')
+
+    if 'terms' not in parts and 'stats' not in parts and not (
+            chunked and clean_fields is not None):
+        if debug:
+            counters.report()
+        return nlp
+
+    header_content = ''
+    if 'terms' in parts:
+        header_content = ' '.join([clean_fields.title, clean_fields.category,
+                                   " ".join(clean_fields.tags),
+                                   clean_fields.abstract])
+
+    extractor = KeyTermsExtractor(config)
+    if chunked:
+        counters.start('chunked_analysis')
+        analyze_chunks(nlp, post.text, header_content, config, extractor,
+                       parts, clean_fields)
+        counters.stop('chunked_analysis')
+    else:
+        if 'terms' in parts:
+            # overall terms
+            counters.start('extract_key_terms')
+            all_cleaned_content = ' '.join([header_content,
+                                            clean_fields.text])
+            cleaned_doc = make_spacy_doc(all_cleaned_content,
+                                         lang=config.spacy_model)
+            nlp.terms = extractor.extract(cleaned_doc, ngrams=config.ngrams)
+            counters.stop('extract_key_terms')
 
-    counters.stop('extract_key_terms')
+        if 'stats' in parts:
+            # text stats
+            counters.start('text_stats')
+            text_doc = make_spacy_doc(post.text, lang=config.spacy_model)
+            nlp.stats = compute_stats(text_doc)
+            counters.stop('text_stats')
 
-    # text stats
-    counters.start('text_stats')
-    nlp.stats = compute_stats(text_doc)
-    counters.stop('text_stats')
+    # which algorithm ended up being used given the time budget
+    if 'terms' in parts:
+        nlp.term_extractor = extractor.get_algorithm()
     if debug:
         counters.report()
     return nlp
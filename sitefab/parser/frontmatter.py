@@ -82,6 +82,7 @@ def parse(post):
     used in linter.validate()
     """
     md = post
+    meta = None
     d = frontmatter_matcher.search(post)
     if d:
         frontmatter = d.group(1)
@@ -93,9 +94,7 @@ def parse(post):
             print(ye)
             m = None
 
-        if type(m) != dict:
-            meta_data = None
-        else:
+        if type(m) == dict:
             meta_data = parse_fields(m)
             meta = utils.dict_to_objdict(meta_data)
 
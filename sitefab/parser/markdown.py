@@ -1,13 +1,18 @@
 # coding: utf-8
 import re
+from html import unescape
 
 # syntax coloring
 from pygments import highlight
 from pygments.lexers import get_lexer_by_name, guess_lexer
 
 
+import mistune
 from mistune import Renderer, escape
+from textacy.preprocessing import normalize_whitespace
+
 from sitefab import utils
+from sitefab.parser.html2text import html2text
 
 youtube_matcher = re.compile("v=([^&]+)")
 
@@ -24,7 +29,7 @@ class HTMLRendererMixin(object):
             embed = True
             if "embed" in link:  # Already correct link
                 src = link
-                template = self.jinja2.get_template('youtube')
+                template = self.templates['youtube']
             else:
                 # need to canonalize youtube url
                 if "https://youtu.be/" in link:
@@ -38,45 +43,44 @@ class HTMLRendererMixin(object):
                     else:
                         print("error can't detect videoid for link: %s" % link)
                         print(self.meta.title)
-                template = self.jinja2.get_template('youtube')
+                template = self.templates['youtube']
                 self.info.videos.append(src)
 
         # Normal links or not embedded youtube videos
         else:
             src = link.replace("&no_embed=1", "")
-            template = self.jinja2.get_template('a')
+            template = self.templates['a']
             self.info.links.append(src)
 
-        rv = template.render(href=src, text=content, title=title, embed=embed,
-                             site=self.site, meta=self.meta)
+        rv = template(href=src, text=content, title=title, embed=embed,
+                      site=self.site, meta=self.meta)
         # rv = rv.encode('utf-8')
         return rv
 
     def image(self, src, title, alt_text):
 
         self.info.images.append(src)
-        template = self.jinja2.get_template('img')
-        rv = template.render(src=src, alt=alt_text, title=title,
-                             plugin_data=self.plugin_data, site=self.site,
-                             meta=self.meta)
+        rv = self.templates['img'](src=src, alt=alt_text, title=title,
+                                   plugin_data=self.plugin_data,
+                                   site=self.site, meta=self.meta)
         # rv = rv.encode('utf-8')
         return rv
 
     def header(self, text, level, raw=None):
 
-        template = self.jinja2.get_template('h')
-        rv = template.render(level=level, text=text, id=self.toc_count,
-                             site=self.site, meta=self.meta)
+        rv = self.templates['h'](level=level, text=text, id=self.toc_count,
+                                 site=self.site, meta=self.meta)
         # rv = rv.encode('utf-8')
 
         self.toc_tree.append((self.toc_count, text, level, raw))
         self.toc_count += 1
+        self.text_chunks.append('\n')
         return rv
 
     def block_quote(self, text):
         "Block quote highlighter"
-        template = self.jinja2.get_template('blockquote')
-        rv = template.render(text=text, site=self.site, meta=self.meta)
+        rv = self.templates['blockquote'](text=text, site=self.site,
+                                          meta=self.meta)
         # rv = rv.encode('utf-8')
         return rv
 
@@ -94,17 +98,55 @@ class HTMLRendererMixin(object):
 
         self.info.code.append(code)
 
-        template = self.jinja2.get_template('code')
-        rv = template.render(code=code, lang=lang, site=self.site,
-                             meta=self.meta)
+        rv = self.templates['code'](code=code, lang=lang, site=self.site,
+                                    meta=self.meta)
         # rv = rv.encode('utf-8')
         return rv
 
-    def init(self, jinja2, code_formatter, site, meta):
+    # [Plain text code] #
+    # The plain text used by the NLP is collected while rendering so the
+    # html doesn't have to be parsed again. Code is ignored like html2text.
+    def text(self, text):
+        self.text_chunks.append(text)
+        return super().text(text)
+
+    def autolink(self, link, is_email=False):
+        self.text_chunks.append(link)
+        return super().autolink(link, is_email)
+
+    def inline_html(self, html):
+        self.text_chunks.append(html2text(html))
+        return super().inline_html(html)
+
+    def block_html(self, html):
+        self.text_chunks.append('\n%s\n' % html2text(html))
+        return super().block_html(html)
+
+    def paragraph(self, text):
+        self.text_chunks.append('\n')
+        return super().paragraph(text)
+
+    def list_item(self, text):
+        self.text_chunks.append('\n')
+        return super().list_item(text)
+
+    def table_cell(self, content, **flags):
+        self.text_chunks.append(' ')
+        return super().table_cell(content, **flags)
+
+    def table_row(self, content):
+        self.text_chunks.append('\n')
+        return super().table_row(content)
+
+    def linebreak(self):
+        self.text_chunks.append('\n')
+        return super().linebreak()
+
+    def init(self, templates, code_formatter, site, meta):
         """Init function called before each parsing.
 
         Args:
-            jinja2 (dict): jinja2 templates used for rendering
+            templates (dict): compiled element templates used for rendering
             code_formatter (dict): code syntax highlight configuration
             site (obj_dict): the full site context (SiteFab object)
             meta (obj_dict): the meta associated with the post
@@ -117,7 +159,8 @@ class HTMLRendererMixin(object):
         # reset toc
         self.toc_tree = []
         self.toc_count = 0
-        self.jinja2 = jinja2
+        self.text_chunks = []
+        self.templates = templates
         self.code_formatter = code_formatter
         self.plugin_data = site.plugin_data
         self.site = site
@@ -141,6 +184,17 @@ class HTMLRendererMixin(object):
     def get_info(self):
         return self.info
 
+    def get_text(self):
+        """Return the post content as plaintext without the code snippets.
+
+        Returns:
+            str: post content in plaintext.
+        """
+        text = ''.join(self.text_chunks)
+        if '&' in text:
+            text = unescape(text)
+        return normalize_whitespace(text)
+
     def get_stats(self):
         stats = self.stats
         stats['num_links'] = len(self.info['links'])
@@ -214,3 +268,76 @@ class HTMLRendererMixin(object):
 
 class HTMLRenderer(HTMLRendererMixin, Renderer):
     pass
+
+
+class Markdown(mistune.Markdown):
+    """Markdown parser that split the parsing from the rendering
+
+    The parse tree produced by tokenize() is made of plain dict and lists
+    so it can be stored in the post and rendered as many times as needed,
+    with different renderers, via render_tree().
+    """
+
+    def tokenize(self, text):
+        """Parse markdown into a reusable parse tree.
+
+        Args:
+            text (str): markdown text.
+
+        Returns:
+            dict: parse tree with the block tokens and the links and
+            footnotes definitions.
+        """
+        tokens = self.block(mistune.preprocessing(text))
+        tree = {
+            "tokens": list(tokens),
+            "def_links": self.block.def_links,
+            "def_footnotes": self.block.def_footnotes
+        }
+
+        # reset block
+        self.block.tokens = []
+        self.block.def_links = {}
+        self.block.def_footnotes = {}
+        return tree
+
+    def render_tree(self, tree):
+        """Render a parse tree produced by tokenize().
+
+        Args:
+            tree (dict): parse tree.
+
+        Returns:
+            str: rendered html.
+        """
+        # rendering consume the tokens and number the footnotes so the
+        # tree is left untouched by working on copies.
+        self.tokens = list(reversed(tree['tokens']))
+        keys = dict(tree['def_footnotes'])
+        self.inline.setup(tree['def_links'], keys)
+
+        out = self.renderer.placeholder()
+        while self.pop():
+            out += self.tok()
+
+        # reset inline
+        self.inline.links = {}
+        self.inline.footnotes = {}
+
+        if not self.footnotes:
+            return out
+
+        footnotes = filter(lambda o: keys.get(o['key']), self.footnotes)
+        self.footnotes = sorted(
+            footnotes, key=lambda o: keys.get(o['key']), reverse=True
+        )
+
+        body = self.renderer.placeholder()
+        while self.footnotes:
+            note = self.footnotes.pop()
+            body += self.renderer.footnote_item(
+                note['key'], note['text']
+            )
+
+        out += self.renderer.footnotes(body)
+        return out
@@ -1,12 +1,11 @@
 "Post parser"
-import jinja2
-import mistune
 from pygments.formatters import html
 
 from sitefab import files, utils
 from sitefab.parser import frontmatter
 from sitefab.parser.html2text import html2text
-from sitefab.parser.markdown import HTMLRenderer
+from sitefab.parser.markdown import HTMLRenderer, Markdown
+from sitefab.parser.templates import compile_templates
 
 
 class Parser():
@@ -32,15 +31,17 @@ class Parser():
         # NOTE: Might seems weird to do this but templates is what allows
         # to have different rendering for each plugins. So we keep it explict
         # in the code as this got messed up countless time :(
+        # Plugins that only need an alternate rendering of already parsed
+        # posts should use render() which reuse the post parse tree.
         self.templates = self.config.templates
 
         # templates are not compiled yet, they will be when parsing will be
         # called the first time
-        self.jinja2 = None
+        self.element_templates = None
 
         # markdown parser
         self.renderer = HTMLRenderer()
-        self.md_parser = mistune.Markdown(renderer=self.renderer)
+        self.md_parser = Markdown(renderer=self.renderer)
 
         # code higlighterr
         if self.config.code_display_line_num:
@@ -71,6 +72,12 @@ class Parser():
             utils.detailed_error("Parser", 'make_config',
                                  'template_dir not found')
 
+        # keep post.parse_tree for the plugins calling render(). Off by
+        # default as the tree is sent to the NLP workers and kept all along
+        # the build.
+        if config.get('keep_parse_tree') is None:
+            config.keep_parse_tree = False
+
         config.templates = {}
         for fname in files.get_files_list(config.templates_path, "*.html"):
             template = files.read_file(fname)
@@ -84,27 +91,70 @@ class Parser():
     def parse(self, md_file):
         """ Parse a md file into a post object
         """
-
-        # compile the templates when we parse the first post. This is needed
-        # to ensure that plugins get a chance to modify the templates before
-        # we compile them.
-        if not self.jinja2:
-            self.jinja2 = jinja2.Environment(loader=jinja2.DictLoader(
-                                             self.templates))
-
         parsed_post = utils.dict_to_objdict()
 
         # parsing frontmatter and getting the md
         parsed_post.meta, parsed_post.md = frontmatter.parse(md_file)
 
-        # parsing markdown and extractring info
-        # NOTE: this must called before every parsing
-        self.renderer.init(self.jinja2, self.code_formatter, self.site,
-                           parsed_post.meta)
+        # the parse tree can be kept to allows alternate renderings via
+        # render() without tokenizing the markdown again
+        parse_tree = self.md_parser.tokenize(parsed_post.md)
+        if self.config.keep_parse_tree:
+            parsed_post.parse_tree = parse_tree
+
+        # rendering markdown and extractring info
+        parsed_post.html = self.render_tree(parse_tree, parsed_post.meta)
 
-        parsed_post.html = self.md_parser.parse(parsed_post.md)
-        parsed_post.text = html2text(parsed_post.html)  # used by NLP
+        # plaintext used by NLP. It is collected during the rendering,
+        # html2text is only used when explicitly requested in the config.
+        if self.config.use_html2text:
+            parsed_post.text = html2text(parsed_post.html)
+        else:
+            parsed_post.text = self.renderer.get_text()
         parsed_post.meta.statistics = self.renderer.get_stats()
         parsed_post.meta.toc = self.renderer.get_json_toc()
         parsed_post.elements = self.renderer.get_info()
         return parsed_post
+
+    def render(self, post):
+        """ Render a parsed post into html using this parser templates.
+
+        Args:
+            post (post): a post returned by parse(). The post can come from
+            any parser as only its parse tree, or markdown, and meta are
+            used.
+
+        Returns:
+            str: the post html
+
+        note: this only cost a rendering pass and is what plugins should use
+        to get alternate html version of the posts (AMP, feeds...).
+        """
+
+        # posts parsed without keep_parse_tree don't have a parse tree
+        parse_tree = post.parse_tree
+        if not parse_tree:
+            parse_tree = self.md_parser.tokenize(post.md or '')
+        return self.render_tree(parse_tree, post.meta)
+
+    def render_tree(self, parse_tree, meta):
+        """ Render a markdown parse tree into html
+
+        Args:
+            parse_tree (dict): tree returned by the markdown tokenizer.
+            meta (objdict): the post meta.
+
+        Returns:
+            str: the html
+        """
+        # compile the templates when we render the first post. This is needed
+        # to ensure that plugins get a chance to modify the templates before
+        # we compile them. They are compiled once per parser into direct
+        # render functions as they are called for every element of every post.
+        if not self.element_templates:
+            self.element_templates = compile_templates(self.templates)
+
+        # NOTE: this must called before every rendering
+        self.renderer.init(self.element_templates, self.code_formatter,
+                           self.site, meta)
+        return self.md_parser.render_tree(parse_tree)
@@ -0,0 +1,240 @@
+"""Parser element templates compiled into direct render functions.
+
+The parser renders a template for every link, image, header, blockquote and
+code block of every post. Going through a full jinja2 render for each of
+them dominates the markdown to html time, while most element templates only
+substitute a few variables. Templates that only use plain text, ``{{ var }}``
+/ ``{{ var.attr }}`` substitutions and ``{% if %}`` / ``{% elif %}`` /
+``{% else %}`` blocks on such variables are compiled into a lightweight
+render function. Everything else falls back to the regular jinja2 template.
+"""
+import jinja2
+from jinja2.utils import missing
+
+# names that jinja2 resolves by itself and can't be looked up in the context.
+RESERVED_NAMES = set(['true', 'false', 'none', 'True', 'False', 'None',
+                      'not', 'and', 'or', 'in', 'is', 'if', 'else', 'loop',
+                      'self', 'caller', 'varargs', 'kwargs'])
+
+# node types
+TEXT = 0
+VAR = 1
+IF = 2
+
+
+class UnsupportedTemplate(Exception):
+    "Raised when a template uses features not handled by the fast path"
+
+
+class FastPathError(Exception):
+    "Raised at render time when the fast path can't match jinja2 output"
+
+
+class ElementTemplate():
+    """Parser element template with a fast render path
+
+    Calling the object renders the template with the supplied variables,
+    exactly like ``jinja2.Template.render(**kwargs)`` would.
+    """
+
+    def __init__(self, name, source, environment):
+        """Compile a parser element template.
+
+        Args:
+            name (str): template name e.g `img`.
+            source (str): template source code.
+            environment (jinja2.Environment): environment used for the
+            full jinja2 fallback.
+        """
+        self.name = name
+        self.template = environment.get_template(name)
+        try:
+            self.nodes = compile_nodes(source, environment)
+        except UnsupportedTemplate:
+            self.nodes = None
+
+    def is_compiled(self):
+        "Return True if the template is rendered through the fast path"
+        return self.nodes is not None
+
+    def __call__(self, **kwargs):
+        if self.nodes is not None:
+            try:
+                return ''.join(render_nodes(self.nodes, kwargs))
+            except FastPathError:
+                # e.g attribute of an undefined variable: let jinja2 handle
+                # it so the behavior is exactly the same.
+                pass
+        return self.template.render(**kwargs)
+
+
+def compile_templates(templates):
+    """Compile a set of parser templates.
+
+    Args:
+        templates (dict): template sources indexed by template name.
+
+    Returns:
+        dict: ElementTemplate indexed by template name.
+    """
+    environment = jinja2.Environment(loader=jinja2.DictLoader(templates))
+    compiled = {}
+    for name, source in templates.items():
+        compiled[name] = ElementTemplate(name, source, environment)
+    return compiled
+
+
+def compile_nodes(source, environment):
+    """Compile a template source into a list of render nodes.
+
+    Args:
+        source (str): template source.
+        environment (jinja2.Environment): environment used to tokenize.
+
+    Returns:
+        list: render nodes.
+
+    Raises:
+        UnsupportedTemplate: the template use features not supported by the
+        fast path.
+    """
+    # jinja2 lexer is used so whitespace control and newline normalization
+    # are exactly the ones of the full rendering.
+    tokens = [(tpe, val) for _, tpe, val in environment.lex(source)
+              if tpe not in ('whitespace', 'comment_begin', 'comment',
+                             'comment_end')]
+    tokens.reverse()
+
+    nodes, end_tag = _parse_nodes(tokens, environment)
+    if end_tag:
+        raise UnsupportedTemplate('unexpected %s' % end_tag)
+    return nodes
+
+
+def _parse_nodes(tokens, environment):
+    """Parse tokens until the end of the stream or an if branch tag
+
+    Returns:
+        list: [nodes, name of the if tag that stopped the parsing or None]
+    """
+    nodes = []
+    while tokens:
+        tpe, val = tokens.pop()
+        if tpe == 'data':
+            nodes.append((TEXT, val))
+        elif tpe == 'variable_begin':
+            path = _parse_path(tokens, environment)
+            _expect(tokens, 'variable_end')
+            nodes.append((VAR, path))
+        elif tpe == 'block_begin':
+            tag = _expect(tokens, 'name')
+            if tag == 'if':
+                nodes.append(_parse_if(tokens, environment))
+            elif tag in ('elif', 'else', 'endif'):
+                return [nodes, tag]
+            else:
+                raise UnsupportedTemplate('tag %s' % tag)
+        else:
+            raise UnsupportedTemplate('token %s' % tpe)
+    return [nodes, None]
+
+
+def _parse_if(tokens, environment):
+    "Parse an if block into (IF, [(negate, path, nodes)..], else_nodes)"
+    branches = []
+    else_nodes = []
+    tag = 'if'
+    while tag in ('if', 'elif'):
+        negate = False
+        if tokens and tokens[-1] == ('name', 'not'):
+            tokens.pop()
+            negate = True
+        path = _parse_path(tokens, environment)
+        _expect(tokens, 'block_end')
+        body, tag = _parse_nodes(tokens, environment)
+        branches.append((negate, path, body))
+
+    if tag == 'else':
+        _expect(tokens, 'block_end')
+        else_nodes, tag = _parse_nodes(tokens, environment)
+
+    if tag != 'endif':
+        raise UnsupportedTemplate('unclosed if')
+    _expect(tokens, 'block_end')
+    return (IF, branches, else_nodes)
+
+
+def _parse_path(tokens, environment):
+    "Parse a dotted variable name e.g meta.title"
+    name = _expect(tokens, 'name')
+    if name in RESERVED_NAMES or name in environment.globals:
+        raise UnsupportedTemplate('name %s' % name)
+    path = [name]
+    while tokens and tokens[-1] == ('operator', '.'):
+        tokens.pop()
+        path.append(_expect(tokens, 'name'))
+    return tuple(path)
+
+
+def _expect(tokens, expected_type):
+    "Pop the next token and ensure it is of the expected type"
+    if not tokens:
+        raise UnsupportedTemplate('unexpected end of template')
+    tpe, val = tokens.pop()
+    if tpe != expected_type:
+        raise UnsupportedTemplate('unexpected %s' % tpe)
+    return val
+
+
+def render_nodes(nodes, context):
+    """Render compiled nodes
+
+    Args:
+        nodes (list): compiled nodes.
+        context (dict): template variables.
+
+    Yields:
+        str: rendered chunks.
+    """
+    for node in nodes:
+        if node[0] == TEXT:
+            yield node[1]
+        elif node[0] == VAR:
+            value = resolve(node[1], context)
+            if value is not missing:
+                yield str(value)
+        else:
+            body = node[2]
+            for negate, path, branch in node[1]:
+                value = resolve(path, context)
+                truth = value is not missing and bool(value)
+                if truth != negate:
+                    body = branch
+                    break
+            yield from render_nodes(body, context)
+
+
+def resolve(path, context):
+    """Resolve a dotted variable the way jinja2 does.
+
+    Returns:
+        The value or ``missing`` when jinja2 would return an undefined.
+
+    Raises:
+        FastPathError: jinja2 would raise an error.
+    """
+    value = context.get(path[0], missing)
+    for attr in path[1:]:
+        if value is missing:
+            # attribute of undefined raise an UndefinedError in jinja2
+            raise FastPathError()
+        try:
+            value = getattr(value, attr)
+            continue
+        except AttributeError:
+            pass
+        try:
+            value = value[attr]
+        except (TypeError, LookupError, AttributeError):
+            value = missing
+    return value
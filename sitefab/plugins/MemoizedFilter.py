@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+
+
+class MemoizedFilter():
+    """ Wrap a pure template filter in a bounded LRU cache
+
+    A filter is pure when its output only depends on its arguments. Calls
+    with the same hashable arguments return the cached output, calls with
+    unhashable arguments, e.g a list, are always computed.
+    """
+
+    def __init__(self, name, fct, max_size=1024):
+        """
+        :param str name: filter name.
+        :param callable fct: the filter function.
+        :param int max_size: maximum number of cached outputs.
+        """
+        self.name = name
+        self.fct = fct
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0  # calls with unhashable arguments
+        self.time = 0  # seconds spent computing the outputs
+
+    def __call__(self, *args, **kwargs):
+        # 1, 1.0 and True, or Markup('x') and 'x', are equal but the filter
+        # output may differ: the arguments types are part of the key
+        key = (tuple((type(arg), arg) for arg in args),
+               tuple(sorted((name, type(arg), arg)
+                            for name, arg in kwargs.items())))
+        try:
+            value = self.cache[key]
+        except KeyError:
+            self.misses += 1
+        except TypeError:
+            self.uncached += 1
+            return self.compute(args, kwargs)
+        else:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return value
+
+        value = self.compute(args, kwargs)
+        self.cache[key] = value
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return value
+
+    def compute(self, args, kwargs):
+        "Call the filter and record the time spent"
+        start = time.perf_counter()
+        value = self.fct(*args, **kwargs)
+        self.time += time.perf_counter() - start
+        return value
+
+    def get_counters(self, since=None):
+        """ Return the filter counters
+
+        :param list since: counters to subtract, e.g returned by a previous
+        call, to get the calls made in between.
+
+        :rtype: list
+        :return: hits, misses, uncached calls and seconds spent
+        """
+        counters = [self.hits, self.misses, self.uncached, self.time]
+        if since:
+            counters = [value - prev for value, prev in zip(counters, since)]
+        return counters
+
+    def merge_counters(self, counters):
+        "Add the counters recorded by another process"
+        hits, misses, uncached, seconds = counters
+        self.hits += hits
+        self.misses += misses
+        self.uncached += uncached
+        self.time += seconds
+
+    def get_stats(self):
+        """ Return the filter cache statistics
+
+        :rtype: dict
+        :return: name, hits, misses, uncached calls and seconds spent
+        """
+        return {'name': self.name, 'hits': self.hits, 'misses': self.misses,
+                'uncached': self.uncached, 'time': self.time}
@@ -15,6 +15,7 @@ from yapsy.PluginManager import PluginManager
 from sitefab import utils
 
 from .CollectionProcessor import CollectionProcessor
+from .MemoizedFilter import MemoizedFilter
 from .PostProcessor import PostProcessor
 from .SitePreparsing import SitePreparsing
 from .SiteProcessor import SiteProcessor
@@ -88,6 +89,9 @@ class Plugins():
         # across stages
         self.plugins_executed = {}
 
+        # pure template filters wrapped by get_template_filters()
+        self.memoized_filters = {}
+
         # FIXME: make sure it is working
         # logging.basicConfig(filename=debug_log_fname, level=logging.DEBUG)
 
@@ -194,20 +198,73 @@ class Plugins():
         :rtype: list
         :return: list of plugins name the plugin depend on
         """
+        return self._get_core_list(plugin, "Dependencies")
+
+    def get_plugin_consumed_fields(self, plugin):
+        """ Return the post fields a given plugin reads
+
+        Declared in the plugin description as a comma separated list e.g
+        `Consumes = post.nlp.terms, post.nlp.stats`. Used to only compute
+        the expensive fields, such as the NLP analysis, when needed.
+
+        :param iPlugin plugin: the plugin requested
+
+        :rtype: set
+        :return: set of fields consumed by the plugin
+        """
+        return self._get_core_list(plugin, "Consumes")
 
-        # No dependencies
-        if not plugin.details.has_option("Core", "Dependencies"):
+    def get_consumed_fields(self):
+        """ Return the post fields read by the enabled plugins
+
+        Template filters are always loaded so they are always included.
+        Plugins that don't declare `Consumes` may read any field: they
+        consume the whole NLP analysis. An empty `Consumes =` declares that
+        no computed field is read.
+
+        :rtype: set
+        :return: set of fields consumed
+        """
+        fields = set()
+        for plugin in self.get_plugins():
+            class_name = self.get_plugin_class_name(plugin)
+            if (self.is_plugin_enabled(plugin) or
+                    class_name == "TemplateFilter"):
+                if plugin.details.has_option("Core", "Consumes"):
+                    fields.update(self.get_plugin_consumed_fields(plugin))
+                else:
+                    fields.add('post.nlp')
+        return fields
+
+    def _get_core_list(self, plugin, option):
+        "Parse a comma separated option of the plugin Core section"
+        if not plugin.details.has_option("Core", option):
             return set()
 
-        dependencies = set()
-        st = plugin.details.get("Core", "Dependencies")
+        values = set()
+        st = plugin.details.get("Core", option)
         if "," in st:
             elts = st.split(",")
             for elt in elts:
-                dependencies.add(elt.strip())
+                values.add(elt.strip())
         else:
-            dependencies.add(st)
-        return dependencies
+            values.add(st.strip())
+        return values
+
+    def is_plugin_pure(self, plugin):
+        """ Is the plugin declared pure e.g `Pure = True`
+
+        A pure template filter output only depends on its arguments so it
+        can be cached.
+
+        :param iPlugin plugin: the plugin requested
+
+        :rtype: bool
+        :return: True if the plugin is pure
+        """
+        if not plugin.details.has_option("Core", "Pure"):
+            return False
+        return plugin.details.getboolean("Core", "Pure")
 
     def is_plugin_enabled(self, plugin):
         config = self.get_plugin_config(plugin)
@@ -392,11 +449,16 @@ class Plugins():
             site.logger.write_log(log_id)
         return results
 
-    def get_template_filters(self):
+    def get_template_filters(self, cache_size=1024):
         """Load template filters and return a dictionary list
 
-        Return:
-            dict: jinja filter functions
+        Filters declared pure are memoized, see `get_template_filters_stats()`
+
+        :param int cache_size: number of outputs cached per pure filter, 0
+        to disable the memoization.
+
+        :rtype: dict
+        :return: jinja filter functions
         """
         template_filters = {}
 
@@ -404,6 +466,22 @@ class Plugins():
 
         for flt in filters:
             filter_name = self.get_plugin_module_name(flt)
-            template_filters[filter_name] = flt.plugin_object.myfilter
+            fct = flt.plugin_object.myfilter
+            # filters receiving the jinja context can't be keyed on their args
+            if (cache_size and self.is_plugin_pure(flt) and
+                    not hasattr(fct, 'jinja_pass_arg')):
+                fct = MemoizedFilter(filter_name, fct, cache_size)
+                self.memoized_filters[filter_name] = fct
+            template_filters[filter_name] = fct
 
         return template_filters
+
+    def get_template_filters_stats(self):
+        """Return the cache statistics of the pure template filters
+
+        :rtype: list(dict)
+        :return: name, hits, misses, uncached calls and seconds spent
+        computing the outputs of each filter, slowest first
+        """
+        stats = [flt.get_stats() for flt in self.memoized_filters.values()]
+        return sorted(stats, key=lambda x: x['time'], reverse=True)
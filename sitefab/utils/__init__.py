@@ -11,6 +11,23 @@ def hexdigest(w):
     return xxhash.xxh64(w).hexdigest()
 
 
+def file_hexdigest(path, chunk_size=1 << 20):
+    """ Hash a file without loading it whole in memory
+
+    Args:
+        path (str): file path.
+        chunk_size (int, optional): bytes read at once. Defaults to 1MB.
+
+    Returns:
+        str: same digest as `hexdigest()` of the file content.
+    """
+    h = xxhash.xxh64()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 # [colored output] #
 def warning(txt):
     cprint("\n[Warning] %s\n" % txt, 'yellow')
@@ -62,6 +79,22 @@ def create_objdict(dictionnary=None):
         return objdict()
 
 
+def set_defaults(config, defaults):
+    """ Set the config values that are missing or None
+
+    Args:
+        config (objdict): configuration to complete.
+        defaults (dict): default value of each setting.
+
+    Returns:
+        objdict: the completed configuration.
+    """
+    for key, value in defaults.items():
+        if config.get(key) is None:
+            config[key] = value
+    return config
+
+
 def dict_to_objdict(dictionnary=None):
     """ Convert a dict struct into a objdict structure
 
@@ -54,6 +54,22 @@ def empty_post():
     return post
 
 
+@pytest.fixture(scope="function")
+def make_post():
+    """mock posts factory
+
+    make_post(meta={'title': 'a'}, nlp={'terms': []}, id=1, filename='a.md')
+    """
+    def factory(meta=None, nlp=None, **fields):
+        post = utils.create_objdict(fields)
+        post.meta = utils.create_objdict(meta)
+        post.elements = utils.create_objdict()
+        if nlp is not None:
+            post.nlp = utils.create_objdict(nlp)
+        return post
+    return factory
+
+
 def pytest_configure(config):
     global TEMPLATE_DATA_PATH
     global TEMPLATE_DATA_CONFIG_FILE_PATH
@@ -0,0 +1,72 @@
+import random
+
+from .utils import get_linter_errors_list
+from sitefab.linter.duplicates import find_duplicates, get_lsh_params
+from sitefab.utils import create_objdict
+
+
+def make_posts(num_posts, num_words=200):
+    rnd = random.Random(42)
+    vocab = ['word%s' % i for i in range(2000)]
+    posts = []
+    for idx in range(num_posts):
+        post = create_objdict()
+        post.filename = 'post%s.md' % idx
+        post.text = " ".join(rnd.choice(vocab) for _ in range(num_words))
+        posts.append(post)
+    return posts
+
+
+def test_lsh_params():
+    bands, rows = get_lsh_params(128, 0.8)
+    assert bands * rows == 128
+    assert (1 / bands) ** (1 / rows) <= 0.8
+
+
+def test_near_duplicate_found():
+    posts = make_posts(20)
+    words = posts[3].text.split()
+    words[50:52] = ['edited', 'words']
+    posts[10].text = " ".join(words)
+    duplicates = find_duplicates(posts)
+    assert len(duplicates) == 1
+    post_a, post_b, similarity = duplicates[0]
+    filenames = set([post_a.filename, post_b.filename])
+    assert filenames == set(['post3.md', 'post10.md'])
+    assert similarity >= 0.8
+
+
+def test_different_posts_not_reported():
+    posts = make_posts(20)
+    words = posts[3].text.split()
+    words[:120] = ['new'] * 120
+    posts[10].text = " ".join(words)
+    assert not find_duplicates(posts)
+
+
+def test_short_posts_ignored():
+    posts = make_posts(2, num_words=20)
+    posts[1].text = posts[0].text
+    assert not find_duplicates(posts)
+
+
+def test_e400_triggered(sitefab, empty_post):
+    posts = make_posts(2)
+    posts[1].text = posts[0].text
+    empty_post.filename = posts[0].filename
+    empty_post.text = posts[0].text
+    sitefab.linter.lint_site([empty_post, posts[1]])
+    results = sitefab.linter.lint(empty_post, "", sitefab)
+    error_list = get_linter_errors_list(results)
+    assert "E400" in error_list
+    sitefab.linter.lint_site([])
+
+
+def test_e400_not_triggered(sitefab, empty_post):
+    posts = make_posts(2)
+    empty_post.filename = posts[0].filename
+    empty_post.text = posts[0].text
+    sitefab.linter.lint_site([empty_post, posts[1]])
+    results = sitefab.linter.lint(empty_post, "", sitefab)
+    error_list = get_linter_errors_list(results)
+    assert "E400" not in error_list
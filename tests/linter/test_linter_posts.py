@@ -0,0 +1,37 @@
+from sitefab.linter import linter
+from sitefab.utils import objdict
+
+
+def make_posts(empty_post, num_posts):
+    posts = []
+    for idx in range(num_posts):
+        post = objdict(empty_post)
+        post.filename = 'post%s.md' % idx
+        post.meta = objdict()
+        if idx % 2:
+            post.meta.toc = [["headline", 1, 0]]
+        posts.append(post)
+    return posts
+
+
+def test_lint_posts(sitefab, empty_post):
+    posts = make_posts(empty_post, 4)
+    results = sitefab.linter.lint_posts(posts, sitefab)
+    assert len(results) == 4
+    codes = [err[0] for err in results['post1.md'].info]
+    assert 'E300' in codes
+
+
+def test_parallel_lint_posts(sitefab, empty_post):
+    num_posts = linter.MIN_PARALLEL_POSTS + 1
+    posts = make_posts(empty_post, num_posts)
+    expected = sitefab.linter.lint_posts(posts, sitefab, threads=1)
+    results = sitefab.linter.lint_posts(posts, sitefab, threads=2)
+    assert results == expected
+
+
+def test_frontmatter_only(sitefab, empty_post):
+    posts = make_posts(empty_post, 2)
+    results = sitefab.linter.lint_posts(posts, sitefab, frontmatter_only=True)
+    codes = [err[0] for err in results['post1.md'].info]
+    assert 'E300' not in codes
@@ -0,0 +1,75 @@
+from .utils import get_linter_errors_list
+from sitefab.linter.rendered import parse_page
+
+PAGE = """<html><head><style>%s</style></head><body>
+<ul><li><a href="#toc-0">Intro</a></li><li><a href="#toc-1">End</a></li></ul>
+<h2 id="toc-0">Intro</h2>
+%s
+</body></html>"""
+
+
+def lint_page(sitefab, empty_post, content, style=''):
+    results = sitefab.linter.lint(empty_post, PAGE % (style, content),
+                                  sitefab)
+    return get_linter_errors_list(results)
+
+
+def test_parse_page():
+    page = parse_page(PAGE % ('a{}', '<img src="a.png"><p id="x">x</p>'))
+    assert page.ids['toc-0'] == 1
+    assert page.fragments == ['toc-0', 'toc-1']
+    assert page.images == [{'src': 'a.png'}]
+    assert page.inline_blocks == [['style', 3]]
+
+
+def test_e500_e501_triggered(sitefab, empty_post):
+    errors = lint_page(sitefab, empty_post, '<h2 id="toc-1">End</h2>'
+                       '<img src="/static/a.png">')
+    assert "E500" in errors
+    assert "E501" in errors
+
+
+def test_e500_e501_not_triggered(sitefab, empty_post):
+    errors = lint_page(sitefab, empty_post, '<h2 id="toc-1">End</h2>'
+                       '<img src="a.png" alt="" width="10" height="5">')
+    assert "E500" not in errors
+    assert "E501" not in errors
+
+
+def test_e502_triggered(sitefab, empty_post):
+    errors = lint_page(sitefab, empty_post, '<h2>End</h2>')
+    assert "E502" in errors
+
+
+def test_e502_not_triggered(sitefab, empty_post):
+    errors = lint_page(sitefab, empty_post, '<a name="toc-1"></a>')
+    assert "E502" not in errors
+
+
+def test_e503_triggered(sitefab, empty_post):
+    errors = lint_page(sitefab, empty_post, '<h2 id="toc-1">End</h2>',
+                       'a{}' * 20000)
+    assert "E503" in errors
+
+
+def test_e504_triggered(sitefab, empty_post):
+    errors = lint_page(sitefab, empty_post, '<h2 id="toc-1">End</h2>'
+                       '<p id="toc-0">Duplicate</p>')
+    assert "E504" in errors
+
+
+def test_e504_not_triggered(sitefab, empty_post):
+    errors = lint_page(sitefab, empty_post, '<h2 id="toc-1">End</h2>')
+    assert "E504" not in errors
+
+
+def test_html_cache(sitefab, empty_post, tmp_path):
+    html = PAGE % ('', '<img src="a.png">')
+    sitefab.linter.open_html_cache(tmp_path)
+    expected = sitefab.linter.check_html(html)
+    sitefab.linter.close_html_cache()
+
+    sitefab.linter.open_html_cache(tmp_path)
+    assert sitefab.linter.check_html(html) == expected
+    assert sitefab.linter.html_cache_hits == 1
+    sitefab.linter.close_html_cache()
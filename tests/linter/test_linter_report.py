@@ -0,0 +1,59 @@
+import json
+import xml.dom.minidom
+
+from sitefab.linter.report import LinterReport
+from sitefab.utils import create_objdict
+
+TEST_INFO = {'E101': 'Missing field <b>%s</b>', 'E300': 'H1 <b>%s</b>'}
+
+
+def make_results(info, has_errors):
+    results = create_objdict()
+    results.info = info
+    results.has_errors = has_errors
+    results.has_warnings = 0
+    return results
+
+
+def test_jsonl_written_incrementally(tmp_path):
+    report = LinterReport(tmp_path, TEST_INFO)
+    report.add('a.md', [['E101', 'Missing field <b>title</b>']])
+    report.add('b.md', [])
+    report.add('b.md', [['E101', 'x'], ['E101', 'y'], ['E300', 'z']])
+    report.close()
+    lines = (tmp_path / 'linter.jsonl').read_text().splitlines()
+    assert len(lines) == 4
+    assert json.loads(lines[0]) == {'post': 'a.md', 'code': 'E101',
+                                    'message': 'Missing field title'}
+    assert report.num_findings['E101'] == 3
+    assert report.num_posts['E101'] == 2
+
+
+def test_empty_jsonl(tmp_path):
+    report = LinterReport(tmp_path, TEST_INFO)
+    report.close()
+    assert (tmp_path / 'linter.jsonl').read_text() == ''
+
+
+def test_junit(tmp_path):
+    report = LinterReport(tmp_path, TEST_INFO)
+    results = {'a.md': make_results([['E101', 'Missing <b>title</b>']], 1)}
+    report.write_junit(results, 10)
+    doc = xml.dom.minidom.parse(str(tmp_path / 'linter.xml'))
+    suite = doc.getElementsByTagName('testsuite')[0]
+    assert suite.getAttribute('tests') == '10'
+    assert suite.getAttribute('failures') == '1'
+    failure = doc.getElementsByTagName('failure')[0]
+    assert failure.firstChild.data == 'E101: Missing title'
+
+
+def test_summary(tmp_path):
+    report = LinterReport(tmp_path, TEST_INFO)
+    report.add('a.md', [['E300', 'H1 <b>Title</b>']])
+    report.close()
+    stats = [{'name': 'e300_no_h1', 'codes': ['E300'], 'calls': 1,
+              'time': 0.001, 'results': 1}]
+    report.write_summary(stats, 1)
+    summary = (tmp_path / 'linter_rules.html').read_text(encoding='utf-8-sig')
+    assert 'e300_no_h1' in summary
+    assert '<td>E300</td>' in summary
@@ -0,0 +1,65 @@
+from sitefab.linter import rules
+from sitefab.linter.linter import lint_post
+from sitefab.utils import create_objdict
+
+
+def get_codes(results):
+    return [res[0] for res in results]
+
+
+def test_rules_codes_in_tests_yaml(sitefab):
+    for rl in rules.get_rules():
+        for code in rl.codes:
+            assert code in sitefab.linter.test_info
+
+
+def test_field_rules_indexed(sitefab):
+    ruleset = rules.RuleSet(sitefab.linter.config)
+    names = [rl.name for rl in ruleset.all_fields_rules]
+    assert 'e106_duplicate_spaces' in names
+    names = [rl.name for rl, _ in ruleset.post_rules]
+    assert 'e107_e108_e109_authors_formating' in names
+    assert 'e106_duplicate_spaces' not in names
+
+
+def test_rule_skipped_without_its_fields(sitefab, make_post):
+    ruleset = rules.RuleSet(sitefab.linter.config)
+    test_info = sitefab.linter.test_info
+    lint_post(make_post({'title': 'title'}, filename='post.md'), test_info,
+              ruleset)
+    assert ruleset.stats['e107_e108_e109_authors_formating'][0] == 0
+    lint_post(make_post({'authors': 'Elie'}, filename='post.md'), test_info,
+              ruleset)
+    assert ruleset.stats['e107_e108_e109_authors_formating'][0] == 1
+
+
+def test_disabled_rules(sitefab, make_post):
+    post = make_post({'title': 'a  title', 'authors': 'Elie'},
+                     filename='post.md')
+    test_info = sitefab.linter.test_info
+    codes = get_codes(lint_post(post, test_info, sitefab.linter.rules))
+    assert 'E106' in codes
+    assert 'E107' in codes
+
+    config = create_objdict(sitefab.linter.config)
+    config.disabled_rules = ['E106', 'e107_e108_e109_authors_formating']
+    ruleset = rules.RuleSet(config)
+    codes = get_codes(lint_post(post, test_info, ruleset))
+    assert 'E106' not in codes
+    assert 'E107' not in codes
+    assert 'e106_duplicate_spaces' not in ruleset.stats
+
+
+def test_missing_meta(sitefab, make_post):
+    post = make_post(filename='post.md')
+    post.meta = None
+    results = lint_post(post, sitefab.linter.test_info, sitefab.linter.rules)
+    assert get_codes(results) == ['E100']
+
+
+def test_rules_stats(sitefab, empty_post):
+    sitefab.linter.lint(empty_post, "", sitefab)
+    stats = sitefab.linter.get_rules_stats()
+    assert stats[0]['time'] >= stats[-1]['time']
+    by_name = dict((s['name'], s) for s in stats)
+    assert by_name['e101_mandatory_fields']['calls'] >= 1
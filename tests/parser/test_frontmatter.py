@@ -0,0 +1,18 @@
+from sitefab.parser import frontmatter
+
+
+def test_frontmatter():
+    meta, md = frontmatter.parse("---\ntitle: test\n---\ncontent\n")
+    assert meta.title == 'test'
+    assert md.strip() == 'content'
+
+
+def test_no_frontmatter():
+    meta, md = frontmatter.parse("content\n")
+    assert meta is None
+    assert md == "content\n"
+
+
+def test_invalid_frontmatter():
+    meta, _ = frontmatter.parse("---\n- not a dict\n---\ncontent\n")
+    assert meta is None
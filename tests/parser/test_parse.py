@@ -1,3 +1,4 @@
+from sitefab import utils
 from sitefab.files import read_file
 from sitefab.parser import Parser
 from ..conftest import TEST_ROOT_DIR
@@ -41,3 +42,43 @@ def test_parsing_basic_md(sitefab):
     # statistics
     assert post.meta.statistics.num_videos == 1
     assert post.meta.statistics.num_images == 1
+
+
+def test_parsing_text_without_code(sitefab):
+    parser = Parser(sitefab.config.parser, sitefab)
+    md = "---\ntitle: test\n---\n# title\n\nsome *text* with `inline_code()`\n\n```python\nblock_code()\n```\n"  # noqa
+    post = parser.parse(md)
+    assert post.text == 'title\nsome text with'
+    assert 'code' not in post.text
+
+
+def test_render_alternate_templates(sitefab):
+    parser = Parser(sitefab.config.parser, sitefab)
+    fn = TEST_ROOT_DIR / 'data/basic.md'
+    md = read_file(fn)
+    post = parser.parse(md)
+
+    config = utils.create_objdict(sitefab.config.parser)
+    config.templates = dict(config.templates)
+    config.templates['h'] = '<h{{level}} class="alt">{{text}}</h{{level}}>'
+    alt_parser = Parser(config, sitefab)
+
+    html = alt_parser.render(post)
+    assert '<h2 class="alt">heading 2</h2>' in html
+    assert html == alt_parser.parse(md).html
+
+    # the parse tree is only kept when requested
+    assert post.parse_tree is None
+    assert parser.render(post) == post.html
+
+
+def test_keep_parse_tree(sitefab):
+    config = utils.create_objdict(sitefab.config.parser)
+    config.keep_parse_tree = True
+    parser = Parser(config, sitefab)
+    md = read_file(TEST_ROOT_DIR / 'data/basic.md')
+    post = parser.parse(md)
+    assert post.parse_tree
+
+    # the parse tree is left untouched by the rendering
+    assert parser.render(post) == post.html
@@ -0,0 +1,58 @@
+import jinja2
+from sitefab.parser.templates import compile_templates
+from sitefab.utils import create_objdict
+
+TEMPLATES = {
+    'a': '<a href="{{ href }}"{% if title %} title="{{title}}"{% endif %}>{{ text }}</a>\n',  # noqa
+    'h': '<h{{level}} id="toc-{{id}}">{{text}}</h{{level}}>',
+    'meta': '{{ meta.title }}|{{ meta.missing }}|{{ undefined }}',
+    'branches': '{%- if not a -%} na {% elif b.c %}c{% else %}else{% endif %}',
+    'filter': '{{ text|upper }}',
+    'undefined_attr': '{{ undefined.attr }}',
+}
+
+
+def render_both(name, **kwargs):
+    env = jinja2.Environment(loader=jinja2.DictLoader(TEMPLATES))
+    expected = env.get_template(name).render(**kwargs)
+    compiled = compile_templates(TEMPLATES)
+    return expected, compiled[name](**kwargs)
+
+
+def test_simple_templates_are_compiled():
+    compiled = compile_templates(TEMPLATES)
+    assert compiled['a'].is_compiled()
+    assert compiled['h'].is_compiled()
+    assert compiled['branches'].is_compiled()
+
+
+def test_advanced_templates_fallback():
+    compiled = compile_templates(TEMPLATES)
+    assert not compiled['filter'].is_compiled()
+    assert compiled['filter'](text='test') == 'TEST'
+
+
+def test_same_output_as_jinja():
+    meta = create_objdict()
+    meta.title = 'title'
+    values = [
+        ['a', {'href': '/test', 'title': None, 'text': 'link'}],
+        ['a', {'href': '/test', 'title': 'my title', 'text': 'link'}],
+        ['h', {'level': 2, 'id': 3, 'text': 'headline'}],
+        ['meta', {'meta': meta}],
+        ['branches', {'a': 0, 'b': {'c': 1}}],
+        ['branches', {'a': 1, 'b': {}}],
+        ['branches', {'a': 1, 'b': {'c': 1}}],
+    ]
+    for name, kwargs in values:
+        expected, rendered = render_both(name, **kwargs)
+        assert expected == rendered
+
+
+def test_undefined_attribute_behave_like_jinja():
+    compiled = compile_templates(TEMPLATES)
+    try:
+        compiled['undefined_attr']()
+        assert False
+    except jinja2.exceptions.UndefinedError:
+        pass
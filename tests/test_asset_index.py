@@ -0,0 +1,76 @@
+from PIL import Image
+
+from sitefab import utils
+from sitefab.AssetIndex import AssetIndex
+
+
+def make_site(tmp_path):
+    output = tmp_path / 'output'
+    (output / 'static' / 'images').mkdir(parents=True)
+    Image.new('RGB', (40, 20)).save(output / 'static' / 'images' / 'a.png')
+    (output / 'static' / 'doc.pdf').write_bytes(b'pdf')
+    content = tmp_path / 'content'
+    content.mkdir()
+    (content / 'post.md').write_text('post')
+    roots = [[content, None], [output, '/']]
+    return AssetIndex(roots, tmp_path / 'cache'), output, content
+
+
+def test_scan(tmp_path):
+    assets, output, content = make_site(tmp_path)
+    assert assets.scan() == 3
+    assert assets.exists(output / 'static' / 'doc.pdf')
+    assert not assets.exists(output / 'static' / 'missing.pdf')
+    assert assets.get(content / 'post.md')['size'] == 4
+    image = assets.get_by_url('/static/images/a.png')
+    assert image['width'] == 40
+    assert image['height'] == 20
+    assert assets.get_by_url('/post.md') is None
+
+
+def test_image_info(tmp_path):
+    assets, _, _ = make_site(tmp_path)
+    assets.scan()
+    image_info = assets.get_image_info()
+    assert list(image_info) == ['/static/images/a.png']
+    assert image_info['/static/images/a.png']['width'] == 40
+
+
+def test_get_files(tmp_path):
+    assets, output, _ = make_site(tmp_path)
+    assets.scan()
+    assert assets.get_files(output / 'static', ['.png']) == [
+        output / 'static' / 'images' / 'a.png']
+    assert len(assets.get_files(output)) == 2
+
+
+def test_unchanged_files_not_read(tmp_path):
+    assets, output, _ = make_site(tmp_path)
+    assets.scan()
+    assert assets.num_files_read == 3
+
+    # next build reuses the persisted info
+    assets = AssetIndex(assets.roots, tmp_path / 'cache')
+    assets.scan()
+    assert assets.num_files_read == 0
+
+    (output / 'new.txt').write_text('new')
+    assets.scan()
+    assert assets.num_files_read == 1
+    assert assets.get_num_assets() == 4
+
+
+def test_lazy_hash(tmp_path):
+    assets, output, _ = make_site(tmp_path)
+    assets.scan()
+    asset = assets.get(output / 'static' / 'doc.pdf')
+    assert 'hash' not in asset
+    assert asset['hash'] == utils.hexdigest(b'pdf')
+    assert 'hash' in asset
+    assert asset.get('width') is None
+
+    # computed hashes are persisted by the next scan
+    assets.scan()
+    assets = AssetIndex(assets.roots, tmp_path / 'cache')
+    assets.scan()
+    assert 'hash' in assets.get(output / 'static' / 'doc.pdf')
@@ -0,0 +1,59 @@
+from sitefab.BuildHistory import BuildHistory
+
+
+def add_builds(history, parsing_times):
+    for seconds in parsing_times:
+        timings = {
+            BuildHistory.STAGE: {'Parsing': seconds, 'Init': 0.01},
+            BuildHistory.PLUGIN: {'postprocessor:toc': 1.0},
+            BuildHistory.POST: {'a.md': 0.1}
+        }
+        history.add_build('1.0', 10, timings, {'cache.assets': 0.9})
+
+
+def test_add_build(tmp_path):
+    history = BuildHistory(tmp_path / 'history.sqlite')
+    add_builds(history, [1.0, 2.0])
+    builds = history.get_builds()
+    assert [b[0] for b in builds] == [2, 1]
+    assert history.get_timings(2, BuildHistory.STAGE)['Parsing'] == 2.0
+    assert history.get_timings(1, BuildHistory.POST) == {'a.md': 0.1}
+    assert history.get_counters(1) == {'cache.assets': 0.9}
+    history.close()
+
+    # persisted across builds
+    history = BuildHistory(tmp_path / 'history.sqlite')
+    assert len(history.get_builds()) == 2
+
+
+def test_prune(tmp_path):
+    history = BuildHistory(tmp_path / 'history.sqlite')
+    add_builds(history, [1.0] * 5)
+    history.add_build('1.0', 10, {}, {}, max_builds=3)
+    assert [b[0] for b in history.get_builds()] == [6, 5, 4]
+    assert history.get_timings(1, BuildHistory.STAGE) == {}
+
+
+def test_find_regressions(tmp_path):
+    config = BuildHistory.make_config({'regression_threshold': 20})
+    history = BuildHistory(tmp_path / 'history.sqlite')
+    add_builds(history, [1.0, 1.1, 0.9, 1.0])
+    assert history.find_regressions(config) == []
+
+    add_builds(history, [1.5])
+    regressions = history.find_regressions(config)
+    assert len(regressions) == 1
+    kind, name, previous, seconds, percent = regressions[0]
+    assert [kind, name, previous, seconds] == ['stage', 'Parsing', 1.0, 1.5]
+    assert round(percent) == 50
+
+    # explicit baseline
+    assert history.find_regressions(config, baseline_id=5) == []
+
+
+def test_budgets(tmp_path):
+    config = BuildHistory.make_config({'budgets': {'Parsing': 1.2,
+                                                   'postprocessor:toc': 2}})
+    history = BuildHistory(tmp_path / 'history.sqlite')
+    add_builds(history, [1.5])
+    assert history.check_budgets(config) == [['Parsing', 1.2, 1.5]]
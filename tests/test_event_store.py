@@ -0,0 +1,42 @@
+from sitefab.EventStore import EventStore
+
+SEVERITIES = {1: 'OK', 2: 'SKIPPED', 3: 'ERROR'}
+
+
+def test_add_and_get():
+    store = EventStore(SEVERITIES, 1)
+    store.add(1.5, 'post a', 1, 'done')
+    store.add(2.5, 'post b', 3, 'failed 😁')
+    store.add(3.5, 'post a', 2, '')
+    assert len(store) == 3
+    assert store.targets == ['post a', 'post b']
+    event = store.get(1)
+    assert event.time == 2.5
+    assert event.target == 'post b'
+    assert event.severity == 'ERROR'
+    assert event.details == 'failed 😁'
+    assert store.get(2).details == ''
+
+
+def test_drop_ok_events():
+    store = EventStore(SEVERITIES, 1, keep_ok_events=False)
+    assert not store.add(1.0, 'post a', 1, 'done')
+    assert store.add(1.0, 'post a', 2, 'skipped')
+    assert len(store) == 1
+    assert store.num_dropped == 1
+
+
+def test_iter_events_pages():
+    store = EventStore(SEVERITIES, 1)
+    for idx in range(25):
+        store.add(idx, 'post %s' % idx, 1, 'event %s' % idx)
+    assert store.get_num_pages(10) == 3
+    page = list(store.iter_events(20, 30))
+    assert [e.details for e in page] == ['event %s' % i for i in range(20, 25)]
+    assert EventStore(SEVERITIES, 1).get_num_pages(10) == 1
+
+
+def test_unknown_severity():
+    store = EventStore(SEVERITIES, 1)
+    store.add(1.0, 'post a', 42, 'what')
+    assert store.get(0).severity is None
@@ -1,5 +1,6 @@
 from pathlib import Path
 from sitefab.files import read_file, write_file, clean_dir, get_files_list
+from sitefab.files import write_stream
 
 
 def test_basic_file_flow(tmp_path):
@@ -73,6 +74,14 @@ def test_writing_subdirectory(tmp_path):
     assert not subdir_path.exists()
 
 
+def test_write_stream(tmp_path):
+    chunks = ('line %s 😁\n' % i for i in range(100))
+    size = write_stream(tmp_path / 'sub', 'stream.txt', chunks)
+    read_back = read_file(tmp_path / 'sub' / 'stream.txt')
+    assert read_back.startswith('line 0 😁\nline 1')
+    assert len(read_back) == size
+
+
 def test_non_existing_read_file():
     assert read_file('asjkajlkajlksal32312ewdas3') == ""
 
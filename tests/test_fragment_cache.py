@@ -0,0 +1,54 @@
+from jinja2 import Environment
+
+from sitefab.FragmentCache import FragmentCacheExtension
+
+TEMPLATE = ('{% cache "nav", category %}{{ count.append(1) or '
+            'count|length }} {{ category }} <b>{% endcache %}')
+
+
+def make_env():
+    return Environment(extensions=[FragmentCacheExtension],
+                       autoescape=True)
+
+
+def test_fragments_memoized():
+    env = make_env()
+    template = env.from_string(TEMPLATE)
+    count = []
+    assert template.render(count=count, category='a') == '1 a <b>'
+    assert template.render(count=count, category='a') == '1 a <b>'
+    assert template.render(count=count, category='b') == '2 b <b>'
+    cache = env.fragment_cache
+    assert cache.get_stats() == [['nav', 1, 2]]
+    assert abs(cache.get_hit_rate() - 1 / 3.0) < 0.001
+
+
+def test_disabled():
+    env = make_env()
+    env.fragment_cache.config.enabled = False
+    template = env.from_string(TEMPLATE)
+    count = []
+    template.render(count=count, category='a')
+    assert template.render(count=count, category='a') == '2 a <b>'
+
+
+def test_persisted(tmp_path):
+    env = make_env()
+    env.fragment_cache.config.persist = True
+    env.fragment_cache.open(tmp_path)
+    env.from_string(TEMPLATE).render(count=[], category='a')
+    env.fragment_cache.close()
+
+    # next build
+    env = make_env()
+    env.fragment_cache.config.persist = True
+    env.fragment_cache.open(tmp_path)
+    count = []
+    assert env.from_string(TEMPLATE).render(count=count,
+                                            category='a') == '1 a <b>'
+    assert not count
+
+    # editing the block invalidates it
+    edited = env.from_string(TEMPLATE.replace('<b>', '<i>'))
+    assert edited.render(count=count, category='a') == '1 a <i>'
+    assert count
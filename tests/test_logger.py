@@ -16,3 +16,30 @@ def test_directory_exist(sitefab):
     output_dir = Path(sitefab.logger.config.output_dir)
     assert output_dir.exists()
     assert output_dir.is_dir()
+
+
+def test_paginated_log(sitefab, monkeypatch):
+    logger = sitefab.logger
+    # the sitefab fixture is shared: the page size must be restored
+    monkeypatch.setattr(logger.config, 'page_size', 2)
+    log_id = logger.create_log('test', 'pagination', 'test.pagination.html')
+    for idx in range(5):
+        logger.record_event(log_id, 'post %s' % idx, sitefab.OK, 'ok')
+    logger.write_log(log_id)
+    output_dir = Path(logger.config.output_dir)
+    assert (output_dir / 'test.pagination.html').exists()
+    assert (output_dir / 'test.pagination.3.html').exists()
+    assert not (output_dir / 'test.pagination.4.html').exists()
+    assert logger.logs[log_id].meta.num_events == 5
+    assert len(logger.logs[log_id].meta.pages) == 3
+
+
+def test_single_page_log(sitefab):
+    logger = sitefab.logger
+    log_id = logger.create_log('test', 'single', 'test.single.html')
+    for idx in range(5):
+        logger.record_event(log_id, 'post %s' % idx, sitefab.OK, 'ok')
+    logger.write_log(log_id)
+    assert logger.logs[log_id].meta.pages == ['test.single.html']
+    output_dir = Path(logger.config.output_dir)
+    assert not (output_dir / 'test.single.2.html').exists()
@@ -0,0 +1,64 @@
+from markupsafe import Markup
+
+from sitefab.plugins.MemoizedFilter import MemoizedFilter
+
+
+def make_filter(max_size=2):
+    calls = []
+
+    def upper(value, suffix=''):
+        calls.append(value)
+        return value.upper() + suffix
+
+    return MemoizedFilter('upper', upper, max_size), calls
+
+
+def test_memoized():
+    flt, calls = make_filter()
+    assert flt('a') == 'A'
+    assert flt('a') == 'A'
+    assert flt('a', suffix='!') == 'A!'
+    assert calls == ['a', 'a']
+    stats = flt.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+
+
+def test_lru_eviction():
+    flt, calls = make_filter()
+    flt('a')
+    flt('b')
+    flt('a')  # b is now the least recently used
+    flt('c')
+    flt('a')
+    assert calls == ['a', 'b', 'c']
+    flt('b')
+    assert calls == ['a', 'b', 'c', 'b']
+
+
+def test_unhashable_arguments():
+    flt = MemoizedFilter('join', lambda value: ','.join(value))
+    assert flt(['a', 'b']) == 'a,b'
+    assert flt(['a', 'b']) == 'a,b'
+    assert flt.get_stats()['uncached'] == 2
+    assert not flt.cache
+
+
+def test_arguments_types():
+    flt = MemoizedFilter('repr', repr)
+    assert [flt(1), flt(1.0), flt(True)] == ['1', '1.0', 'True']
+    assert flt(Markup('<b>')) != flt('<b>')
+    assert flt(1, **{}) == '1'
+    assert flt.get_stats()['misses'] == 5
+
+
+def test_merge_counters():
+    flt, _ = make_filter()
+    flt('a')
+    before = flt.get_counters()
+    flt('a')
+    flt('b')
+    delta = flt.get_counters(before)
+    assert delta[:3] == [1, 1, 0]
+    flt.merge_counters(delta)
+    assert flt.get_counters()[:3] == [2, 3, 0]
@@ -1,6 +1,8 @@
+import pytest
+
 from sitefab import nlp
 from sitefab.nlp import SPACY_MODEL
-from textacy import make_spacy_doc
+from textacy import TextStats, make_spacy_doc
 
 
 def test_text_cleanup():
@@ -15,6 +17,21 @@ def test_text_cleanup():
         assert nlp.text_cleanup(snip) == 'test'
 
 
+def test_text_cleanup_same_as_reference():
+    snips = [
+        "",
+        "Contact me at elie@example.com or +1 (555) 123-4567 ext. 12",
+        "see https://www.example.com/page?q=1 and bit.ly/abc #tag \uff03tag",
+        "1,000 items cost 3.14$ in 2020",
+        "Caf\u00e9 \u00c5NGSTR\u00d6M \u0130stanbul \ufb01le x\u00b2",
+        "\u2018quoted\u2019 \u201cdouble\u201d it\u02bcs `back` \u00b4acute",
+        "co-\n operation\ttab\vvertical\r\nwindows \u200bzero\ufeffwidth",
+        "  \u00a0non breaking\u2003spaces  \n\n "
+    ]
+    for snip in snips:
+        assert nlp.text_cleanup(snip) == nlp.text_cleanup_reference(snip)
+
+
 def test_stats():
     text = "the quick fox and the cat. The turtle and the rabbit."
     doc = make_spacy_doc(text, lang=SPACY_MODEL)
@@ -32,6 +49,110 @@ def test_empty_stats():
     assert stats.readibility == None
 
 
+def test_stats_same_as_textstats():
+    text = "The extraordinary readability of internationalization. " * 40
+    doc = make_spacy_doc(text, lang=SPACY_MODEL)
+    stats = nlp.compute_stats(doc, word_stats=nlp.WordStatsCache())
+    ts = TextStats(doc)
+    assert stats.counts.sentences == ts.n_sents
+    assert stats.counts.unique_words == ts.n_unique_words
+    assert stats.counts.chars_per_word == ts.n_chars_per_word
+    assert stats.counts.syllables_per_word == ts.n_syllables_per_word
+    assert stats.counts.polysyllable_words == ts.n_polysyllable_words
+    assert stats.readability.flesch_reading_ease == ts.flesch_reading_ease
+    assert stats.readability.smog_index == ts.smog_index
+
+
+def test_word_stats_cache(tmp_path):
+    word_stats = nlp.WordStatsCache()
+    counts = word_stats.get_syllables(['readability', 'fox'], 'en')
+    assert word_stats.pop_new_words() == {'en': {'readability': counts[0],
+                                                 'fox': counts[1]}}
+    worker_stats = nlp.WordStatsCache()
+    worker_stats.get_syllables(['turtle'], 'en')
+    word_stats.update(worker_stats.pop_new_words())
+    word_stats.save(tmp_path)
+
+    loaded = nlp.WordStatsCache()
+    loaded.load(tmp_path)
+    assert list(loaded.syllables['en']) == ['turtle']
+
+
+def test_split_text():
+    text = "One. Two three. Four five six. Seven"
+    chunks = list(nlp.split_text(text, 16))
+    assert chunks == ['One. Two three. ', 'Four five six. ', 'Seven']
+    assert list(nlp.split_text("abcdefgh", 3)) == ['abc', 'def', 'gh']
+    assert list(nlp.split_text("", 3)) == []
+
+
+def test_merge_key_terms():
+    chunks_terms = [[['a', 0.5], ['b', 0.5]], [['a', 0.2], ['c', 0.8]]]
+    terms = nlp.merge_key_terms(chunks_terms, [1, 3], num_terms=2)
+    assert [t[0] for t in terms] == ['c', 'a']
+    assert round(sum([t[1] for t in terms]), 6) == 1
+    assert nlp.merge_key_terms([], [], num_terms=2) == []
+
+
+def test_get_template_fields():
+    source = """{{ post.nlp.terms }} {{ p.nlp['stats'] }}
+                {% for t in post.nlp.title_terms %}{% endfor %}"""
+    fields = nlp.get_template_fields(source)
+    assert fields == set(['nlp.terms', 'nlp.stats', 'nlp.title_terms'])
+    assert nlp.get_template_fields("{{ post.nlp|tojson }}") == set(['nlp'])
+    assert nlp.get_template_fields("{{ post.meta.title }}") == set()
+
+
+def test_fields_to_parts():
+    assert nlp.fields_to_parts(['post.meta.title']) == set()
+    assert nlp.fields_to_parts(['post.nlp.terms', 'nlp.stats']) == set(
+        ['terms', 'stats'])
+    assert nlp.fields_to_parts(['post.nlp']) == set(nlp.NLP_PARTS)
+
+
+def test_analyze_post_parts(empty_post):
+    empty_post.text = "the quick fox and the cat. The turtle and the rabbit."
+    empty_post.meta.title = 'quick fox'
+    post_nlp = nlp.analyze_post(empty_post, parts=['stats'])
+    assert post_nlp.stats.counts.words == 11
+    assert post_nlp.terms is None
+    assert post_nlp.clean_fields is None
+    post_nlp = nlp.analyze_post(empty_post, parts=['terms'])
+    assert post_nlp.stats is None
+    assert post_nlp.clean_fields.title == 'quick fox'
+    assert post_nlp.term_extractor == nlp.TERM_EXTRACTOR_ALGO
+    assert nlp.analyze_post(empty_post, parts=[]) == {}
+
+
+def test_make_config():
+    config = nlp.make_config({'num_terms': 10})
+    assert config.num_terms == 10
+    assert config.spacy_model == SPACY_MODEL
+    with pytest.raises(Exception):
+        nlp.make_config({'term_extractor': 'unknown'})
+    with pytest.raises(Exception):
+        nlp.make_config({'parts': ['terms', 'unknown']})
+    assert nlp.make_config({'parts': ['terms']}).parts == ['terms']
+
+
+def test_term_extractor_fallback(monkeypatch):
+    def extract_key_terms(doc, num_terms=50, ngrams=(1, 2, 3), algo='yake'):
+        return [[algo, 1.0]]
+    monkeypatch.setattr(nlp, 'extract_key_terms', extract_key_terms)
+    monkeypatch.setitem(nlp.ALGO_COSTS, 'sgrank', [100, 1.0])
+    config = nlp.make_config({'term_extractor': 'sgrank', 'time_budget': 1})
+    extractor = nlp.KeyTermsExtractor(config)
+    assert extractor.extract(list(range(100)), ngrams=1) == [['yake', 1.0]]
+    assert extractor.get_algorithm() == 'yake'
+
+
+def test_frequency_terms():
+    text = "the quick fox and the cat. The fox and the rabbit."
+    doc = make_spacy_doc(text, lang=SPACY_MODEL)
+    terms = nlp.extract_key_terms(doc, num_terms=5, algo='frequency')
+    assert terms[0][0] == 'fox'
+
+
 def test_terms():
     text = "the quick fox and the cat. The turtle and the rabbit."
     doc = make_spacy_doc(text, lang=SPACY_MODEL)
@@ -99,3 +220,31 @@ def test_analyze_post(empty_post):
     assert post_nlp.stats.readability.flesch_kincaid_grade_level > 0
     assert 'password' in [t[0] for t in post_nlp.title_terms]
     assert 'password' in [t[0] for t in post_nlp.terms]
+
+    # same post analyzed in chunks
+    config = nlp.make_config({'chunk_size': 300})
+    chunked_nlp = nlp.analyze_post(empty_post, config=config)
+    assert chunked_nlp.stats.counts.words == post_nlp.stats.counts.words
+    assert chunked_nlp.title_terms == post_nlp.title_terms
+    assert 'password' in [t[0] for t in chunked_nlp.terms]
+
+
+def test_benchmark_corpus(empty_post):
+    empty_post.text = "the quick fox and the cat. The turtle and the rabbit."
+    empty_post.meta.title = 'quick fox'
+    results = nlp.benchmark_corpus([empty_post], algos=['yake', 'frequency'])
+    assert results['num_posts'] == 1
+    assert [r['algo'] for r in results['runs']] == ['spacy', 'yake',
+                                                    'frequency']
+    assert results['runs'][1]['posts_per_sec'] > 0
+    assert results['overlap'][0]['algos'] == ['yake', 'frequency']
+
+
+def test_chunked_clean_fields(empty_post):
+    empty_post.text = ("The quick fox, jumps! Over the lazy dog.\nVisit "
+                       "https://elie.net now. The turtle and the rabbit. ")
+    full = nlp.analyze_post(empty_post, parts=['clean_fields'])
+    config = nlp.make_config({'chunk_size': 20})
+    chunked = nlp.analyze_post(empty_post, config=config,
+                               parts=['clean_fields'])
+    assert chunked.clean_fields.text == full.clean_fields.text
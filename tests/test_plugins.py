@@ -0,0 +1,44 @@
+from configparser import ConfigParser
+
+from sitefab import nlp
+from sitefab.plugins import Plugins
+from sitefab.utils import create_objdict
+
+
+def make_plugin(module, category, consumes=None):
+    plugin = create_objdict()
+    plugin.categories = [category]
+    plugin.details = ConfigParser()
+    plugin.details.add_section("Core")
+    plugin.details.set("Core", "Module", module)
+    if consumes is not None:
+        plugin.details.set("Core", "Consumes", consumes)
+    return plugin
+
+
+def make_plugins(plugins, enabled):
+    # bypass the plugins directories loading
+    manager = Plugins.__new__(Plugins)
+    manager.plugins = create_objdict()
+    manager.plugins.getAllPlugins = lambda: plugins
+    manager.plugins_config = {'PostProcessor': {
+        name: {'enable': True} for name in enabled}}
+    return manager
+
+
+def test_consumed_fields():
+    plugins = make_plugins([
+        make_plugin('terms', 'PostProcessor', 'post.nlp.terms'),
+        make_plugin('nothing', 'PostProcessor', ''),
+        make_plugin('disabled', 'PostProcessor')], ['terms', 'nothing'])
+    fields = plugins.get_consumed_fields()
+    assert nlp.fields_to_parts(fields) == set(['terms'])
+
+
+def test_undeclared_consumed_fields():
+    plugins = make_plugins([
+        make_plugin('terms', 'PostProcessor', 'post.nlp.terms'),
+        make_plugin('related_posts', 'PostProcessor')],
+        ['terms', 'related_posts'])
+    fields = plugins.get_consumed_fields()
+    assert nlp.fields_to_parts(fields) == set(nlp.NLP_PARTS)
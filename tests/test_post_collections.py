@@ -0,0 +1,123 @@
+from jinja2 import Environment, Template
+
+from sitefab import PostCollections as post_collections
+from sitefab.FragmentCache import FragmentCacheExtension
+from sitefab.PostCollections import PostCollections
+from sitefab.plugins.MemoizedFilter import MemoizedFilter
+from sitefab.utils import create_objdict
+
+TEMPLATE = Template("{{ meta.name }} {{ pagination.page }}/"
+                    "{{ pagination.num_pages }} prev:{{ pagination.prev_url }}"
+                    " next:{{ pagination.next_url }} "
+                    "{% for post in posts %}[{{ post.meta.title }}]"
+                    "{% endfor %}")
+
+
+def make_collections(make_post, tmp_path, num_posts, page_size, threads=1):
+    site = create_objdict()
+    site.plugin_data = {}
+    site.config = create_objdict()
+    collections = PostCollections(site, template=TEMPLATE,
+                                  output_path=tmp_path, web_path='tags/',
+                                  page_size=page_size, threads=threads)
+    for idx in range(num_posts):
+        collections.add('Web Security', make_post({'title': 'post%s' % idx}))
+    return collections
+
+
+def read_page(tmp_path, *path):
+    return tmp_path.joinpath(*path, 'index.html').read_text('utf-8-sig')
+
+
+def test_single_page(tmp_path, make_post):
+    collections = make_collections(make_post, tmp_path, 5, 0)
+    collections.render()
+    page = read_page(tmp_path, 'web-security')
+    assert page.startswith('Web Security 1/1 prev:None next:None')
+    assert page.count('[post') == 5
+
+
+def test_pagination(tmp_path, make_post):
+    collections = make_collections(make_post, tmp_path, 5, 2)
+    collections.render()
+    first = read_page(tmp_path, 'web-security')
+    assert 'next:/tags/web-security/page/2/' in first
+    assert '[post0][post1]' in first
+    last = read_page(tmp_path, 'web-security', 'page', '3')
+    assert 'prev:/tags/web-security/page/2/ next:None' in last
+    assert last.endswith('[post4]')
+    assert not (tmp_path / 'web-security' / 'page' / '4').exists()
+
+
+def test_parallel_rendering(tmp_path, make_post):
+    num_pages = post_collections.MIN_PARALLEL_PAGES + 1
+    collections = make_collections(make_post, tmp_path / 'parallel',
+                                   num_pages, 1, 2)
+    collections.render()
+    serial = make_collections(make_post, tmp_path / 'serial', num_pages, 1)
+    serial.render()
+    for page in range(2, num_pages + 1):
+        path = ['web-security', 'page', str(page)]
+        assert (read_page(tmp_path / 'parallel', *path) ==
+                read_page(tmp_path / 'serial', *path))
+
+
+def test_sorted_on_insert(make_post):
+    def dated_post(filename, creation_ts, update_ts=None):
+        meta = {'creation_date_ts': creation_ts, 'update_date_ts': update_ts}
+        return make_post(meta, filename=filename)
+
+    site = create_objdict()
+    collections = PostCollections(site)
+    jan = dated_post('jan.md', 1578000000)  # 2020-01-02
+    feb = dated_post('feb.md', 1581000000, 1610000000)  # 2020-02-06
+    old = dated_post('old.md', 1546500000)  # 2019-01-03
+    for post in [jan, old, feb]:
+        collections.add('tag', post)
+    collection = collections.get_as_dict()['tag']
+    assert collection.posts == [feb, jan, old]
+    assert collection.posts_by_update_date == [feb, jan, old]
+    assert collections.get_sorted('tag', 2) == [old, jan, feb]
+
+    # update date reorders the secondary list only
+    updated = dated_post('updated.md', 1500000000, 1620000000)
+    collections.add('tag', updated)
+    assert collection.posts[-1] == updated
+    assert collection.posts_by_update_date[0] == updated
+
+    assert collection.by_year[2020] == [feb, jan]
+    assert collection.by_year[2019] == [old]
+    assert collection.by_month['2020-02'] == [feb]
+
+
+def test_parallel_fragment_cache(tmp_path, make_post):
+    env = Environment(extensions=[FragmentCacheExtension])
+    template = env.from_string('{% cache "nav" %}nav{% endcache %}'
+                               '{{ pagination.page }}')
+    collections = make_collections(make_post, tmp_path,
+                                   post_collections.MIN_PARALLEL_PAGES, 1, 2)
+    collections.template = template
+    collections.render()
+    cache = env.fragment_cache
+    assert cache.get_stats() == [['nav', post_collections.MIN_PARALLEL_PAGES
+                                  - cache.misses['nav'],
+                                  cache.misses['nav']]]
+    assert cache.misses['nav'] >= 1
+    assert len(cache.fragments) == 1
+    assert read_page(tmp_path, 'web-security', 'page', '2') == 'nav2'
+
+
+def test_parallel_filters_stats(tmp_path, make_post):
+    env = Environment()
+    flt = MemoizedFilter('upper', str.upper)
+    env.filters['upper'] = flt
+    template = env.from_string('{{ meta.name|upper }}')
+    num_pages = post_collections.MIN_PARALLEL_PAGES
+    collections = make_collections(make_post, tmp_path, num_pages, 1, 2)
+    collections.site.plugins = create_objdict()
+    collections.site.plugins.memoized_filters = {'upper': flt}
+    collections.template = template
+    collections.render()
+    assert flt.hits + flt.misses == num_pages
+    assert flt.misses >= 1
+    assert read_page(tmp_path, 'web-security', 'page', '2') == 'WEB SECURITY'
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from sitefab.SearchIndex import SearchIndex, encode_postings, decode_postings
+
+
+def search_post(make_post, filename, title, terms, tags=None):
+    meta = {'title': title, 'permanent_url': '/%s/' % filename,
+            'tags': tags or []}
+    return make_post(meta, {'terms': terms}, filename=filename)
+
+
+@pytest.fixture()
+def posts(make_post):
+    return [
+        search_post(make_post, 'a', 'Python security',
+                    [['python', 0.5], ['web', 0.2]]),
+        search_post(make_post, 'b', 'Cooking', [['pasta recipe', 0.9]],
+                    ['food']),
+        search_post(make_post, 'c', 'Web',
+                    [['web security', 0.4], ['python', 0.1]])
+    ]
+
+
+def get_urls(index, prefix, word):
+    shard = index.get_shard(prefix)
+    return sorted(index.docs[doc_num][1] for doc_num, _ in shard[word])
+
+
+def test_postings_encoding():
+    postings = [[0, 1], [3, 255], [130, 7], [100000, 2]]
+    encoded = encode_postings(postings)
+    assert len(encoded) < 4 * 2 * 4
+    assert decode_postings(encoded) == postings
+
+
+def test_build(tmp_path, posts):
+    index = SearchIndex({'enabled': True}, tmp_path / 'cache')
+    index.build(posts)
+    assert get_urls(index, 'py', 'python') == ['/a/', '/c/']
+    assert get_urls(index, 'se', 'security') == ['/a/', '/c/']
+    assert get_urls(index, 'fo', 'food') == ['/b/']
+    assert index.num_posts_updated == 3
+
+
+def test_title_boost(tmp_path, posts):
+    index = SearchIndex({'enabled': True}, tmp_path / 'cache')
+    index.build(posts)
+    weights = dict((index.docs[doc_num][1], weight)
+                   for doc_num, weight in index.get_shard('py')['python'])
+    assert weights['/a/'] > weights['/c/']
+
+
+def test_incremental_build(tmp_path, posts, make_post):
+    index = SearchIndex({'enabled': True}, tmp_path / 'cache')
+    index.build(posts)
+    num_shards = index.get_num_shards()
+
+    index = SearchIndex({'enabled': True}, tmp_path / 'cache')
+    index.build(posts)
+    assert index.num_posts_updated == 0
+    assert index.num_shards_updated == 0
+    assert index.get_num_shards() == num_shards
+
+    # update a post and remove an other
+    posts[1].nlp.terms = [['pizza', 1.0]]
+    del posts[2]
+    index = SearchIndex({'enabled': True}, tmp_path / 'cache')
+    index.build(posts)
+    assert index.num_posts_updated == 1
+    assert get_urls(index, 'pi', 'pizza') == ['/b/']
+    assert 'pasta' not in index.get_shard('pa')
+    assert get_urls(index, 'py', 'python') == ['/a/']
+
+    # new posts reuse the doc number of deleted ones
+    posts.append(search_post(make_post, 'd', 'Python', [['python', 1.0]]))
+    index = SearchIndex({'enabled': True}, tmp_path / 'cache')
+    index.build(posts)
+    assert len(index.docs) == 3
+    assert get_urls(index, 'py', 'python') == ['/a/', '/d/']
+
+
+def test_write(tmp_path, posts):
+    index = SearchIndex({'enabled': True}, tmp_path / 'cache')
+    index.build(posts)
+    manifest_fname = index.write(tmp_path / 'search')
+    manifest = json.loads((tmp_path / 'search' / manifest_fname).read_text())
+    assert manifest['prefix_len'] == 2
+    assert sorted(manifest['shards']) == sorted(index.state['shards'])
+    for fname in list(manifest['shards'].values()) + [manifest['docs']]:
+        assert (tmp_path / 'search' / fname).is_file()
@@ -0,0 +1,41 @@
+from sitefab.SiteIndex import SiteIndex
+
+
+def make_index(make_post):
+    def post(post_id, filename, creation_ts, authors, url):
+        meta = {'creation_date_ts': creation_ts, 'authors': authors,
+                'permanent_url': url}
+        return make_post(meta, id=post_id, filename=filename)
+
+    index = SiteIndex({'num_recent': 2})
+    posts = [
+        post(1, 'content/a.md', 1546500000, ['Doe, Jane'], '/a/'),  # 2019
+        post(2, 'content/b.md', 1578000000, ['Doe, Jane', 'Roe, Rick'],
+             'b'),  # 2020
+        post(3, 'content/c/a.md', 1581000000, ['Roe, Rick'], '/c'),  # 2020
+    ]
+    index.build(posts)
+    return index, posts
+
+
+def test_lookups(make_post):
+    index, (a, b, c) = make_index(make_post)
+    assert index.get(2) == b
+    assert index.get_by_filename('content/c/a.md') == c
+    assert index.get_by_stem('a') == [c, a]
+    assert index.get_by_url('/a') == a
+    assert index.get_by_url('/b/') == b
+    assert index.get('missing') is None
+
+
+def test_queries(make_post):
+    index, (a, b, c) = make_index(make_post)
+    assert index.recent() == [c, b]
+    assert index.recent(3) == [c, b, a]
+    assert index.recent(exclude=c.meta) == [b, a]
+    assert index.by_author('Doe, Jane') == [b, a]
+    assert index.by_author('Roe, Rick', 1, exclude=c) == [b]
+    assert index.by_year(2020) == [c, b]
+    assert index.same_year(b.meta) == [c]
+    assert index.get_years() == [2020, 2019]
+    assert index.get_authors() == ['Doe, Jane', 'Roe, Rick']
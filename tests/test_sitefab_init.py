@@ -1,4 +1,5 @@
 import pytest
+from sitefab import nlp
 from sitefab.SiteFab import SiteFab
 from.conftest import TEMPLATE_DATA_CONFIG_FILE_PATH
 
@@ -30,5 +31,10 @@ def test_template_filters(sitefab):
     assert 'str_to_list' in sitefab.jinja2.filters
 
 
+def test_nlp_parts(sitefab):
+    parts = sitefab.get_nlp_parts()
+    assert parts.issubset(set(nlp.NLP_PARTS))
+
+
 def test_get_config(sitefab):
     assert sitefab.get_config() == sitefab.config
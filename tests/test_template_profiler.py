@@ -0,0 +1,61 @@
+from jinja2 import DictLoader, Environment
+from jinja2.runtime import Macro
+
+from sitefab.TemplateProfiler import TemplateProfiler, enable_profiling
+
+MACRO_INVOKE = Macro._invoke
+
+TEMPLATES = {
+    'page.html': ('{% import "macros.html" as m %}{% block body %}'
+                  '{% for post in posts %}{{ m.title(post) }}{% endfor %}'
+                  '{% endblock %}{% include "sidebar.html" %}'),
+    'sidebar.html': '{{ posts|length }}{% for k, v in tags.items() %}'
+                    '{{ k }}{% endfor %}',
+    'macros.html': '{% macro title(post) %}[{{ post }}]{% endmacro %}',
+}
+
+
+def render_pages(num_pages):
+    profiler = TemplateProfiler({'enabled': True})
+    env = Environment(loader=DictLoader(TEMPLATES))
+    enable_profiling(env, profiler)
+    posts = ['a', 'b', 'c']
+    tags = {'x': 1}
+    outputs = []
+    for _ in range(num_pages):
+        context = profiler.wrap_context({'posts': posts, 'tags': tags})
+        outputs.append(env.get_template('page.html').render(**context))
+    return profiler, outputs
+
+
+def test_timings():
+    profiler, outputs = render_pages(2)
+    assert outputs[0] == '[a][b][c]3x'
+    calls = {name: num_calls for name, num_calls, _ in
+             profiler.get_timings()}
+    assert calls['page.html'] == 2
+    assert calls['page.html:block body'] == 2
+    assert calls['sidebar.html'] == 2
+    assert calls['macro title'] == 6
+
+
+def test_iterations():
+    profiler, _ = render_pages(3)
+    iterations = profiler.get_iterations()
+    assert iterations[0] == ['page.html:block body', 'posts', 3, 9]
+    assert ['sidebar.html', 'tags', 3, 3] in iterations
+
+
+def test_report(tmp_path):
+    profiler, _ = render_pages(1)
+    path = profiler.write_report(tmp_path)
+    report = path.read_text('utf-8-sig')
+    assert 'macro title' in report
+
+
+def test_other_environments_not_profiled():
+    render_pages(1)
+    assert Macro._invoke is MACRO_INVOKE
+    env = Environment(loader=DictLoader(TEMPLATES))
+    output = env.get_template('page.html').render(posts=['a'], tags={})
+    assert output == '[a]1'
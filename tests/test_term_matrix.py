@@ -0,0 +1,46 @@
+import pytest
+
+from sitefab.TermMatrix import TermMatrix
+
+
+@pytest.fixture()
+def posts(make_post):
+    terms = [
+        [['python', 0.5], ['security', 0.5]],
+        [['python', 0.6], ['web', 0.4]],
+        [['security', 0.9], ['python', 0.1]],
+        [['cooking', 1.0]],
+        []
+    ]
+    return [make_post(nlp={'terms': post_terms}, id=post_id)
+            for post_id, post_terms in enumerate(terms, 1)]
+
+
+def test_matrix(posts):
+    term_matrix = TermMatrix(posts)
+    assert term_matrix.get_num_posts() == 5
+    assert term_matrix.get_num_terms() == 4
+    assert term_matrix.matrix.shape == (5, 4)
+    vector = term_matrix.get_post_vector(2)
+    assert {t: round(w, 3) for t, w in vector.items()} == {'python': 0.6,
+                                                           'web': 0.4}
+    assert term_matrix.get_post_vector(5) == {}
+
+
+def test_similar_posts(posts):
+    term_matrix = TermMatrix(posts)
+    similar = term_matrix.get_similar_posts(1, k=2)
+    assert [s[0] for s in similar] == [3, 2]
+    assert similar[0][1] > similar[1][1]
+
+    # no similar post
+    assert term_matrix.get_similar_posts(4) == []
+    assert term_matrix.get_similar_posts(5) == []
+
+
+def test_all_similar_posts(posts):
+    term_matrix = TermMatrix(posts)
+    all_similar = term_matrix.get_all_similar_posts(k=2, batch_size=2)
+    assert len(all_similar) == 5
+    for post_id, similar in all_similar.items():
+        assert similar == term_matrix.get_similar_posts(post_id, k=2)
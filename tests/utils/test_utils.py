@@ -33,3 +33,15 @@ def test_objdict_to_dict():
     assert d['arrayofarray'][0][0] == 1   # testing nested array
     assert d['arrayofarray'][1][1] == 4   # testing nested array
 
+
+def test_file_hexdigest(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'0123456789' * 10)
+    assert (utils.file_hexdigest(str(path), chunk_size=7) ==
+            utils.hexdigest(b'0123456789' * 10))
+
+
+def test_set_defaults():
+    config = utils.create_objdict({'a': 1, 'b': None})
+    config = utils.set_defaults(config, {'a': 2, 'b': 3, 'c': 4})
+    assert config == {'a': 1, 'b': 3, 'c': 4}